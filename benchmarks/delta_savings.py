@@ -0,0 +1,78 @@
+"""Measure bytes saved by delta encoding on simulated sensor traces."""
+
+import json
+import random
+import sys
+from easyhttp_python._delta import DeltaEncoder, DeltaDecoder
+
+SAMPLES = 3600
+
+def sensor_trace(samples: int, seed: int = 1):
+    """One reading per second from an environment sensor node."""
+    rng = random.Random(seed)
+    state = {
+        "device": "ENV-NODE-17",
+        "firmware": "2.4.1",
+        "location": {"building": "B", "floor": 3, "room": "312"},
+        "temperature": 21.5,
+        "humidity": 45.0,
+        "co2": 620,
+        "pm25": 8,
+        "pressure": 1013.2,
+        "battery": 97,
+        "rssi": -61,
+        "uptime": 0,
+        "door_open": False,
+        "status": "ok",
+    }
+    for second in range(samples):
+        state["uptime"] = second
+        if rng.random() < 0.3:
+            state["temperature"] = round(state["temperature"] + rng.uniform(-0.2, 0.2), 1)
+        if rng.random() < 0.1:
+            state["humidity"] = round(state["humidity"] + rng.uniform(-1, 1), 1)
+        if rng.random() < 0.2:
+            state["co2"] += rng.randint(-10, 10)
+        if rng.random() < 0.05:
+            state["rssi"] = -rng.randint(55, 70)
+        if second % 600 == 599:
+            state["battery"] -= 1
+        if rng.random() < 0.01:
+            state["door_open"] = not state["door_open"]
+        if rng.random() < 0.002:
+            state["location"]["room"] = f"3{rng.randint(10, 20)}"  # Moved, updated in place
+        yield state
+
+def relay_trace(samples: int, seed: int = 2):
+    """A 16-channel relay board whose channels rarely toggle."""
+    rng = random.Random(seed)
+    state = {f"ch{i}": False for i in range(16)}
+    for _ in range(samples):
+        if rng.random() < 0.1:
+            channel = f"ch{rng.randrange(16)}"
+            state[channel] = not state[channel]
+        yield state
+
+def measure(name: str, trace) -> None:
+    encoder, decoder = DeltaEncoder(), DeltaDecoder()
+    key = ("NODE01", 5)
+    for state in trace:
+        payload, spec = encoder.encode(key, state)
+        payload = json.loads(json.dumps(payload))  # As received over the wire
+        rebuilt = decoder.decode(key, payload, spec)
+        assert rebuilt == state, "delta reconstruction mismatch"
+        decoder.commit(key, spec["seq"], rebuilt)
+        encoder.acked(key, spec["seq"], state)
+
+    stats = encoder.stats()
+    ratio = stats["sent_bytes"] / stats["full_bytes"]
+    print(
+        f"{name:8} messages={stats['full'] + stats['delta']:5} "
+        f"full={stats['full_bytes']:8} B  sent={stats['sent_bytes']:8} B  "
+        f"saved={100 * (1 - ratio):5.1f}%"
+    )
+
+if __name__ == "__main__":
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else SAMPLES
+    measure("sensor", sensor_trace(samples))
+    measure("relay", relay_trace(samples))
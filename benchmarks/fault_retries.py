@@ -0,0 +1,73 @@
+"""Measure PUSH delivery under injected loss for several retry settings.
+
+Starts two devices on localhost with a seeded FaultInjector on the
+sender: exponential extra latency, lost requests, lost responses,
+duplicates and reordering. For each retry count, sends sequential
+PUSHes and reports how many were acknowledged, how many times the
+receiver's callback ran (duplicate suppression should keep it at one
+per PUSH), the latency percentiles and what the injector did.
+
+Usage: python benchmarks/fault_retries.py [pushes] [loss]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from easyhttp_python import EasyHTTPAsync, FaultInjector
+
+async def run(retries: int, port: int, pushes: int, loss: float) -> None:
+    workdir = tempfile.mkdtemp(prefix="easyhttp-faults-")
+    faults = FaultInjector(seed=42)
+    faults.add(
+        "send",
+        latency=("exponential", 0.005),
+        drop=loss / 2,
+        drop_response=loss / 2,
+        duplicate=0.02,
+        reorder=0.05,
+    )
+    kw = dict(enable_discovery=False, persist_devices=False, breaker_threshold=1000)
+    receiver = EasyHTTPAsync(port=port, config_file=os.path.join(workdir, "r.json"), **kw)
+    sender = EasyHTTPAsync(port=port + 1, config_file=os.path.join(workdir, "s.json"),
+                           retries=retries, retry_backoff=0.05, max_timeout=0.5, faults=faults, **kw)
+    runs = {}
+
+    def on_push(sender_id, data, timestamp):
+        runs[data["n"]] = runs.get(data["n"], 0) + 1
+        return True
+
+    receiver.on("on_push", on_push)
+    await receiver.start()
+    await sender.start()
+    sender.add(receiver.id, "127.0.0.1", port)
+
+    latencies = []
+    acked = 0
+    for n in range(pushes):
+        started = time.perf_counter()
+        acked += await sender.push(receiver.id, {"n": n})
+        latencies.append(time.perf_counter() - started)
+    await asyncio.sleep(0.2)  # Let duplicates land
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"retries={retries}: {acked}/{pushes} acked, {len(runs)} applied, "
+          f"{sum(runs.values()) - len(runs)} applied twice, p50 {p50:6.1f} ms, p99 {p99:6.1f} ms")
+    print(f"           faults: {faults.stats()}")
+
+    await sender.stop()
+    await receiver.stop()
+
+async def main(pushes: int, loss: float) -> None:
+    port = 5891
+    for retries in (0, 1, 3):
+        await run(retries, port, pushes, loss)
+        port += 2
+
+if __name__ == "__main__":
+    pushes = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    loss = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+    asyncio.run(main(pushes, loss))
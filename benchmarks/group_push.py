@@ -0,0 +1,62 @@
+"""Compare actuating a group with one push() per device and push_group().
+
+Starts N devices that are members of one group and a controller on an
+in-memory virtual network, then turns the group off with N push() calls
+and with a single push_group() collecting ACKs. Reports the time, the
+requests and datagrams each needed, and how many members were reached.
+
+Usage: python benchmarks/group_push.py [devices] [latency_ms] [loss]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from easyhttp_python import EasyHTTPAsync, VirtualNetwork
+
+async def main(count: int, latency: float, loss: float) -> None:
+    workdir = tempfile.mkdtemp(prefix="easyhttp-group-")
+    network = VirtualNetwork(latency=latency, jitter=latency / 2, loss=loss, seed=1)
+    kw = dict(persist_devices=False, enable_discovery=False, network=network)
+    controller = EasyHTTPAsync(config_file=os.path.join(workdir, "c.json"), **kw)
+    lights = [
+        EasyHTTPAsync(config_file=os.path.join(workdir, f"{i}.json"), groups=["lights"], **kw)
+        for i in range(count)
+    ]
+
+    async def on_push(sender_id, data, timestamp):
+        return True
+
+    for light in lights:
+        light.on("on_push", on_push)
+        await light.start()
+    await controller.start()
+    for light in lights:
+        controller.add(light.id, light.network_ip, light.port, groups=["lights"])
+
+    before = network.stats()
+    started = time.perf_counter()
+    results = await asyncio.gather(*(controller.push(light.id, {"on": False}) for light in lights))
+    unicast = time.perf_counter() - started
+    middle = network.stats()
+    print(f"push() x {count}: {unicast * 1000:7.1f} ms, "
+          f"{middle['requests'] - before['requests']} requests, {sum(results)} acked")
+
+    started = time.perf_counter()
+    result = await controller.push_group("lights", {"on": False})
+    grouped = time.perf_counter() - started
+    after = network.stats()
+    print(f"push_group():  {grouped * 1000:7.1f} ms, {result['transmissions']} transmission(s), "
+          f"{after['requests'] - middle['requests']} requests, "
+          f"{after['datagrams'] - middle['datagrams']} datagrams delivered incl. ACKs, "
+          f"{len(result['acked'])} acked, {len(result['retried'])} retried, {len(result['failed'])} failed")
+
+    for device in lights + [controller]:
+        await device.stop()
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.005
+    loss = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    asyncio.run(main(count, latency, loss))
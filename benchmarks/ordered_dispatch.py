@@ -0,0 +1,73 @@
+"""Measure PUSH throughput and ordering with several senders.
+
+Starts one receiver and several senders on localhost. Every sender
+PUSHes numbered messages concurrently, and the receiver's callback
+awaits a little work before recording them. Runs once without ordering,
+once with a global lock around the callback and once with ordered=True,
+and reports throughput and how many senders had their messages handled
+out of order.
+
+Usage: python benchmarks/ordered_dispatch.py [senders] [pushes]
+"""
+
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from easyhttp_python import EasyHTTPAsync
+
+async def run(name: str, port: int, senders: int, pushes: int) -> None:
+    workdir = tempfile.mkdtemp(prefix="easyhttp-ordered-")
+    kw = dict(enable_discovery=False, persist_devices=False)
+    receiver = EasyHTTPAsync(port=port, config_file=os.path.join(workdir, "r.json"),
+                             ordered=name == "ordered", **kw)
+    devices = [
+        EasyHTTPAsync(port=port + 1 + i, config_file=os.path.join(workdir, f"s{i}.json"), **kw)
+        for i in range(senders)
+    ]
+    lock = asyncio.Lock()
+    seen = {}
+
+    async def handle(sender_id, data):
+        await asyncio.sleep(random.uniform(0.001, 0.005))  # E.g. writing to a database
+        seen.setdefault(sender_id, []).append(data["n"])
+
+    async def on_push(sender_id, data, timestamp):
+        if name == "lock":
+            async with lock:
+                await handle(sender_id, data)
+        else:
+            await handle(sender_id, data)
+        return True
+
+    receiver.on("on_push", on_push)
+    await receiver.start()
+    for device in devices:
+        await device.start()
+        device.add(receiver.id, "127.0.0.1", port)
+
+    started = time.perf_counter()
+    acked = await asyncio.gather(*(
+        device.push(receiver.id, {"n": n}) for n in range(pushes) for device in devices
+    ))
+    elapsed = time.perf_counter() - started
+    unordered = sum(numbers != sorted(numbers) for numbers in seen.values())
+    print(f"{name:>9}: {sum(acked)}/{len(acked)} acked, {len(acked) / elapsed:7.0f} pushes/s, "
+          f"{unordered}/{senders} senders out of order")
+
+    for device in devices:
+        await device.stop()
+    await receiver.stop()
+
+async def main(senders: int, pushes: int) -> None:
+    port = 5901
+    for name in ("unordered", "lock", "ordered"):
+        await run(name, port, senders, pushes)
+        port += senders + 1
+
+if __name__ == "__main__":
+    senders = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    pushes = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    asyncio.run(main(senders, pushes))
@@ -0,0 +1,58 @@
+"""Measure enqueue and drain throughput of the durable outbound queue."""
+
+import asyncio
+import sys
+import tempfile
+import time
+from easyhttp_python import EasyHTTPAsync
+
+COUNT = 5000
+PAYLOAD = {"temperature": 24.5, "humidity": 60, "status": "normal"}
+
+async def main(count: int):
+    tmp = tempfile.mkdtemp()
+
+    for policy in ("never", "interval", "always"):
+        sender = EasyHTTPAsync(
+            port=5701,
+            config_file=f"{tmp}/sender.json",
+            enable_discovery=False,
+            outbox_dir=f"{tmp}/outbox-{policy}",
+            outbox_fsync=policy,
+        )
+        # Target is not running yet, so every push lands in the outbox
+        sender.add("TARGET", "127.0.0.1", 5702)
+        await sender.outbox.put("TARGET", PAYLOAD)
+
+        started = time.perf_counter()
+        for _ in range(count - 1):
+            await sender.push("TARGET", PAYLOAD)
+        elapsed = time.perf_counter() - started
+        print(f"enqueue fsync={policy:8} {count / elapsed:10.0f} msg/s")
+        await sender.outbox.stop()
+
+    received = 0
+
+    def handle_push(sender_id, data, timestamp):
+        nonlocal received
+        received += 1
+        return True
+
+    target = EasyHTTPAsync(port=5702, config_file=f"{tmp}/target.json", enable_discovery=False)
+    target.id = "TARGET"
+    target.on("on_push", handle_push)
+    await target.start()
+
+    await sender.start()
+    started = time.perf_counter()
+    await sender.ping("TARGET")
+    while sender.outbox.pending("TARGET"):
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    print(f"drain  batch={sender.outbox.batch_size:<6} {received / elapsed:10.0f} msg/s")
+
+    await sender.stop()
+    await target.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else COUNT))
@@ -0,0 +1,72 @@
+"""Measure message cost under each serializer and event loop profile.
+
+For every available combination of serializer (json, orjson) and event
+loop (asyncio, uvloop), reports the encode+decode time of a telemetry
+packet and the round-trip time of PUSHes with that payload between two
+devices on localhost.
+
+Usage: python benchmarks/serializer_roundtrip.py [requests]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from easyhttp_python import EasyHTTPAsync
+from easyhttp_python._serializer import SERIALIZERS, get_serializer, new_event_loop, uvloop
+
+PAYLOAD = {
+    "device": "greenhouse-3",
+    "readings": [{"sensor": f"s{i}", "value": i * 0.37, "ok": i % 7 != 0} for i in range(40)],
+    "tags": {"site": "north", "firmware": "1.4.2"},
+}
+
+def codec_cost(name: str, rounds: int = 20000) -> float:
+    """Return microseconds per encode+decode of a PUSH packet."""
+    serializer = get_serializer(name)
+    packet = {"version": "0.4.0", "type": 5, "header": {"sender_id": "ABC123", "sender_port": 5000},
+              "data": PAYLOAD}
+    started = time.perf_counter()
+    for _ in range(rounds):
+        serializer.loads(serializer.dumps(packet))
+    return (time.perf_counter() - started) / rounds * 1e6
+
+async def round_trips(name: str, port: int, requests: int) -> float:
+    """Return microseconds per PUSH round trip between two devices."""
+    workdir = tempfile.mkdtemp(prefix="easyhttp-ser-")
+    kw = dict(enable_discovery=False, persist_devices=False, dedupe_window=0, serializer=name)
+    receiver = EasyHTTPAsync(port=port, config_file=os.path.join(workdir, "r.json"), **kw)
+    sender = EasyHTTPAsync(port=port + 1, config_file=os.path.join(workdir, "s.json"), **kw)
+    receiver.on("on_push", lambda sender_id, data, timestamp: True)
+    await receiver.start()
+    await sender.start()
+    sender.add(receiver.id, "127.0.0.1", port)
+
+    await sender.push(receiver.id, PAYLOAD)  # Open the connection
+    started = time.perf_counter()
+    for _ in range(requests):
+        await sender.push(receiver.id, PAYLOAD)
+    elapsed = time.perf_counter() - started
+
+    await sender.stop()
+    await receiver.stop()
+    return elapsed / requests * 1e6
+
+def main(requests: int) -> None:
+    loops = ["asyncio"] + (["uvloop"] if uvloop is not None else [])
+    port = 5840
+    print(f"{'serializer':>10} {'loop':>8} {'codec us':>9} {'push rtt us':>12}")
+    for name in SERIALIZERS:
+        codec = codec_cost(name)
+        for loop_name in loops:
+            loop = new_event_loop(loop_name)
+            try:
+                rtt = loop.run_until_complete(round_trips(name, port, requests))
+            finally:
+                loop.close()
+            port += 2
+            print(f"{name:>10} {loop_name:>8} {codec:9.1f} {rtt:12.0f}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
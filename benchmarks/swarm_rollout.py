@@ -0,0 +1,63 @@
+"""Simulate a firmware rollout to a local fleet with peer-assisted distribution.
+
+Starts one origin and N devices on localhost, shares an image on the
+origin and lets every device fetch it at the same time. Reports how many
+bytes the origin served compared to sending every device a full copy.
+
+Usage: python benchmarks/swarm_rollout.py [devices] [image MiB]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from easyhttp_python import EasyHTTPAsync
+
+BASE_PORT = 5700
+
+async def rollout(devices: int, image_mib: int) -> None:
+    workdir = tempfile.mkdtemp(prefix="easyhttp-swarm-")
+
+    def instance(name: str, port: int) -> EasyHTTPAsync:
+        return EasyHTTPAsync(
+            port=port,
+            config_file=os.path.join(workdir, f"{name}.json"),
+            enable_discovery=False,
+            persist_devices=False,
+            swarm_dir=os.path.join(workdir, name),
+        )
+
+    origin = instance("origin", BASE_PORT)
+    fleet = [instance(f"dev{i}", BASE_PORT + 1 + i) for i in range(devices)]
+    await asyncio.gather(origin.start(), *(d.start() for d in fleet))
+
+    image = os.path.join(workdir, "firmware.bin")
+    with open(image, "wb") as f:
+        f.write(os.urandom(image_mib * 1024 * 1024))
+    content_id = await origin.share_content(image)
+
+    for device in fleet:
+        device.add(origin.id, "127.0.0.1", BASE_PORT)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(d.fetch_content(content_id, origin.id) for d in fleet))
+    elapsed = time.perf_counter() - started
+
+    failed = [r for r in results if "error" in r]
+    image_bytes = image_mib * 1024 * 1024
+    origin_bytes = origin.swarm.stats()["bytes_served"]
+    print(f"devices:          {devices}")
+    print(f"image:            {image_mib} MiB")
+    print(f"rollout time:     {elapsed:.2f} s ({len(failed)} failed)")
+    print(f"origin served:    {origin_bytes / 2**20:.1f} MiB "
+          f"({origin_bytes / image_bytes:.1f} copies)")
+    print(f"direct push:      {devices * image_bytes / 2**20:.1f} MiB ({devices} copies)")
+    print(f"origin saving:    {100 * (1 - origin_bytes / (devices * image_bytes)):.1f}%")
+
+    await asyncio.gather(origin.stop(), *(d.stop() for d in fleet))
+
+if __name__ == "__main__":
+    devices = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    image_mib = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    asyncio.run(rollout(devices, image_mib))
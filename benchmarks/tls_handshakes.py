@@ -0,0 +1,102 @@
+"""Count TLS handshakes with and without connection reuse.
+
+Generates a throwaway self-signed certificate with the openssl CLI,
+starts two HTTPS devices on localhost and sends PINGs between them:
+once through the shared client session (connections are kept alive),
+once with a new session per request, as earlier versions did. Two plain
+HTTP devices give the baseline the cost of TLS is measured against.
+
+Usage: python benchmarks/tls_handshakes.py [requests]
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import aiohttp
+from easyhttp_python import EasyHTTPAsync
+
+def make_cert(directory: str, name: str):
+    cert, key = os.path.join(directory, name + ".crt"), os.path.join(directory, name + ".key")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-keyout", key, "-out", cert, "-subj", f"/CN={name}"],
+        check=True, capture_output=True,
+    )
+    return cert, key
+
+async def per_request_sessions(sender: EasyHTTPAsync, device_id: str, requests: int) -> int:
+    """PING with a new ClientSession per request; returns connections made."""
+    device = sender.devices[device_id]
+    created = 0
+    trace = aiohttp.TraceConfig()
+
+    async def on_create(session, context, params):
+        nonlocal created
+        created += 1
+
+    trace.on_connection_create_end.append(on_create)
+    packet = {"version": sender.__version__, "type": sender.commands.PING.value,
+              "header": {"sender_id": sender.id, "sender_port": sender.port}}
+    for _ in range(requests):
+        async with aiohttp.ClientSession(trace_configs=[trace]) as session:
+            async with session.post(sender.tls.url(device, "/easyhttp/api"), json=packet,
+                                    ssl=sender.tls.client_ssl(device)) as response:
+                await response.read()
+    return created
+
+async def plain_http(workdir: str, requests: int) -> float:
+    """PING between two plain HTTP devices; returns requests per second."""
+    kw = dict(enable_discovery=False, persist_devices=False)
+    server = EasyHTTPAsync(port=5803, config_file=os.path.join(workdir, "ps.json"), **kw)
+    client = EasyHTTPAsync(port=5804, config_file=os.path.join(workdir, "pc.json"), **kw)
+    await server.start()
+    await client.start()
+    client.add(server.id, "127.0.0.1", 5803)
+    for _ in range(20):
+        await client.ping(server.id)  # Warm up
+    started = time.perf_counter()
+    for _ in range(requests):
+        await client.ping(server.id)
+    elapsed = time.perf_counter() - started
+    await client.stop()
+    await server.stop()
+    return requests / elapsed
+
+async def main(requests: int) -> None:
+    workdir = tempfile.mkdtemp(prefix="easyhttp-tls-")
+    kw = dict(enable_discovery=False, persist_devices=False)
+    certs = [make_cert(workdir, name) for name in ("server", "client")]
+    server = EasyHTTPAsync(port=5801, config_file=os.path.join(workdir, "s.json"),
+                           tls_certfile=certs[0][0], tls_keyfile=certs[0][1], **kw)
+    client = EasyHTTPAsync(port=5802, config_file=os.path.join(workdir, "c.json"),
+                           tls_certfile=certs[1][0], tls_keyfile=certs[1][1], **kw)
+    await server.start()
+    await client.start()
+    client.add(server.id, "127.0.0.1", 5801, fingerprint=server.tls.fingerprint)
+    for _ in range(20):
+        await client.ping(server.id)  # Warm up, over the one connection
+    started = time.perf_counter()
+    for _ in range(requests):
+        await client.ping(server.id)
+    shared = time.perf_counter() - started
+    stats = client.tls.stats()
+
+    started = time.perf_counter()
+    created = await per_request_sessions(client, server.id, requests)
+    fresh = time.perf_counter() - started
+
+    await client.stop()
+    await server.stop()
+    plain = await plain_http(workdir, requests)
+
+    print(f"requests:                  {requests}")
+    print(f"plain HTTP:                {plain:.0f} req/s")
+    print(f"TLS, shared session:       {stats['connections']} handshakes, "
+          f"{stats['reused'] - 20} reused, {requests / shared:.0f} req/s")
+    print(f"TLS, session per request:  {created} handshakes, {requests / fresh:.0f} req/s")
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
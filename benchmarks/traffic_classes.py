@@ -0,0 +1,70 @@
+"""Measure PING health while bulk PUSHes are in flight to the same device.
+
+Starts two devices on localhost. One sends several large PUSHes, which
+the other takes a while to process, while PINGing it every 50 ms. Runs
+once with large payloads classified as bulk traffic and once with every
+request treated as control traffic, and reports delivered PUSHes,
+answered PINGs, PING latency and whether the circuit breaker opened.
+Both runs lower min_timeout to 0.2 s, so PING-driven timeouts are short
+enough for slow bulk requests to hit them.
+
+Usage: python benchmarks/traffic_classes.py [pushes] [payload_kb]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from easyhttp_python import EasyHTTPAsync
+
+async def run(name: str, port: int, bulk_threshold: int, pushes: int, payload_kb: int) -> None:
+    workdir = tempfile.mkdtemp(prefix="easyhttp-lanes-")
+    # Tight timeouts, as tuned for a fast LAN
+    kw = dict(enable_discovery=False, persist_devices=False, dedupe_window=0, min_timeout=0.2)
+    receiver = EasyHTTPAsync(port=port, config_file=os.path.join(workdir, "r.json"), **kw)
+    sender = EasyHTTPAsync(port=port + 1, config_file=os.path.join(workdir, "s.json"),
+                           bulk_threshold=bulk_threshold, **kw)
+
+    async def on_push(sender_id, data, timestamp):
+        if isinstance(data, dict) and "blob" in data:
+            await asyncio.sleep(0.8)  # A slow consumer, e.g. writing to flash
+        return True
+
+    receiver.on("on_push", on_push)
+    await receiver.start()
+    await sender.start()
+    sender.add(receiver.id, "127.0.0.1", port)
+    for _ in range(20):
+        await sender.ping(receiver.id)  # Learn the RTT
+
+    blob = {"blob": "x" * (payload_kb * 1024)}
+    pings = []
+
+    async def pinger():
+        for _ in range(40):
+            started = time.perf_counter()
+            ok = await sender.ping(receiver.id)
+            pings.append((ok, time.perf_counter() - started))
+            await asyncio.sleep(0.05)
+
+    pushed, _ = await asyncio.gather(
+        asyncio.gather(*(sender.push(receiver.id, blob) for _ in range(pushes))),
+        pinger(),
+    )
+    latencies = sorted(latency for ok, latency in pings if ok)
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else float("nan")
+    print(f"{name:>8}: {sum(pushed)}/{pushes} pushes, {sum(ok for ok, _ in pings)}/{len(pings)} pings, "
+          f"ping p99 {p99:6.1f} ms, circuit open: {sender.peers[receiver.id].is_open}")
+
+    await sender.stop()
+    await receiver.stop()
+
+async def main(pushes: int, payload_kb: int) -> None:
+    await run("classes", 5881, 64 * 1024, pushes, payload_kb)
+    await run("single", 5883, 1 << 40, pushes, payload_kb)
+
+if __name__ == "__main__":
+    pushes = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    payload_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    asyncio.run(main(pushes, payload_kb))
@@ -0,0 +1,58 @@
+"""Compare PING latency over loopback TCP and a Unix domain socket.
+
+Starts one client and two servers on localhost, one serving TCP only and
+one serving a Unix domain socket as well, and times sequential PINGs to
+each of them through the client's regular send() path, alternating
+between the two in rounds.
+
+Usage: python benchmarks/unix_latency.py [requests]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from easyhttp_python import EasyHTTPAsync
+
+async def measure(client: EasyHTTPAsync, device_id: str, requests: int) -> list:
+    await client.ping(device_id)  # Open the connection
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        await client.ping(device_id)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def report(name: str, samples: list) -> None:
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2] * 1e6
+    p99 = samples[int(len(samples) * 0.99)] * 1e6
+    print(f"{name:>5}: p50 {p50:7.0f} us, p99 {p99:7.0f} us, {len(samples) / sum(samples):7.0f} req/s")
+
+async def main(requests: int) -> None:
+    workdir = tempfile.mkdtemp(prefix="easyhttp-uds-")
+    kw = dict(enable_discovery=False, persist_devices=False, dedupe_window=0)
+    client = EasyHTTPAsync(port=5821, config_file=os.path.join(workdir, "c.json"), **kw)
+    tcp = EasyHTTPAsync(port=5822, config_file=os.path.join(workdir, "t.json"), **kw)
+    uds = EasyHTTPAsync(port=5823, config_file=os.path.join(workdir, "u.json"),
+                        unix_socket=os.path.join(workdir, "u.sock"), **kw)
+    for device in (client, tcp, uds):
+        await device.start()
+    client.add(tcp.id, "127.0.0.1", 5822)
+    client.add(uds.id, "127.0.0.1", 5823, unix_socket=uds.unix.path)
+
+    # Alternate in rounds so both see the same machine load
+    samples = {"tcp": [], "unix": []}
+    for _ in range(10):
+        samples["tcp"] += await measure(client, tcp.id, requests // 10)
+        samples["unix"] += await measure(client, uds.id, requests // 10)
+    for name, values in samples.items():
+        report(name, values)
+    print(f"requests over the socket: {client.unix.stats()['requests']}")
+
+    for device in (client, tcp, uds):
+        await device.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
@@ -0,0 +1,76 @@
+"""Simulate a fleet of devices on an in-memory virtual network.
+
+Starts N devices on one VirtualNetwork with discovery enabled, waits
+until every device knows every other one, then pushes a payload from one
+device to all others. Reports the convergence time and the traffic the
+protocol needed, per device and in total.
+
+Usage: python benchmarks/virtual_fleet.py [devices] [latency_ms] [loss]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from easyhttp_python import EasyHTTPAsync, VirtualNetwork
+
+async def main(count: int, latency: float, loss: float) -> None:
+    workdir = tempfile.mkdtemp(prefix="easyhttp-fleet-")
+    network = VirtualNetwork(latency=latency, jitter=latency / 2, loss=loss, seed=1)
+    devices = [
+        EasyHTTPAsync(
+            config_file=os.path.join(workdir, f"{i}.json"),
+            persist_devices=False,
+            dedupe_window=0,
+            network=network,
+        )
+        for i in range(count)
+    ]
+
+    async def on_push(sender_id, data, timestamp):
+        return True
+
+    started = time.perf_counter()
+    for device in devices:
+        device.on("on_push", on_push)
+        await device.start()
+    while sum(len(d.devices) for d in devices) < count * (count - 1):
+        if time.perf_counter() - started > 120:
+            break
+        await asyncio.sleep(0.05)
+    converged = time.perf_counter() - started
+    known = sum(len(d.devices) for d in devices) / (count * (count - 1))
+    await asyncio.sleep(1)  # Let the last PONGs arrive
+    discovery = network.stats()
+
+    source = devices[0]
+    payload = {"firmware": "1.2.3", "url": "http://10.0.0.1/fw.bin"}
+    started = time.perf_counter()
+    results = await asyncio.gather(*(source.push(device_id, payload) for device_id in list(source.devices)))
+    fanout = time.perf_counter() - started
+    acked = sum(1 for r in results if r)
+    total = network.stats()
+
+    for device in devices:
+        await device.stop()
+
+    push_requests = total["requests"] - discovery["requests"]
+    push_bytes = (total["request_bytes"] + total["response_bytes"]
+                  - discovery["request_bytes"] - discovery["response_bytes"])
+    print(f"{count} devices, {latency * 1000:.1f} ms latency, {loss:.0%} loss")
+    print(f"discovery: {known:.1%} of pairs known after {converged:.2f} s")
+    print(f"  datagrams {discovery['datagrams']} ({discovery['datagram_bytes'] / count:.0f} B per device), "
+          f"requests {discovery['requests']} "
+          f"({(discovery['request_bytes'] + discovery['response_bytes']) / count:.0f} B per device)")
+    print(f"push fan-out: {acked}/{len(results)} acked in {fanout:.2f} s, "
+          f"{push_requests} requests, {push_bytes / max(push_requests, 1):.0f} B per push and ACK")
+    print(f"lost messages: {total['lost']}")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(main(
+        int(args[0]) if args else 200,
+        float(args[1]) / 1000 if len(args) > 1 else 0.002,
+        float(args[2]) if len(args) > 2 else 0.0,
+    ))
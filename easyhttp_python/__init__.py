@@ -1,6 +1,9 @@
 from .core import EasyHTTPAsync
 from .wrapper import EasyHTTP
+from ._virtual import VirtualNetwork
+from ._serializer import install_uvloop
+from ._faults import FaultInjector
 
 __version__ = EasyHTTPAsync.__version__
 __author__ = "slpuk"
-__all__ = ["EasyHTTPAsync", "EasyHTTP"]
+__all__ = ["EasyHTTPAsync", "EasyHTTP", "VirtualNetwork", "FaultInjector", "install_uvloop"]
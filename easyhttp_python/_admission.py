@@ -0,0 +1,135 @@
+"""Server-side admission control module for EasyHTTP."""
+
+import asyncio
+import time
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from .core import EasyHTTPAsync
+
+class TokenBucket:
+    """Classic token bucket refilled at a fixed rate."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take one token.
+
+        Returns:
+            0.0 if a token was taken, otherwise seconds until one is available.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class AdmissionControl:
+    """Bounds concurrent requests and rate-limits senders.
+
+    Control traffic (PING, PONG, ACK, NACK) always bypasses the limits,
+    so a flooded device still answers health checks. Bulk traffic waits
+    for a free slot in a bounded queue and is shed when the queue is full
+    or the wait takes too long.
+    """
+
+    MAX_BUCKETS = 1024
+
+    def __init__(
+        self,
+        parent: "EasyHTTPAsync",
+        max_inflight: Optional[int] = None,
+        max_queue: int = 64,
+        queue_timeout: float = 1.0,
+        rate_limit: Optional[float] = None,
+        rate_burst: int = 10,
+    ):
+        self.parent = parent
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.rate_limit = rate_limit
+        self.rate_burst = rate_burst
+        self.control = {
+            parent.commands.PING.value,
+            parent.commands.PONG.value,
+            parent.commands.ACK.value,
+            parent.commands.NACK.value,
+        }
+        self.buckets = {}
+        self.inflight = 0
+        self.waiting = 0
+        self.counters = {"admitted": 0, "control": 0, "shed": 0, "rate_limited": 0}
+        self._slots: asyncio.Semaphore | None = None
+
+    def is_control(self, command_type) -> bool:
+        """Return True if the command travels in the priority lane."""
+        return command_type in self.control
+
+    async def acquire(self, sender_id: Optional[str], command_type) -> Optional[dict]:
+        """Admit a request or decide to shed it.
+
+        Returns:
+            None if the request was admitted (release() must follow),
+            or a dict with 'status' and 'retry_after' if it was rejected.
+        """
+        if self.is_control(command_type):
+            self.counters["control"] += 1
+            return None
+
+        if self.rate_limit and sender_id:
+            bucket = self._bucket(sender_id)
+            wait = bucket.take()
+            if wait:
+                self.counters["rate_limited"] += 1
+                return {"status": 429, "retry_after": wait}
+
+        if self.max_inflight:
+            if self._slots is None:
+                self._slots = asyncio.Semaphore(self.max_inflight)
+            if self._slots.locked():
+                if self.waiting >= self.max_queue:
+                    self.counters["shed"] += 1
+                    return {"status": 503, "retry_after": self.queue_timeout}
+                self.waiting += 1
+                try:
+                    await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+                except asyncio.TimeoutError:
+                    self.counters["shed"] += 1
+                    return {"status": 503, "retry_after": self.queue_timeout}
+                finally:
+                    self.waiting -= 1
+            else:
+                await self._slots.acquire()
+
+        self.inflight += 1
+        self.counters["admitted"] += 1
+        return None
+
+    def release(self, command_type) -> None:
+        """Free the slot taken by an admitted request."""
+        if self.is_control(command_type):
+            return
+        self.inflight -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    def stats(self) -> dict:
+        """Return in-flight, queued and rejection counters."""
+        return {"inflight": self.inflight, "queued": self.waiting, **self.counters}
+
+    def _bucket(self, sender_id: str) -> TokenBucket:
+        bucket = self.buckets.get(sender_id)
+        if bucket is None:
+            if len(self.buckets) >= self.MAX_BUCKETS:
+                # Drop the longest idle sender to keep memory bounded
+                idle = min(self.buckets, key=lambda s: self.buckets[s].updated)
+                del self.buckets[idle]
+            bucket = self.buckets[sender_id] = TokenBucket(self.rate_limit, self.rate_burst)
+        return bucket
@@ -0,0 +1,178 @@
+"""Fire-and-forget UDP datagrams for EasyHTTP.
+
+For high-rate telemetry where a lost sample does not matter, PUSH and
+DATA can go as single UDP datagrams (QoS 0: no ACK, no retries) to the
+device's port number. The receiver runs the same on_push/on_data
+callbacks as for HTTP. Unless sequence is off, each datagram carries a
+per-recipient 'seq' in its header, which lets the receiver count lost
+and reordered datagrams. Payloads larger than max_size are sent over
+HTTP instead.
+
+Received datagrams go straight to the command handler: admission
+control, duplicate suppression, per-sender ordering and fault injection
+apply only to requests over HTTP, and datagrams are neither encrypted
+nor authenticated, even with TLS enabled.
+"""
+
+import asyncio
+import socket
+import time
+from typing import TYPE_CHECKING, Any, Dict
+
+if TYPE_CHECKING:
+    from .core import EasyHTTPAsync
+
+from ._serializer import sock_recvfrom
+
+from loggity import Logger, Colors, LoggerConfig
+log_config = LoggerConfig(
+    colored = True,
+    timestamps = False,
+    timeformat = None,
+    file = None
+)
+log = Logger(config = log_config)
+
+class DatagramChannel:
+    """Sends and receives PUSH/DATA as UDP datagrams."""
+
+    def __init__(self, parent: "EasyHTTPAsync", max_size: int = 1200, sequence: bool = True):
+        self.parent = parent
+        self.max_size = max_size
+        self.sequence = sequence
+        self.sock: socket.socket | None = None
+        self.listen_task: asyncio.Task | None = None
+        self.next_seq: Dict[str, int] = {}
+        self.senders: Dict[str, dict] = {}
+        self.counters = {"sent": 0, "fallback": 0, "received": 0, "invalid": 0}
+
+    async def start(self):
+        """Bind the UDP socket to the device's port and start listening."""
+        if self.parent.network:
+            self.parent.network.bind(self.parent.network_ip, self.parent.port, self._handle)
+            return
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        # Bursts of telemetry should not overflow the default receive buffer
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024 * 1024)
+        self.sock.bind(("", self.parent.port))
+        self.sock.setblocking(False)
+        self.listen_task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        """Stop listening and close the socket."""
+        if self.listen_task:
+            self.listen_task.cancel()
+            try:
+                await self.listen_task
+            except asyncio.CancelledError:
+                pass
+            self.listen_task = None
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+        if self.parent.network and self.parent.network_ip:
+            self.parent.network.unbind(self.parent.network_ip, self.parent.port)
+
+    async def send(self, device_id: str, command_type: int, data: Any = None) -> bool:
+        """Send a PUSH or DATA without waiting for an answer.
+
+        Returns:
+            True if the datagram was handed to the network, or if a payload
+            too large for a datagram was delivered over HTTP.
+        """
+        device = self.parent.devices.get(device_id)
+        if device is None or (self.sock is None and not self.parent.network):
+            return False
+
+        header = {
+            "sender_id": self.parent.id,
+            "sender_port": self.parent.port,
+            "timestamp": int(time.time()),
+            "sent_at": time.time(),
+        }
+        if self.sequence:
+            seq = self.next_seq.get(device_id, 0)
+            self.next_seq[device_id] = seq + 1
+            header["seq"] = seq
+        packet = {"version": self.parent.__version__, "type": command_type, "header": header}
+        if data is not None:
+            packet["data"] = data
+
+        raw = self.parent.serializer.dumps(packet)
+        if len(raw) > self.max_size:
+            self.counters["fallback"] += 1
+            response = await self.parent.send(device_id, command_type, data)
+            return "error" not in response
+
+        try:
+            if self.parent.network:
+                self.parent.network.sendto((self.parent.network_ip, self.parent.port), raw, (device["ip"], device["port"]))
+            else:
+                self.sock.sendto(raw, (device["ip"], device["port"]))
+        except OSError as e:
+            if self.parent.debug:
+                log.custom("DATAGRAM", Colors.RED, f"Send to {device_id} failed: {e}")
+            return False
+        self.counters["sent"] += 1
+        return True
+
+    async def _listen(self):
+        while True:
+            try:
+                raw, addr = await sock_recvfrom(self.sock, 65535)
+                with self.parent.profiler.track("datagram", "message", addr[0]):
+                    await self._handle(raw, addr)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                if self.parent.debug:
+                    log.custom("DATAGRAM", Colors.RED, e)
+
+    async def _handle(self, raw: bytes, addr: tuple):
+        try:
+            packet = self.parent.serializer.loads(raw)
+            command_type = packet["type"]
+            header = packet.get("header") or {}
+            sender_id = header.get("sender_id")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.counters["invalid"] += 1
+            return
+        if command_type not in (self.parent.commands.PUSH.value, self.parent.commands.DATA.value):
+            self.counters["invalid"] += 1
+            return
+
+        self.counters["received"] += 1
+        if sender_id:
+            self.parent._learn_sender(sender_id, addr[0], header.get("sender_port", self.parent.port))
+        if "seq" in header:
+            self._account(sender_id, header["seq"])
+
+        await self.parent._handle_command(command_type, header, sender_id, packet)
+
+    def _account(self, sender_id: str, seq: int) -> None:
+        """Update loss and reordering counts of a sender."""
+        stats = self.senders.get(sender_id)
+        if stats is None or seq == 0:
+            # First datagram, or the sender restarted its sequence
+            stats = self.senders[sender_id] = {"received": 0, "lost": 0, "reordered": 0, "next": seq}
+        stats["received"] += 1
+        if seq >= stats["next"]:
+            stats["lost"] += seq - stats["next"]
+            stats["next"] = seq + 1
+        else:
+            # A late datagram was counted as lost when the gap appeared
+            stats["reordered"] += 1
+            stats["lost"] = max(0, stats["lost"] - 1)
+
+    def stats(self) -> dict:
+        """Return send counters and per-sender loss accounting."""
+        senders = {}
+        for sender_id, s in self.senders.items():
+            expected = s["received"] + s["lost"]
+            senders[sender_id] = {
+                "received": s["received"],
+                "lost": s["lost"],
+                "reordered": s["reordered"],
+                "loss_rate": round(s["lost"] / expected, 4) if expected else 0.0,
+            }
+        return {**self.counters, "senders": senders}
@@ -0,0 +1,112 @@
+"""Idempotency window for EasyHTTP requests.
+
+Every packet built by send() carries a random 'message_id' in its header
+that stays the same across retries. (Hedged FETCHes get an ID of their
+own: FETCH is idempotent, and the copy must not wait for the slow
+original it is meant to overtake.) The receiver
+keeps the response it gave to each (sender, message ID) for a while and
+replays it for duplicates instead of running the callbacks again. A
+duplicate that arrives while the original is still being handled waits
+for the original's response; if the original takes too long, the
+duplicate is turned away as IN_PROGRESS instead of being handled again.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+Key = Tuple[Optional[str], str]
+
+# Returned by lookup() for a duplicate whose original is still running
+IN_PROGRESS = "in_progress"
+
+class DedupeCache:
+    """Time-windowed store of responses, bounded in entries and bytes."""
+
+    # Seconds a duplicate turned away as IN_PROGRESS is asked to wait
+    RETRY_AFTER = 1.0
+
+    def __init__(self, window: float = 60.0, max_entries: int = 10000, max_bytes: int = 4 * 1024 * 1024):
+        self.window = window
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[Key, tuple]" = OrderedDict()
+        self.pending: Dict[Key, asyncio.Future] = {}
+        self.bytes = 0
+        self.counters = {"hits": 0, "pending_hits": 0, "in_progress": 0, "misses": 0, "evicted": 0}
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        while self.entries:
+            key, (stored_at, _, body, _) = next(iter(self.entries.items()))
+            if (
+                now - stored_at < self.window
+                and len(self.entries) <= self.max_entries
+                and self.bytes <= self.max_bytes
+            ):
+                break
+            self.entries.popitem(last=False)
+            self.bytes -= len(body)
+            if now - stored_at < self.window:
+                self.counters["evicted"] += 1
+
+    async def lookup(self, key: Key, timeout: float) -> Optional[tuple]:
+        """Return the stored (status_code, body, media_type) of a duplicate.
+
+        Returns:
+            The stored response, or None if the message is new. A new
+            message is marked pending until store() or forget() is called.
+            IN_PROGRESS if the original is still being handled after
+            timeout seconds; the duplicate must not be handled.
+        """
+        while True:
+            self._expire()
+            entry = self.entries.get(key)
+            if entry:
+                self.counters["hits"] += 1
+                return entry[1:]
+
+            future = self.pending.get(key)
+            if not future:
+                break
+            self.counters["pending_hits"] += 1
+            try:
+                response = await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                self.counters["in_progress"] += 1
+                return IN_PROGRESS
+            if response:
+                return response
+            # The original was dropped without a response, handle this one instead
+
+        self.counters["misses"] += 1
+        self.pending[key] = asyncio.get_running_loop().create_future()
+        return None
+
+    def store(self, key: Key, status_code: int, body: bytes, media_type: Optional[str]) -> None:
+        """Remember the response to a message and wake up waiting duplicates."""
+        response = (status_code, body, media_type)
+        future = self.pending.pop(key, None)
+        if future and not future.done():
+            future.set_result(response)
+        if len(body) > self.max_bytes:
+            return
+        self.entries[key] = (time.monotonic(), *response)
+        self.bytes += len(body)
+        self._expire()
+
+    def forget(self, key: Key) -> None:
+        """Drop a pending message whose response must not be replayed."""
+        future = self.pending.pop(key, None)
+        if future and not future.done():
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        """Return hit counters and memory use."""
+        return {
+            **self.counters,
+            "entries": len(self.entries),
+            "pending": len(self.pending),
+            "bytes": self.bytes,
+        }
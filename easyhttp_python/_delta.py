@@ -0,0 +1,129 @@
+"""Delta encoding of repeated PUSH/DATA payloads for EasyHTTP.
+
+A sender keeps the last state the receiver acknowledged and transmits
+only the top-level keys that changed since then:
+
+    header: {"delta": {"seq": 7, "base": 6}}
+    data:   {"set": {"temperature": 24.6}, "unset": ["error"]}
+
+A full state is sent with "base": None. When the receiver's state is
+not at "base" (restart, lost update, reordering) it answers with a
+NACK carrying "resync": True and the sender falls back to a full state.
+"""
+
+import copy
+import json
+from typing import Any, Dict, Optional, Tuple
+
+def _size(data: Any) -> int:
+    return len(json.dumps(data, separators=(",", ":")))
+
+class DeltaEncoder:
+    """Sender side: per-stream acknowledged state and sequence numbers."""
+
+    def __init__(self):
+        self.streams: Dict[Tuple[str, int], dict] = {}
+        self.counters = {"full": 0, "delta": 0, "resync": 0, "full_bytes": 0, "sent_bytes": 0}
+
+    def encode(self, key: Tuple[str, int], data: dict, full: bool = False) -> Tuple[Any, dict]:
+        """Build the payload and header for the next state of a stream.
+
+        Args:
+            key: Stream key, (device_id, command value).
+            data: New full state.
+            full: Force sending the full state.
+
+        Returns:
+            Tuple of (payload, 'delta' header field).
+        """
+        stream = self.streams.setdefault(key, {"seq": 0, "acked_seq": None, "state": None})
+        stream["seq"] += 1
+        base = stream["state"]
+
+        if full or base is None:
+            payload = data
+            spec = {"seq": stream["seq"], "base": None}
+            self.counters["full"] += 1
+        else:
+            payload = {
+                "set": {k: v for k, v in data.items() if k not in base or base[k] != v},
+                "unset": [k for k in base if k not in data],
+            }
+            spec = {"seq": stream["seq"], "base": stream["acked_seq"]}
+            # Mostly-changed states are cheaper to send whole
+            if _size(payload) >= _size(data):
+                payload = data
+                spec["base"] = None
+                self.counters["full"] += 1
+            else:
+                self.counters["delta"] += 1
+
+        self.counters["full_bytes"] += _size(data)
+        self.counters["sent_bytes"] += _size(payload)
+        return payload, spec
+
+    def acked(self, key: Tuple[str, int], seq: int, data: dict) -> None:
+        """Remember a state the receiver has acknowledged.
+
+        The state is deep-copied, so nested values the caller changes in
+        place later are still seen as changed.
+        """
+        stream = self.streams[key]
+        if stream["acked_seq"] is None or seq > stream["acked_seq"]:
+            stream["acked_seq"] = seq
+            stream["state"] = copy.deepcopy(data)
+
+    def resync(self, key: Tuple[str, int]) -> None:
+        """Forget the acknowledged state so the next send is a full one."""
+        self.counters["resync"] += 1
+        stream = self.streams.get(key)
+        if stream:
+            stream["acked_seq"] = None
+            stream["state"] = None
+
+    def stats(self) -> dict:
+        """Return message counts and bytes saved compared to full payloads."""
+        saved = self.counters["full_bytes"] - self.counters["sent_bytes"]
+        return {**self.counters, "saved_bytes": saved}
+
+class DeltaDecoder:
+    """Receiver side: reconstructs full states per sender and stream."""
+
+    MAX_STREAMS = 1024
+
+    def __init__(self):
+        self.streams: Dict[Tuple[str, int], dict] = {}
+
+    def decode(self, key: Tuple[str, int], payload: Any, spec: dict) -> Optional[dict]:
+        """Rebuild the full state carried by a delta message.
+
+        Returns:
+            The full state, or None if the sender has to resync.
+        """
+        if spec.get("base") is None:
+            return payload if isinstance(payload, dict) else None
+
+        stream = self.streams.get(key)
+        if stream is None or stream["seq"] != spec["base"] or not isinstance(payload, dict):
+            return None
+        unset = payload.get("unset") or []
+        if not isinstance(payload.get("set") or {}, dict) or not isinstance(unset, list):
+            return None
+        if not all(isinstance(name, str) for name in unset):
+            return None
+
+        state = dict(stream["state"])
+        state.update(payload.get("set") or {})
+        for name in unset:
+            state.pop(name, None)
+        return state
+
+    def commit(self, key: Tuple[str, int], seq: int, state: dict) -> None:
+        """Make a decoded state the base for the sender's next delta.
+
+        The state is deep-copied, so callbacks changing it in place do not
+        alter the base.
+        """
+        if key not in self.streams and len(self.streams) >= self.MAX_STREAMS:
+            self.streams.pop(next(iter(self.streams)))
+        self.streams[key] = {"seq": seq, "state": copy.deepcopy(state)}
@@ -3,12 +3,13 @@
 import asyncio
 import socket
 import struct
-import json
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
 if TYPE_CHECKING:
     from .core import EasyHTTPAsync
 
+from ._serializer import sock_recvfrom
+
 from loggity import Logger, Colors, LoggerConfig
 log_config = LoggerConfig(
     colored = True,
@@ -21,6 +22,9 @@ log = Logger(config = log_config)
 class Discovery:
     """Manages UDP multicast discovery for EasyHTTP devices."""
 
+    # Tags and groups carried by one discovery datagram
+    MAX_NAMES = 16
+
     def __init__(
         self,
         parent: "EasyHTTPAsync",
@@ -57,6 +61,10 @@ class Discovery:
 
     async def _listen_multicast(self):
         """Listen for DISCOVERY messages from other devices."""
+        if self.parent.network:
+            await self._listen_virtual()
+            return
+
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         sock.bind(("", self.multicast_port))
@@ -67,33 +75,65 @@ class Discovery:
         sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
         sock.setblocking(False)
 
-        loop = asyncio.get_event_loop()
         while True:
             try:
-                data, addr = await loop.sock_recvfrom(sock, 1024)
-                await self._handle_discovery_message(data, addr)
+                data, addr = await sock_recvfrom(sock, 65535)
+                await self._receive(data, addr)
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 if self.parent.debug:
                     log.custom("DISCOVERY", Colors.RED, e)
 
+    async def _listen_virtual(self):
+        """Join the multicast group of the virtual network until cancelled."""
+        network, ip = self.parent.network, self.parent.network_ip
+        network.bind(ip, self.multicast_port, self._receive)
+        network.join(self.multicast_group, self.multicast_port, ip)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            network.leave(self.multicast_group, self.multicast_port, ip)
+            network.unbind(ip, self.multicast_port)
+
+    async def _receive(self, data: bytes, addr: tuple):
+        if self.parent.faults:
+            try:
+                command = self.parent.serializer.loads(data).get("type")
+            except (ValueError, AttributeError):
+                command = None
+            await self.parent.faults.datagram(addr[0], command, lambda: self._process(data, addr))
+        else:
+            await self._process(data, addr)
+
+    async def _process(self, data: bytes, addr: tuple):
+        with self.parent.profiler.track("discovery", "message", addr[0]):
+            await self._handle_discovery_message(data, addr)
+
+    def _sendto(self, payload: bytes, addr: tuple, sock: Optional[socket.socket] = None):
+        """Send a datagram through the virtual network or a real socket."""
+        if self.parent.network:
+            self.parent.network.sendto((self.parent.network_ip, self.multicast_port), payload, addr)
+        elif sock:
+            sock.sendto(payload, addr)
+        else:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP) as sock:
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+                sock.sendto(payload, addr)
+
     async def _broadcast_presence(self):
         """Periodically broadcast DISCOVERY messages."""
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+        sock = None
+        if not self.parent.network:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
 
         while True:
             try:
-                packet = {
-                    "version": self.version,
-                    "type": self.parent.commands.DISCOVERY.value,
-                    "id": self.parent.id,
-                    "port": self.parent.port,
-                }
-                sock.sendto(
-                    json.dumps(packet).encode(),
+                self._sendto(
+                    self.parent.serializer.dumps(self._packet(self.parent.commands.DISCOVERY)),
                     (self.multicast_group, self.multicast_port),
+                    sock,
                 )
                 await asyncio.sleep(30)
             except asyncio.CancelledError:
@@ -102,10 +142,42 @@ class Discovery:
                 if self.parent.debug:
                     log.custom("DISCOVERY", Colors.RED, e)
 
+    def _packet(self, command) -> dict:
+        """Build a DISCOVERY or DISCOVERY_ACK packet."""
+        packet = {
+            "version": self.version,
+            "type": command.value,
+            "id": self.parent.id,
+            "port": self.parent.port,
+        }
+        if self.parent.tls.enabled:
+            packet["fp"] = self.parent.tls.fingerprint
+        packet.update(self.parent.unix.endpoint())
+        if self.parent.tags:
+            packet["tags"] = self.parent.tags[: self.MAX_NAMES]
+        if self.parent.groups.joined:
+            packet["groups"] = sorted(self.parent.groups.joined)[: self.MAX_NAMES]
+        if self.parent.swarm:
+            content = self.parent.swarm.announced()
+            if content:
+                packet["content"] = content
+        return packet
+
+    def announce(self):
+        """Broadcast a DISCOVERY message right away, e.g. for new content."""
+        try:
+            self._sendto(
+                self.parent.serializer.dumps(self._packet(self.parent.commands.DISCOVERY)),
+                (self.multicast_group, self.multicast_port),
+            )
+        except OSError as e:
+            if self.parent.debug:
+                log.custom("DISCOVERY", Colors.RED, e)
+
     async def _handle_discovery_message(self, data: bytes, addr: tuple):
         """Process incoming discovery messages."""
         try:
-            message = json.loads(data.decode())
+            message = self.parent.serializer.loads(data)
             cmd_type = message.get("type")
 
             # Received DISCOVERY -> send DISCOVERY_ACK
@@ -114,15 +186,17 @@ class Discovery:
                 device_port = message.get("port")
 
                 if device_id and device_id != self.parent.id:
-                    ack_packet = {
-                        "version": self.version,
-                        "type": self.parent.commands.DISCOVERY_ACK.value,
-                        "id": self.parent.id,
-                        "port": self.parent.port,
-                    }
-                    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                    sock.sendto(
-                        json.dumps(ack_packet).encode(),
+                    self.parent._learn_address(device_id, addr[0], device_port)
+                    self.parent._peer_seen(device_id)
+                    self.parent._learn_tls(device_id, message.get("fp"))
+                    self.parent._learn_socket(device_id, message.get("host"), message.get("uds"), addr[0])
+                    self.parent._learn_tags(device_id, message.get("tags"))
+                    self.parent._learn_groups(device_id, message.get("groups", []))
+                    if self.parent.swarm:
+                        self.parent.swarm.seen(device_id, message.get("content"))
+                    ack_packet = self._packet(self.parent.commands.DISCOVERY_ACK)
+                    self._sendto(
+                        self.parent.serializer.dumps(ack_packet),
                         (addr[0], self.multicast_port),
                     )
                     if self.parent.debug:
@@ -134,11 +208,21 @@ class Discovery:
                 device_port = message.get("port")
 
                 if device_id and device_id != self.parent.id:
+                    if self.parent.swarm:
+                        self.parent.swarm.seen(device_id, message.get("content"))
                     if device_id not in self.parent.devices:
+                        if not self.parent._valid_port(device_port):
+                            return
                         self.parent.add(device_id, addr[0], device_port)
                         if self.parent.debug:
                             log.custom("DISCOVERY", Colors.GREEN, f"Found device {device_id} at {addr[0]}")
                         asyncio.create_task(self.parent.ping(device_id))
+                    else:
+                        self.parent._learn_address(device_id, addr[0], device_port)
+                    self.parent._learn_tls(device_id, message.get("fp"))
+                    self.parent._learn_socket(device_id, message.get("host"), message.get("uds"), addr[0])
+                    self.parent._learn_tags(device_id, message.get("tags"))
+                    self.parent._learn_groups(device_id, message.get("groups", []))
 
         except Exception as e:
             if self.parent.debug:
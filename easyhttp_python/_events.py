@@ -0,0 +1,177 @@
+"""Async iterator event streams for EasyHTTP."""
+
+import asyncio
+import time
+from typing import Any, Iterable, List, Optional, Set
+
+EVENT_KINDS = ("ping", "pong", "push", "data", "poll")
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+# Queued by close() to wake up consumers waiting for the next event
+_CLOSED = object()
+
+class Subscription:
+    """Bounded queue of events for one consumer.
+
+    Iterate with `async for event in subscription`; each event is a dict
+    with 'kind', 'sender_id', 'data', 'timestamp' and 'received_at'.
+    """
+
+    def __init__(
+        self,
+        hub: "EventHub",
+        kinds: Set[str],
+        maxsize: int,
+        overflow: str,
+        block_timeout: float,
+    ):
+        self.hub = hub
+        self.kinds = kinds
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+        self.closed = False
+
+    async def offer(self, event: dict) -> bool:
+        """Try to enqueue an event according to the overflow policy.
+
+        Returns:
+            True if the event was admitted.
+        """
+        if self.overflow == "block":
+            try:
+                await asyncio.wait_for(self.queue.put(event), self.block_timeout)
+                return True
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                return False
+
+        if self.queue.full():
+            self.dropped += 1
+            if self.overflow == "drop_newest":
+                return False
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+        return True
+
+    async def _next(self) -> Optional[dict]:
+        """Wait for the next event, or return None once closed."""
+        if self.closed and self.queue.empty():
+            return None
+        event = await self.queue.get()
+        if event is _CLOSED:
+            # Leave it for the other consumers
+            self.queue.put_nowait(_CLOSED)
+            return None
+        return event
+
+    async def get(self) -> Optional[dict]:
+        """Wait for the next event.
+
+        Returns:
+            The event, or None once the subscription is closed.
+        """
+        return await self._next()
+
+    async def batch(self, max_items: int = 100, timeout: Optional[float] = None) -> List[dict]:
+        """Wait for at least one event and return up to max_items queued ones.
+
+        Args:
+            max_items: Maximum number of events to return.
+            timeout: Seconds to wait for the first event, None to wait forever.
+
+        Returns:
+            List of events, empty if the timeout passed or the
+            subscription is closed.
+        """
+        try:
+            first = await asyncio.wait_for(self._next(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        if first is None:
+            return []
+        events = [first]
+        while len(events) < max_items and not self.queue.empty():
+            event = self.queue.get_nowait()
+            if event is _CLOSED:
+                self.queue.put_nowait(_CLOSED)
+                break
+            events.append(event)
+        return events
+
+    def close(self) -> None:
+        """Stop receiving events and end iteration once the queue is drained."""
+        if self.closed:
+            return
+        self.closed = True
+        self.hub.subscriptions.discard(self)
+        if not self.queue.full():
+            # Only an empty queue can have consumers waiting on it
+            self.queue.put_nowait(_CLOSED)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> dict:
+        event = await self._next()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+class EventHub:
+    """Fans received events out to all matching subscriptions."""
+
+    def __init__(self):
+        self.subscriptions: Set[Subscription] = set()
+
+    def subscribe(
+        self,
+        kinds: Optional[Iterable[str]] = None,
+        maxsize: int = 1000,
+        overflow: str = "block",
+        block_timeout: float = 1.0,
+    ) -> Subscription:
+        """Create a new subscription.
+
+        Raises:
+            ValueError: If a kind or the overflow policy is unknown.
+        """
+        kinds = set(kinds or EVENT_KINDS)
+        unknown = kinds - set(EVENT_KINDS)
+        if unknown:
+            raise ValueError(f"Unknown event kinds: {', '.join(sorted(unknown))}")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+
+        subscription = Subscription(self, kinds, maxsize, overflow, block_timeout)
+        self.subscriptions.add(subscription)
+        return subscription
+
+    def has(self, kind: str) -> bool:
+        """Return True if any subscription wants events of this kind."""
+        return any(kind in s.kinds for s in self.subscriptions)
+
+    async def publish(self, kind: str, sender_id: Optional[str], data: Any = None, timestamp: Any = None) -> bool:
+        """Offer an event to every matching subscription.
+
+        Returns:
+            True if at least one subscription admitted the event.
+        """
+        event = {
+            "kind": kind,
+            "sender_id": sender_id,
+            "data": data,
+            "timestamp": timestamp,
+            "received_at": time.time(),
+        }
+        admitted = False
+        for subscription in [s for s in self.subscriptions if kind in s.kinds]:
+            admitted = await subscription.offer(event) or admitted
+        return admitted
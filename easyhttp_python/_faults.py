@@ -0,0 +1,298 @@
+"""Fault injection for EasyHTTP.
+
+A FaultInjector holds rules that degrade traffic on purpose, to measure
+how retries, timeouts, duplicate suppression and discovery cope with a
+lossy network on a single host. Instances created with
+faults=FaultInjector(...) pass their outgoing requests, their incoming
+API requests and their incoming discovery datagrams through it.
+
+A rule matches by direction ('send', 'receive' or 'discovery'), by peer
+(device ID, or IP address for discovery) and by command, and can:
+
+- delay a message by a fixed time or a random distribution
+- drop a request (the sender times out) or its response (the command
+  still runs, the sender times out)
+- duplicate a message, so it is handled twice
+- reorder messages by holding some of them back
+- truncate a response, so it fails to decode
+
+All random decisions come from one seeded generator, so a benchmark run
+can be repeated with the same faults.
+"""
+
+import asyncio
+import random
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from fastapi.responses import Response
+
+DIRECTIONS = ("send", "receive", "discovery")
+Latency = Union[None, float, Tuple, Callable[[random.Random], float]]
+
+class FaultInjector:
+    """Injects latency, loss, duplicates, reordering and truncation.
+
+    Args:
+        seed: Seed of the random generator.
+        hold: Seconds a dropped request or response is held by the
+            receiving side before the connection is answered with an
+            error; the sender has usually timed out by then.
+    """
+
+    def __init__(self, seed: Optional[int] = None, hold: float = 30.0):
+        self.random = random.Random(seed)
+        self.hold = hold
+        self.rules: List[dict] = []
+        self.counters = {
+            "messages": 0,
+            "delayed": 0,
+            "dropped": 0,
+            "dropped_responses": 0,
+            "duplicated": 0,
+            "reordered": 0,
+            "truncated": 0,
+        }
+
+    def add(
+        self,
+        direction: str = "send",
+        peer: Optional[str] = None,
+        command: Any = None,
+        latency: Latency = None,
+        drop: float = 0.0,
+        drop_response: float = 0.0,
+        duplicate: float = 0.0,
+        reorder: float = 0.0,
+        reorder_delay: Latency = 0.05,
+        partial: float = 0.0,
+    ) -> int:
+        """Add a rule and return its index.
+
+        Args:
+            direction: 'send' (requests this device sends), 'receive'
+                (API requests it serves) or 'discovery' (discovery
+                datagrams it receives).
+            peer: Device ID (or, for discovery, IP address) the rule
+                applies to. Defaults to None (every peer).
+            command: Command type(s) the rule applies to, as commands
+                members or values. Defaults to None (every command).
+            latency: Delay of every matching message: seconds, or
+                ('uniform', low, high), ('normal', mean, stddev),
+                ('exponential', mean), ('lognormal', mu, sigma),
+                ('pareto', scale, alpha), or a function of a
+                random.Random returning seconds. Defaults to None.
+            drop: Probability that a request is lost. Defaults to 0.0.
+            drop_response: Probability that a response is lost after
+                the command ran. Defaults to 0.0.
+            duplicate: Probability that a message is delivered twice.
+                Defaults to 0.0.
+            reorder: Probability that a message is held back by
+                reorder_delay, so later ones overtake it. Defaults to 0.0.
+            reorder_delay: How long reordered messages are held back, in
+                the same forms as latency. Defaults to 0.05.
+            partial: Probability that a response is truncated. Defaults
+                to 0.0.
+
+        Raises:
+            ValueError: If the direction or a latency distribution is unknown.
+        """
+        if direction not in DIRECTIONS:
+            raise ValueError(f"Unknown direction '{direction}', choose from {DIRECTIONS}")
+        for spec in (latency, reorder_delay):
+            self._sample(spec)  # Fail early on bad distributions
+        if command is not None:
+            commands = command if isinstance(command, (list, tuple, set)) else [command]
+            command = {getattr(c, "value", c) for c in commands}
+        self.rules.append({
+            "direction": direction,
+            "peer": peer,
+            "command": command,
+            "latency": latency,
+            "drop": drop,
+            "drop_response": drop_response,
+            "duplicate": duplicate,
+            "reorder": reorder,
+            "reorder_delay": reorder_delay,
+            "partial": partial,
+        })
+        return len(self.rules) - 1
+
+    def clear(self) -> None:
+        """Remove all rules."""
+        self.rules.clear()
+
+    def _sample(self, spec: Latency) -> float:
+        """Draw a delay in seconds from a latency specification."""
+        if spec is None:
+            return 0.0
+        if callable(spec):
+            return max(0.0, float(spec(self.random)))
+        if isinstance(spec, (int, float)):
+            return float(spec)
+        kind, *args = spec
+        if kind == "uniform":
+            value = self.random.uniform(*args)
+        elif kind == "normal":
+            value = self.random.gauss(*args)
+        elif kind == "exponential":
+            value = self.random.expovariate(1 / args[0])
+        elif kind == "lognormal":
+            value = self.random.lognormvariate(*args)
+        elif kind == "pareto":
+            value = args[0] * self.random.paretovariate(args[1])
+        else:
+            raise ValueError(f"Unknown latency distribution '{kind}'")
+        return max(0.0, value)
+
+    def decide(self, direction: str, peer: Optional[str], command: Any) -> Optional[dict]:
+        """Roll the faults of one message.
+
+        Returns:
+            Dict with 'delay', 'drop', 'drop_response', 'duplicate' and
+            'partial', or None if no rule matches.
+        """
+        effects = None
+        for rule in self.rules:
+            if rule["direction"] != direction:
+                continue
+            if rule["peer"] is not None and rule["peer"] != peer:
+                continue
+            if rule["command"] is not None and command not in rule["command"]:
+                continue
+            if effects is None:
+                effects = {"delay": 0.0, "drop": False, "drop_response": False, "duplicate": False, "partial": False}
+            effects["delay"] += self._sample(rule["latency"])
+            if rule["reorder"] and self.random.random() < rule["reorder"]:
+                effects["delay"] += self._sample(rule["reorder_delay"])
+                self.counters["reordered"] += 1
+            for fault in ("drop", "drop_response", "duplicate", "partial"):
+                if rule[fault] and self.random.random() < rule[fault]:
+                    effects[fault] = True
+        if effects is not None:
+            self.counters["messages"] += 1
+            if effects["delay"]:
+                self.counters["delayed"] += 1
+        return effects
+
+    async def send(
+        self,
+        peer: str,
+        command: Any,
+        timeout: float,
+        exchange: Callable[[], Awaitable[Tuple[int, Any]]],
+    ) -> Tuple[int, Any]:
+        """Run a client request through the 'send' rules.
+
+        Args:
+            peer: ID of the device the request goes to.
+            command: Command type of the request.
+            timeout: Timeout of the request.
+            exchange: Performs the real request, returning (status, body).
+
+        Returns:
+            (status, body) of the response.
+
+        Raises:
+            asyncio.TimeoutError: If the request or its response was dropped.
+            ValueError: If the response was truncated.
+        """
+        effects = self.decide("send", peer, command)
+        if effects is None:
+            return await exchange()
+
+        async def run():
+            if effects["delay"]:
+                await asyncio.sleep(effects["delay"])
+            if effects["drop"]:
+                self.counters["dropped"] += 1
+                await asyncio.sleep(timeout)
+                raise asyncio.TimeoutError
+            if effects["duplicate"]:
+                self.counters["duplicated"] += 1
+                asyncio.ensure_future(exchange()).add_done_callback(_ignore)
+            result = await exchange()
+            if effects["drop_response"]:
+                self.counters["dropped_responses"] += 1
+                await asyncio.sleep(timeout)
+                raise asyncio.TimeoutError
+            if effects["partial"]:
+                self.counters["truncated"] += 1
+                raise ValueError("Truncated response")
+            return result
+
+        return await asyncio.wait_for(run(), timeout)
+
+    async def receive(
+        self,
+        peer: Optional[str],
+        command: Any,
+        dispatch: Callable[[], Awaitable[Response]],
+    ) -> Response:
+        """Run an incoming API request through the 'receive' rules.
+
+        Args:
+            peer: ID of the device the request came from.
+            command: Command type of the request.
+            dispatch: Handles the request, returning the response.
+
+        Returns:
+            The response, truncated if a 'partial' fault hit it.
+        """
+        effects = self.decide("receive", peer, command)
+        if effects is None:
+            return await dispatch()
+        if effects["delay"]:
+            await asyncio.sleep(effects["delay"])
+        if effects["drop"]:
+            self.counters["dropped"] += 1
+            await asyncio.sleep(self.hold)
+            return Response(status_code=504)
+        if effects["duplicate"]:
+            self.counters["duplicated"] += 1
+            asyncio.ensure_future(dispatch()).add_done_callback(_ignore)
+        response = await dispatch()
+        if effects["drop_response"]:
+            self.counters["dropped_responses"] += 1
+            await asyncio.sleep(self.hold)
+            return Response(status_code=504)
+        if effects["partial"]:
+            self.counters["truncated"] += 1
+            body = bytes(response.body)
+            return Response(body[: len(body) // 2], status_code=response.status_code, media_type=response.media_type)
+        return response
+
+    async def datagram(self, peer: Optional[str], command: Any, deliver: Callable[[], Awaitable[Any]]) -> None:
+        """Run an incoming discovery datagram through the 'discovery' rules.
+
+        Delayed datagrams are delivered in the background, so datagrams
+        behind them are not held up.
+        """
+        effects = self.decide("discovery", peer, command)
+        if effects is None:
+            await deliver()
+            return
+        if effects["drop"]:
+            self.counters["dropped"] += 1
+            return
+        copies = 2 if effects["duplicate"] else 1
+        if effects["duplicate"]:
+            self.counters["duplicated"] += 1
+
+        async def run():
+            await asyncio.sleep(effects["delay"])
+            for _ in range(copies):
+                await deliver()
+
+        if effects["delay"]:
+            asyncio.ensure_future(run()).add_done_callback(_ignore)
+        else:
+            await run()
+
+    def stats(self) -> Dict[str, int]:
+        """Return how many messages were hit by each kind of fault."""
+        return dict(self.counters)
+
+def _ignore(task: asyncio.Future) -> None:
+    """Retrieve the outcome of a duplicate, which nobody waits for."""
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,374 @@
+"""Multicast device groups for EasyHTTP.
+
+A device can join named groups. Each group maps to an IP multicast
+address (239.255.x.y, derived from the name) on a shared port, and the
+joined groups are announced via discovery. push_group() sends a PUSH to
+every member in a single datagram; members handle it like a PUSH over
+HTTP and, if asked to, answer with an ACK datagram. Known members that
+have not answered by the deadline are retried over HTTP with the same
+message ID, so a member whose ACK was lost does not apply it twice.
+
+Group datagrams are neither encrypted nor authenticated. A device with
+TLS enabled therefore refuses them and sends its own group PUSHes over
+HTTPS to every known member; members that refused a datagram get it
+again over HTTP(S) when the sender retries them.
+"""
+
+import asyncio
+import hashlib
+import secrets
+import socket
+import struct
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional
+
+if TYPE_CHECKING:
+    from .core import EasyHTTPAsync
+
+from ._serializer import sock_recvfrom
+
+from loggity import Logger, Colors, LoggerConfig
+log_config = LoggerConfig(
+    colored = True,
+    timestamps = False,
+    timeformat = None,
+    file = None
+)
+log = Logger(config = log_config)
+
+def group_address(name: str) -> str:
+    """Return the multicast address of a group."""
+    digest = hashlib.sha256(name.encode()).digest()
+    return f"239.255.{digest[0]}.{digest[1]}"
+
+class Groups:
+    """Joins multicast groups and pushes to all members of a group at once."""
+
+    def __init__(
+        self,
+        parent: "EasyHTTPAsync",
+        names: Iterable[str] = (),
+        port: int = 37021,
+        max_size: int = 1200,
+    ):
+        self.parent = parent
+        self.port = port
+        self.max_size = max_size
+        self.joined = set(names)
+        self.started = False
+        self.sock: socket.socket | None = None  # Bound to the group port, receives group PUSHes
+        self.reply_sock: socket.socket | None = None  # Sends group PUSHes, receives their ACKs
+        self.listen_tasks: List[asyncio.Task] = []
+        self.pending: Dict[str, dict] = {}
+        self.counters = {"sent": 0, "fallback": 0, "received": 0, "acks": 0, "retried": 0, "failed": 0, "invalid": 0, "refused": 0}
+
+    @property
+    def reply_port(self) -> int:
+        """Port ACKs are sent to on the virtual network."""
+        return self.port + 1
+
+    async def start(self):
+        """Join the configured groups."""
+        self.started = True
+        if self.parent.network:
+            self.parent.network.bind(self.parent.network_ip, self.port, self._receive)
+            self.parent.network.bind(self.parent.network_ip, self.reply_port, self._receive)
+        for name in self.joined:
+            self._subscribe(name)
+
+    async def stop(self):
+        """Leave all groups on the network and close the sockets."""
+        self.started = False
+        for task in self.listen_tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.listen_tasks.clear()
+        for sock in (self.sock, self.reply_sock):
+            if sock:
+                sock.close()
+        self.sock = self.reply_sock = None
+        if self.parent.network and self.parent.network_ip:
+            for name in self.joined:
+                self.parent.network.leave(group_address(name), self.port, self.parent.network_ip)
+            self.parent.network.unbind(self.parent.network_ip, self.port)
+            self.parent.network.unbind(self.parent.network_ip, self.reply_port)
+
+    def join(self, name: str) -> None:
+        """Become a member of a group and announce it."""
+        if name in self.joined:
+            return
+        self.joined.add(name)
+        if self.started:
+            self._subscribe(name)
+            self._announce()
+
+    def leave(self, name: str) -> None:
+        """Stop being a member of a group and announce it."""
+        if name not in self.joined:
+            return
+        self.joined.discard(name)
+        if self.started:
+            self._unsubscribe(name)
+            self._announce()
+
+    def members(self, name: str) -> List[str]:
+        """Return the IDs of known devices that announced a group."""
+        return [
+            device_id
+            for device_id, device in self.parent.devices.items()
+            if name in (device.get("groups") or ())
+        ]
+
+    def _announce(self) -> None:
+        discovery = getattr(self.parent, "discovery", None)
+        if discovery and discovery.enabled:
+            discovery.announce()
+
+    def _subscribe(self, name: str) -> None:
+        address = group_address(name)
+        if self.parent.network:
+            self.parent.network.join(address, self.port, self.parent.network_ip)
+            return
+        if self.sock is None:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.sock.bind(("", self.port))
+            self.sock.setblocking(False)
+            self.listen_tasks.append(asyncio.create_task(self._listen(self.sock)))
+        mreq = struct.pack("4sl", socket.inet_aton(address), socket.INADDR_ANY)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+        if self.parent.debug:
+            log.custom("GROUP", Colors.GREEN, f"Joined '{name}' on {address}:{self.port}")
+
+    def _unsubscribe(self, name: str) -> None:
+        address = group_address(name)
+        if self.parent.network:
+            self.parent.network.leave(address, self.port, self.parent.network_ip)
+            return
+        if self.sock is None:
+            return
+        mreq = struct.pack("4sl", socket.inet_aton(address), socket.INADDR_ANY)
+        try:
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_DROP_MEMBERSHIP, mreq)
+        except OSError:
+            pass
+
+    def _reply_socket(self) -> Optional[socket.socket]:
+        """Return the socket group PUSHes are sent from, opening it on first use."""
+        if self.parent.network:
+            return None
+        if self.reply_sock is None:
+            self.reply_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+            self.reply_sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+            # A port of its own, so ACKs reach this process even when
+            # several devices on the host share the group port
+            self.reply_sock.bind(("", 0))
+            self.reply_sock.setblocking(False)
+            self.listen_tasks.append(asyncio.create_task(self._listen(self.reply_sock)))
+        return self.reply_sock
+
+    def _sendto(self, payload: bytes, addr: tuple, sock: Optional[socket.socket], port: int) -> None:
+        """Send a datagram through the virtual network or a real socket."""
+        if self.parent.network:
+            self.parent.network.sendto((self.parent.network_ip, port), payload, addr)
+        else:
+            sock.sendto(payload, addr)
+
+    async def push(
+        self,
+        name: str,
+        data: Any = None,
+        ack: bool = True,
+        deadline: float = 0.5,
+        retry: bool = True,
+        members: Optional[Iterable[str]] = None,
+    ) -> dict:
+        """Send a PUSH to all members of a group in one datagram.
+
+        Returns:
+            Dict with the group, the message ID, the members that
+            acknowledged the datagram ('acked') or rejected it ('nacked'),
+            the members reached by a retry over HTTP ('retried'), those
+            that could not be reached ('failed') and the number of
+            transmissions used.
+        """
+        expected = set(self.members(name)) | set(members or ())
+        expected.discard(self.parent.id)
+        message_id = secrets.token_hex(8)
+        header = {
+            "sender_id": self.parent.id,
+            "sender_port": self.parent.port,
+            "timestamp": int(time.time()),
+            "sent_at": time.time(),
+            "message_id": message_id,
+            "group": name,
+        }
+        if ack:
+            header["ack"] = True
+        packet = {"version": self.parent.__version__, "type": self.parent.commands.PUSH.value, "header": header}
+        if data is not None:
+            packet["data"] = data
+        result = {
+            "group": name,
+            "message_id": message_id,
+            "acked": [],
+            "nacked": [],
+            "retried": [],
+            "failed": [],
+            "transmissions": 0,
+        }
+
+        raw = self.parent.serializer.dumps(packet)
+        if len(raw) > self.max_size or self.parent.tls.enabled:
+            # Too large for one datagram, or must not leave the device in
+            # plaintext: every known member gets it over HTTP(S)
+            self.counters["fallback"] += 1
+            await self._retry(name, message_id, data, sorted(expected), result)
+            return result
+
+        state = {"expected": expected, "acked": set(), "nacked": set(), "done": asyncio.Event()}
+        if ack:
+            self.pending[message_id] = state
+        try:
+            try:
+                self._sendto(raw, (group_address(name), self.port), self._reply_socket(), self.reply_port)
+                result["transmissions"] = 1
+                self.counters["sent"] += 1
+            except OSError as e:
+                if self.parent.debug:
+                    log.custom("GROUP", Colors.RED, f"Send to '{name}' failed: {e}")
+            if ack and result["transmissions"]:
+                if expected:
+                    try:
+                        await asyncio.wait_for(state["done"].wait(), deadline)
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    # Nobody is known to be a member, collect whoever answers
+                    await asyncio.sleep(deadline)
+        finally:
+            self.pending.pop(message_id, None)
+
+        result["acked"] = sorted(state["acked"])
+        result["nacked"] = sorted(state["nacked"])
+        if ack and retry:
+            missing = sorted(expected - state["acked"] - state["nacked"])
+            await self._retry(name, message_id, data, missing, result)
+        if self.parent.debug:
+            log.custom(
+                "GROUP",
+                Colors.GREEN if not result["failed"] else Colors.YELLOW,
+                f"'{name}': {len(result['acked'])} acked, {len(result['retried'])} retried, {len(result['failed'])} failed",
+            )
+        return result
+
+    async def _retry(self, name: str, message_id: str, data: Any, device_ids: List[str], result: dict) -> None:
+        """PUSH to members over HTTP, reusing the group message's ID."""
+
+        async def push_one(device_id: str) -> bool:
+            response = await self.parent.send(
+                device_id,
+                self.parent.commands.PUSH.value,
+                data,
+                header={"message_id": message_id, "group": name},
+            )
+            return response.get("type") == self.parent.commands.ACK.value
+
+        delivered = await asyncio.gather(*(push_one(device_id) for device_id in device_ids))
+        for device_id, ok in zip(device_ids, delivered):
+            result["retried" if ok else "failed"].append(device_id)
+            self.counters["retried" if ok else "failed"] += 1
+        result["transmissions"] += len(device_ids)
+
+    async def _listen(self, sock: socket.socket):
+        while True:
+            try:
+                raw, addr = await sock_recvfrom(sock, 65535)
+                with self.parent.profiler.track("group", "message", addr[0]):
+                    await self._receive(raw, addr)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                if self.parent.debug:
+                    log.custom("GROUP", Colors.RED, e)
+
+    async def _receive(self, raw: bytes, addr: tuple):
+        try:
+            packet = self.parent.serializer.loads(raw)
+            command_type = packet["type"]
+            header = packet.get("header") or {}
+            sender_id = header.get("sender_id")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.counters["invalid"] += 1
+            return
+        if not sender_id or sender_id == self.parent.id:
+            return  # Our own datagram, looped back
+
+        if command_type == self.parent.commands.PUSH.value:
+            await self._deliver(packet, header, addr)
+        elif command_type in (self.parent.commands.ACK.value, self.parent.commands.NACK.value):
+            self._acknowledged(command_type, header, sender_id, addr)
+        else:
+            self.counters["invalid"] += 1
+
+    async def _deliver(self, packet: dict, header: dict, addr: tuple):
+        """Handle a group PUSH like one over HTTP and answer it if asked to."""
+        name = header.get("group")
+        if name not in self.joined:
+            return  # Another group sharing the address
+        if self.parent.tls.enabled:
+            # Anyone on the LAN could have sent it, wait for the retry over HTTPS
+            self.counters["refused"] += 1
+            if self.parent.debug:
+                log.custom("GROUP", Colors.YELLOW, f"Refused plaintext group PUSH from {addr[0]}")
+            return
+        self.counters["received"] += 1
+        response = await self.parent._dispatch(packet, addr[0])
+        if not header.get("ack"):
+            return
+        try:
+            reply_type = self.parent.serializer.loads(response.body)["type"]
+        except (ValueError, KeyError, TypeError):
+            reply_type = self.parent.commands.NACK.value
+        reply = {
+            "version": self.parent.__version__,
+            "type": reply_type,
+            "header": {
+                "sender_id": self.parent.id,
+                "sender_port": self.parent.port,
+                "group": name,
+                "message_id": header.get("message_id"),
+            },
+        }
+        try:
+            self._sendto(self.parent.serializer.dumps(reply), addr, self.sock, self.port)
+        except OSError as e:
+            if self.parent.debug:
+                log.custom("GROUP", Colors.RED, f"ACK to {addr[0]} failed: {e}")
+
+    def _acknowledged(self, command_type: int, header: dict, sender_id: str, addr: tuple) -> None:
+        """Count an ACK or NACK to a group PUSH we sent."""
+        state = self.pending.get(header.get("message_id"))
+        if state is None:
+            return  # Arrived after the deadline
+        self.counters["acks"] += 1
+        self.parent._learn_sender(sender_id, addr[0], header.get("sender_port", self.parent.port))
+        name = header.get("group")
+        if isinstance(name, str) and sender_id in self.parent.devices:
+            groups = self.parent.devices[sender_id].get("groups") or []
+            if name not in groups:
+                self.parent._learn_groups(sender_id, sorted(groups + [name]))
+
+        if command_type == self.parent.commands.ACK.value:
+            state["acked"].add(sender_id)
+        else:
+            state["nacked"].add(sender_id)
+        if state["expected"] <= state["acked"] | state["nacked"]:
+            state["done"].set()
+
+    def stats(self) -> dict:
+        """Return the joined groups and datagram, ACK and retry counters."""
+        return {**self.counters, "joined": sorted(self.joined)}
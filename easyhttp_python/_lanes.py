@@ -0,0 +1,176 @@
+"""Traffic classes for outgoing EasyHTTP requests.
+
+Every request is either control traffic (PING, ACK/NACK and small
+commands) or bulk traffic (packets of at least bulk_threshold bytes, or
+requests marked as bulk, like time-series queries). The two classes use
+separate connection pools, so a large transfer never holds the
+connection a PING needs, and separate limits on requests in flight per
+device. Requests over the limit wait in a queue per device and class;
+queued bulk requests do not start while a control request to the same
+device is waiting.
+
+Bulk requests get a timeout of their own, and their duration is not fed
+to the device's RTT estimate, since it depends on the size of the
+payload rather than on the network.
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Dict, Optional
+
+import aiohttp
+
+if TYPE_CHECKING:
+    from .core import EasyHTTPAsync
+
+CONTROL = "control"
+BULK = "bulk"
+TRAFFIC_CLASSES = (CONTROL, BULK)
+
+class PeerLanes:
+    """Requests in flight and waiting for one device, per traffic class."""
+
+    def __init__(self, limits: Dict[str, Optional[int]]):
+        self.limits = limits
+        self.inflight = {CONTROL: 0, BULK: 0}
+        self.waiting: Dict[str, deque] = {CONTROL: deque(), BULK: deque()}
+
+    def _free(self, traffic_class: str) -> bool:
+        limit = self.limits[traffic_class]
+        if limit is not None and self.inflight[traffic_class] >= limit:
+            return False
+        # Control traffic goes ahead of bulk traffic
+        return traffic_class == CONTROL or not self.waiting[CONTROL]
+
+    async def acquire(self, traffic_class: str) -> bool:
+        """Wait for a slot of a traffic class.
+
+        Returns:
+            True if the request had to wait.
+        """
+        if not self.waiting[traffic_class] and self._free(traffic_class):
+            self.inflight[traffic_class] += 1
+            return False
+        ready = asyncio.get_running_loop().create_future()
+        self.waiting[traffic_class].append(ready)
+        try:
+            await ready
+        except asyncio.CancelledError:
+            if ready.done() and not ready.cancelled():
+                # The slot was handed over just before the cancellation
+                self.release(traffic_class)
+            else:
+                self.waiting[traffic_class].remove(ready)
+                self._wake()
+            raise
+        return True
+
+    def release(self, traffic_class: str) -> None:
+        """Free a slot and start the next waiting request."""
+        self.inflight[traffic_class] -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        for traffic_class in TRAFFIC_CLASSES:
+            queue = self.waiting[traffic_class]
+            while queue and self._free(traffic_class):
+                ready = queue.popleft()
+                if ready.done():
+                    continue
+                self.inflight[traffic_class] += 1
+                ready.set_result(None)
+
+class Lanes:
+    """Classifies outgoing requests and keeps a connection pool per class."""
+
+    def __init__(
+        self,
+        parent: "EasyHTTPAsync",
+        control_limit: Optional[int] = 16,
+        bulk_limit: Optional[int] = 2,
+        bulk_threshold: int = 64 * 1024,
+        bulk_timeout: float = 30.0,
+    ):
+        self.parent = parent
+        self.limits = {CONTROL: control_limit, BULK: bulk_limit}
+        self.bulk_threshold = bulk_threshold
+        self.bulk_timeout = bulk_timeout
+        self.peers: Dict[str, PeerLanes] = {}
+        self.sessions: Dict[str, aiohttp.ClientSession] = {}
+        self.counters = {
+            traffic_class: {"requests": 0, "queued": 0, "wait_time": 0.0}
+            for traffic_class in TRAFFIC_CLASSES
+        }
+
+    def classify(self, command_type: int, size: int) -> str:
+        """Return the traffic class of a command by its type and encoded payload size."""
+        commands = self.parent.commands
+        if command_type in (
+            commands.PING.value,
+            commands.PONG.value,
+            commands.ACK.value,
+            commands.NACK.value,
+        ):
+            return CONTROL
+        return BULK if size >= self.bulk_threshold else CONTROL
+
+    def session(self, traffic_class: str) -> aiohttp.ClientSession:
+        """Return the client session of a traffic class.
+
+        Connections (and TLS sessions) to a device are kept alive and
+        reused instead of being set up for every request.
+        """
+        session = self.sessions.get(traffic_class)
+        if session is None or session.closed:
+            session = self.sessions[traffic_class] = aiohttp.ClientSession(
+                trace_configs=[self.parent.tls.trace_config()]
+            )
+        return session
+
+    def timeout(self, traffic_class: str, rto: float) -> float:
+        """Return the timeout of a request given the device's RTT-based timeout."""
+        return max(rto, self.bulk_timeout) if traffic_class == BULK else rto
+
+    @asynccontextmanager
+    async def slot(self, device_id: str, traffic_class: str):
+        """Hold a slot to send to a device, waiting for one if needed."""
+        await self.acquire(device_id, traffic_class)
+        try:
+            yield
+        finally:
+            self.release(device_id, traffic_class)
+
+    async def acquire(self, device_id: str, traffic_class: str) -> None:
+        """Wait for a slot to send to a device."""
+        lanes = self.peers.get(device_id)
+        if lanes is None:
+            lanes = self.peers[device_id] = PeerLanes(self.limits)
+        counters = self.counters[traffic_class]
+        counters["requests"] += 1
+        started = time.perf_counter()
+        if await lanes.acquire(traffic_class):
+            counters["queued"] += 1
+            counters["wait_time"] += time.perf_counter() - started
+
+    def release(self, device_id: str, traffic_class: str) -> None:
+        self.peers[device_id].release(traffic_class)
+
+    async def close(self) -> None:
+        """Close the connection pools."""
+        for session in self.sessions.values():
+            await session.close()
+        self.sessions.clear()
+
+    def stats(self) -> dict:
+        """Return requests, queued requests and time spent queued per class."""
+        return {
+            traffic_class: {
+                **counters,
+                "wait_time": round(counters["wait_time"], 4),
+                "inflight": sum(p.inflight[traffic_class] for p in self.peers.values()),
+                "waiting": sum(len(p.waiting[traffic_class]) for p in self.peers.values()),
+            }
+            for traffic_class, counters in self.counters.items()
+        }
@@ -0,0 +1,160 @@
+"""Per-sender ordered processing for EasyHTTP.
+
+send() numbers the commands it sends to each device: every packet
+except control traffic carries a 'seq' header field that grows by one
+per recipient, and a 'seq_epoch' that changes when the sender restarts.
+A receiver created with ordered=True handles the commands of each
+sender one at a time, in sequence order, while commands of different
+senders still run in parallel.
+
+A command that arrives ahead of its turn waits in a bounded queue of its
+sender until the missing ones arrive. If a missing command does not show
+up within gap_timeout (it was lost, or its sender gave up), the queue
+moves on; this also happens once per sender when the receiver restarts
+while its senders keep counting. Commands without a sequence number and
+commands older than the sender's current position (retries, late
+arrivals) are handled as soon as the sender's previous command is done.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+if TYPE_CHECKING:
+    from .core import EasyHTTPAsync
+
+class SenderOrdering:
+    """Serializes the commands of each sender in sequence order."""
+
+    MAX_SENDERS = 1024
+
+    def __init__(self, parent: "EasyHTTPAsync", max_queue: int = 64, gap_timeout: float = 0.5):
+        self.parent = parent
+        self.max_queue = max_queue
+        self.gap_timeout = gap_timeout
+        self.senders: Dict[str, dict] = {}
+        self._order = itertools.count()
+        self.counters = {"ordered": 0, "queued": 0, "gaps": 0, "late": 0, "rejected": 0}
+
+    def _state(self, sender_id: str, epoch: Any) -> dict:
+        state = self.senders.get(sender_id)
+        if state is None:
+            if len(self.senders) >= self.MAX_SENDERS:
+                self._prune()
+            state = self.senders[sender_id] = {
+                "epoch": epoch,
+                "next": 1,
+                "busy": False,
+                "waiting": [],
+                "timer": None,
+            }
+        elif epoch is not None and epoch != state["epoch"]:
+            # The sender restarted and numbers its commands from 1 again
+            state["epoch"] = epoch
+            state["next"] = 1
+        return state
+
+    def _prune(self) -> None:
+        """Forget idle senders to keep the table bounded."""
+        for sender_id, state in list(self.senders.items()):
+            if not state["busy"] and not state["waiting"]:
+                del self.senders[sender_id]
+
+    def _in_turn(self, state: dict, seq: Optional[int]) -> bool:
+        return seq is None or seq <= state["next"]
+
+    def _start(self, state: dict, seq: Optional[int]) -> None:
+        state["busy"] = True
+        if seq is None:
+            return
+        if seq >= state["next"]:
+            state["next"] = seq + 1
+        else:
+            self.counters["late"] += 1
+
+    async def acquire(self, sender_id: str, seq: Any, epoch: Any = None) -> Optional[dict]:
+        """Wait for the turn of a command.
+
+        Args:
+            sender_id: ID of the device the command came from.
+            seq: Sequence number from the command's header, if any.
+            epoch: Sequence epoch from the command's header, if any.
+
+        Returns:
+            None when it is the command's turn (release() must follow),
+            or a dict with 'status' and 'retry_after' if the sender's
+            queue is full.
+        """
+        if not isinstance(seq, int) or isinstance(seq, bool):
+            seq = None
+        state = self._state(sender_id, epoch)
+        self.counters["ordered"] += 1
+        if not state["busy"] and not state["waiting"] and self._in_turn(state, seq):
+            self._start(state, seq)
+            return None
+        if len(state["waiting"]) >= self.max_queue:
+            self.counters["rejected"] += 1
+            return {"status": 503, "retry_after": self.gap_timeout}
+
+        self.counters["queued"] += 1
+        ready = asyncio.get_running_loop().create_future()
+        # Commands without a number do not wait for gaps
+        entry = (-1 if seq is None else seq, next(self._order), time.monotonic(), seq, ready)
+        heapq.heappush(state["waiting"], entry)
+        self._wake(state)
+        try:
+            await ready
+        except asyncio.CancelledError:
+            if ready.done() and not ready.cancelled():
+                # The turn was handed over just before the cancellation
+                self.release(sender_id)
+            else:
+                state["waiting"].remove(entry)
+                heapq.heapify(state["waiting"])
+                self._wake(state)
+            raise
+        return None
+
+    def release(self, sender_id: str) -> None:
+        """End the turn of a sender's command and start the next one."""
+        state = self.senders.get(sender_id)
+        if state is None:
+            return
+        state["busy"] = False
+        self._wake(state)
+
+    def _wake(self, state: dict) -> None:
+        if state["timer"]:
+            state["timer"].cancel()
+            state["timer"] = None
+        waiting = state["waiting"]
+        while waiting and waiting[0][4].done():
+            heapq.heappop(waiting)
+        if state["busy"] or not waiting:
+            return
+
+        _, _, arrived, seq, ready = waiting[0]
+        if not self._in_turn(state, seq):
+            held = time.monotonic() - arrived
+            if held < self.gap_timeout:
+                # Give the missing commands a chance to arrive
+                state["timer"] = asyncio.get_running_loop().call_later(
+                    self.gap_timeout - held, self._wake, state
+                )
+                return
+            self.counters["gaps"] += 1
+            state["next"] = seq
+
+        heapq.heappop(waiting)
+        self._start(state, seq)
+        ready.set_result(None)
+
+    def stats(self) -> dict:
+        """Return ordering counters and the number of waiting commands."""
+        return {
+            **self.counters,
+            "senders": len(self.senders),
+            "waiting": sum(len(state["waiting"]) for state in self.senders.values()),
+        }
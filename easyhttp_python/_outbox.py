@@ -0,0 +1,323 @@
+"""Disk-backed store-and-forward queue for EasyHTTP."""
+
+import asyncio
+import json
+import os
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .core import EasyHTTPAsync
+
+from ._lanes import BULK
+
+from loggity import Logger, Colors, LoggerConfig
+log_config = LoggerConfig(
+    colored = True,
+    timestamps = False,
+    timeformat = None,
+    file = None
+)
+log = Logger(config = log_config)
+
+class _DeviceQueue:
+    """Append-only segment files plus a read cursor for one device.
+
+    Records are JSON lines in files named '<segment>.seg'. The cursor
+    file stores the segment and byte offset of the first record that
+    has not been acknowledged yet; fully consumed segments are deleted.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self.segments = sorted(
+            int(name[:-4]) for name in os.listdir(directory) if name.endswith(".seg")
+        )
+        self.cursor = self._load_cursor()
+        self.segments = [seg for seg in self.segments if seg >= self.cursor[0]]
+        self._repair()
+        self.bytes = sum(os.path.getsize(self._path(seg)) for seg in self.segments)
+        self.pending = self._count_pending()
+        self.writer = None
+
+    def append(self, line: bytes) -> int:
+        """Append one encoded record and return the bytes written."""
+        if not self.segments:
+            self.segments.append(self.cursor[0])
+        if self.writer is None or self.writer.tell() >= self.segment_bytes:
+            if self.writer is not None:
+                self.writer.close()
+                self.segments.append(self.segments[-1] + 1)
+            self.writer = open(self._path(self.segments[-1]), "ab")
+        self.writer.write(line)
+        self.writer.flush()
+        self.bytes += len(line)
+        self.pending += 1
+        return len(line)
+
+    def fsync(self) -> None:
+        if self.writer is not None:
+            os.fsync(self.writer.fileno())
+
+    def read(self, limit: int) -> List[Tuple[Any, Tuple[int, int]]]:
+        """Read up to limit records from the cursor.
+
+        Returns:
+            List of (payload, cursor after the record) tuples.
+        """
+        records = []
+        segment, offset = self.cursor
+        for seg in self.segments:
+            if seg < segment or len(records) >= limit:
+                continue
+            with open(self._path(seg), "rb") as f:
+                f.seek(offset if seg == segment else 0)
+                while len(records) < limit:
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        break  # end of segment or torn write
+                    records.append((json.loads(line)["data"], (seg, f.tell())))
+        return records
+
+    def advance(self, cursor: Tuple[int, int], count: int) -> int:
+        """Move the cursor past acknowledged records.
+
+        Returns:
+            Number of bytes freed by deleting consumed segments.
+        """
+        freed = 0
+        self.cursor = cursor
+        self.pending -= count
+        # Every segment before the cursor has been fully consumed
+        while self.segments and self.segments[0] < cursor[0]:
+            freed += self._drop(self.segments.pop(0))
+        if self.pending == 0 and self.segments:
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+            for seg in self.segments:
+                freed += self._drop(seg)
+            self.cursor = (self.segments[-1] + 1, 0)
+            self.segments = []
+        self._save_cursor()
+        self.bytes -= freed
+        return freed
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def _drop(self, seg: int) -> int:
+        path = self._path(seg)
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+
+    def _path(self, seg: int) -> str:
+        return os.path.join(self.directory, f"{seg:08d}.seg")
+
+    def _load_cursor(self) -> Tuple[int, int]:
+        try:
+            with open(os.path.join(self.directory, "cursor.json"), "r") as f:
+                data = json.load(f)
+            return int(data["segment"]), int(data["offset"])
+        except (OSError, ValueError, KeyError):
+            return (self.segments[0] if self.segments else 0), 0
+
+    def _save_cursor(self) -> None:
+        path = os.path.join(self.directory, "cursor.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump({"segment": self.cursor[0], "offset": self.cursor[1]}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def _repair(self) -> None:
+        """Cut off a record torn by a crash in the middle of a write."""
+        if not self.segments:
+            return
+        path = self._path(self.segments[-1])
+        with open(path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def _count_pending(self) -> int:
+        count = 0
+        segment, offset = self.cursor
+        for seg in self.segments:
+            with open(self._path(seg), "rb") as f:
+                f.seek(offset if seg == segment else 0)
+                count += sum(1 for line in f if line.endswith(b"\n"))
+        return count
+
+class Outbox:
+    """Durable outbound PUSH queue for devices that are offline.
+
+    Payloads survive restarts and are delivered in order, in batches,
+    once the device is seen again through discovery or a PONG.
+    """
+
+    FSYNC_POLICIES = ("always", "interval", "never")
+
+    def __init__(
+        self,
+        parent: "EasyHTTPAsync",
+        directory: str,
+        fsync: str = "interval",
+        fsync_interval: float = 1.0,
+        max_bytes: int = 64 * 1024 * 1024,
+        segment_bytes: int = 1024 * 1024,
+        batch_size: int = 50,
+    ):
+        if fsync not in self.FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+
+        self.parent = parent
+        self.directory = directory
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.batch_size = batch_size
+        self.queues: Dict[str, _DeviceQueue] = {}
+        self.drain_tasks: Dict[str, asyncio.Task] = {}
+        self.counters = {"enqueued": 0, "delivered": 0, "dropped": 0, "rejected": 0}
+        self._last_fsync = 0.0
+
+        os.makedirs(directory, exist_ok=True)
+        for device_id in os.listdir(directory):
+            if os.path.isdir(os.path.join(directory, device_id)):
+                queue = self._queue(device_id)
+                if not queue.pending:
+                    queue.advance(queue.cursor, 0)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(queue.bytes for queue in self.queues.values())
+
+    def pending(self, device_id: Optional[str] = None) -> int:
+        """Return the number of queued payloads for a device, or for all."""
+        if device_id is None:
+            return sum(queue.pending for queue in self.queues.values())
+        queue = self.queues.get(device_id)
+        return queue.pending if queue else 0
+
+    async def put(self, device_id: str, data: Any) -> bool:
+        """Durably queue a payload for a device.
+
+        Returns:
+            True if the payload was queued, False if the disk budget is used up.
+        """
+        line = (json.dumps({"data": data, "queued_at": time.time()}) + "\n").encode()
+        if self.total_bytes + len(line) > self.max_bytes:
+            self.counters["rejected"] += 1
+            if self.parent.debug:
+                log.custom("OUTBOX", Colors.RED, f"Queue full, dropped payload for {device_id}")
+            return False
+
+        queue = self._queue(device_id)
+        queue.append(line)
+        self.counters["enqueued"] += 1
+
+        now = time.monotonic()
+        if self.fsync == "always" or (
+            self.fsync == "interval" and now - self._last_fsync >= self.fsync_interval
+        ):
+            self._last_fsync = now
+            await asyncio.get_running_loop().run_in_executor(None, queue.fsync)
+        return True
+
+    def kick(self, device_id: str) -> None:
+        """Start draining a device's queue if it has pending payloads."""
+        if not self.pending(device_id):
+            return
+        task = self.drain_tasks.get(device_id)
+        if task is None or task.done():
+            self.drain_tasks[device_id] = asyncio.create_task(self._drain(device_id))
+
+    def kick_all(self) -> None:
+        """Start draining every queue whose device is known."""
+        for device_id in list(self.queues):
+            if device_id in self.parent.devices:
+                self.kick(device_id)
+
+    async def stop(self) -> None:
+        """Cancel drains and flush queues to disk."""
+        for task in self.drain_tasks.values():
+            task.cancel()
+        for task in self.drain_tasks.values():
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.drain_tasks.clear()
+        for queue in self.queues.values():
+            if self.fsync != "never":
+                queue.fsync()
+            queue.close()
+
+    def stats(self) -> dict:
+        """Return queue depth, disk usage and delivery counters."""
+        return {
+            "pending": self.pending(),
+            "bytes": self.total_bytes,
+            "devices": {d: q.pending for d, q in self.queues.items() if q.pending},
+            **self.counters,
+        }
+
+    async def _drain(self, device_id: str) -> None:
+        """Deliver queued payloads in order until the queue is empty or a send fails."""
+        queue = self.queues[device_id]
+        while queue.pending and device_id in self.parent.devices:
+            records = queue.read(self.batch_size)
+            if not records:
+                break
+
+            response = await self.parent.send(
+                device_id,
+                self.parent.commands.PUSH,
+                [payload for payload, _ in records],
+                header={"batch": True},
+                traffic_class=BULK,
+            )
+            command = response.get("type")
+            header = response.get("header", {})
+            error = response.get("error")
+            if error and error not in self.parent.QUEUEABLE_ERRORS:
+                # Rejected for good (e.g. a 400 NACK sent as an HTTP error):
+                # retrying would block every later record, so treat it as
+                # a NACK of the first record not accepted
+                command = self.parent.commands.NACK.value
+                body = response.get("response")
+                header = body.get("header") if isinstance(body, dict) and isinstance(body.get("header"), dict) else {}
+            accepted = header.get("accepted", 0)
+            if command == self.parent.commands.ACK.value:
+                accepted = header.get("accepted", len(records))
+            if not isinstance(accepted, int) or isinstance(accepted, bool) or accepted < 0:
+                accepted = 0
+            # A NACK means the device rejected the record after the accepted
+            # ones, so it is dropped like a failed push() instead of retried
+            consumed = accepted + 1 if command == self.parent.commands.NACK.value else accepted
+            consumed = min(consumed, len(records))
+
+            if consumed:
+                queue.advance(records[consumed - 1][1], consumed)
+                self.counters["delivered"] += accepted
+                self.counters["dropped"] += consumed - accepted
+                if self.parent.debug:
+                    log.custom("OUTBOX", Colors.GREEN, f"Delivered {accepted} queued payloads to {device_id}")
+            if command not in (self.parent.commands.ACK.value, self.parent.commands.NACK.value):
+                break
+
+    def _queue(self, device_id: str) -> _DeviceQueue:
+        queue = self.queues.get(device_id)
+        if queue is None:
+            queue = self.queues[device_id] = _DeviceQueue(
+                os.path.join(self.directory, device_id), self.segment_bytes
+            )
+        return queue
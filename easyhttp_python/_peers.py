@@ -0,0 +1,149 @@
+"""Per-peer RTT estimation, clock offset and circuit breaker for EasyHTTP."""
+
+import time
+from collections import deque
+from typing import Optional
+
+class PeerHealth:
+    """Tracks round-trip times and failures of a single remote device.
+
+    RTT smoothing and the retransmission timeout follow RFC 6298
+    (the TCP RTO algorithm); consecutive failures open a circuit
+    breaker so further sends to a dead peer fail fast.
+
+    The clock offset of the peer is estimated from PING/PONG timestamps
+    like NTP does: of the last CLOCK_SAMPLES exchanges, the one with the
+    lowest network delay gives the offset, since queueing delays make
+    the other samples less accurate.
+    """
+
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+    CLOCK_SAMPLES = 8
+    RTT_SAMPLES = 32
+    # Shortest wait before a hedged duplicate, in seconds
+    HEDGE_FLOOR = 0.01
+
+    def __init__(
+        self,
+        initial_timeout: float = 3.0,
+        min_timeout: float = 1.0,
+        max_timeout: float = 3.0,
+        breaker_threshold: int = 3,
+    ):
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.breaker_threshold = breaker_threshold
+        self.srtt: Optional[float] = None
+        self.rttvar: Optional[float] = None
+        self.rto = initial_timeout
+        self.failures = 0
+        self.is_open = False
+        self.opened_at: Optional[float] = None
+        self.samples = 0
+        # Peer's clock minus ours, in seconds
+        self.offset: Optional[float] = None
+        self.delay: Optional[float] = None
+        self.latency: Optional[float] = None
+        self.clock_samples: deque = deque(maxlen=self.CLOCK_SAMPLES)
+        self.rtts: deque = deque(maxlen=self.RTT_SAMPLES)
+        # Our requests still waiting for the peer, and the load it reported
+        self.inflight = 0
+        self.load: Optional[int] = None
+
+    def observe(self, rtt: float) -> None:
+        """Feed a measured round-trip time and close the breaker."""
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+        self.rto = self._clamp(self.srtt + max(0.01, 4 * self.rttvar))
+        self.rtts.append(rtt)
+        self.samples += 1
+        self.success()
+
+    def success(self) -> None:
+        """Record an answer without an RTT sample and close the breaker."""
+        self.failures = 0
+        self.is_open = False
+        self.opened_at = None
+
+    def observe_clock(self, sent: float, received: float, replied: float, answered: float) -> None:
+        """Feed the four timestamps of a PING/PONG exchange.
+
+        Args:
+            sent: Our clock when the PING was sent.
+            received: Peer's clock when the PING arrived.
+            replied: Peer's clock when the PONG was sent.
+            answered: Our clock when the PONG arrived.
+        """
+        offset = ((received - sent) + (replied - answered)) / 2
+        delay = max(0.0, (answered - sent) - (replied - received))
+        self.clock_samples.append((delay, offset))
+        self.delay, self.offset = min(self.clock_samples)
+
+    def observe_latency(self, latency: float) -> None:
+        """Feed the one-way delivery latency of a message from the peer."""
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = (1 - self.ALPHA) * self.latency + self.ALPHA * latency
+
+    def failure(self) -> bool:
+        """Record a timeout or connection failure.
+
+        Returns:
+            True if this failure opened the circuit breaker.
+        """
+        self.failures += 1
+        # Karn's algorithm: back the timeout off until a fresh sample arrives
+        self.rto = self._clamp(self.rto * 2)
+        if not self.is_open and self.failures >= self.breaker_threshold:
+            self.is_open = True
+            self.opened_at = time.time()
+            return True
+        return False
+
+    def timeout(self) -> float:
+        """Return the timeout to use for the next request."""
+        return self.rto
+
+    def hedge_delay(self) -> float:
+        """Return how long to wait before sending a hedged duplicate.
+
+        The delay follows the RTT samples rather than min_timeout, which
+        only bounds the retransmission timeout: a hedge that waits for
+        the RTO floor fires when the first request is about to time out
+        anyway.
+        """
+        if self.srtt is None:
+            return self.rto / 2
+        return min(self.rto, max(self.HEDGE_FLOOR, self.srtt + 2 * self.rttvar))
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Return the q-quantile (0..1) of recent round-trip times."""
+        if not self.rtts:
+            return None
+        ordered = sorted(self.rtts)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def as_dict(self) -> dict:
+        """Return a JSON-serializable summary of this peer's health."""
+        return {
+            "srtt": self.srtt,
+            "rttvar": self.rttvar,
+            "timeout": self.rto,
+            "failures": self.failures,
+            "circuit_open": self.is_open,
+            "samples": self.samples,
+            "clock_offset": self.offset,
+            "clock_delay": self.delay,
+            "latency": self.latency,
+            "load": self.load,
+        }
+
+    def _clamp(self, value: float) -> float:
+        return min(self.max_timeout, max(self.min_timeout, value))
@@ -0,0 +1,258 @@
+"""Periodic FETCH polling for EasyHTTP.
+
+A poll job names a set of devices (a list of IDs, a tag, or every known
+device), a query, an interval and a priority. Each device of a job gets
+its own random phase within the interval and every cycle is shifted by
+a little jitter, so polls of a large fleet spread out instead of
+arriving in bursts. Polls wait for a free slot under a global and a
+per-device concurrency limit, higher priority first. Devices whose
+circuit is open are skipped until the next cycle.
+
+Results go to the job's callback, or to event streams as 'poll' events.
+The scheduler records how late each poll started (slip).
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import secrets
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set
+
+if TYPE_CHECKING:
+    from .core import EasyHTTPAsync
+
+from loggity import Logger, Colors, LoggerConfig
+log_config = LoggerConfig(
+    colored = True,
+    timestamps = False,
+    timeformat = None,
+    file = None
+)
+log = Logger(config = log_config)
+
+class Poller:
+    """Schedules periodic FETCHes under concurrency limits."""
+
+    SLIP_SAMPLES = 1000
+
+    def __init__(self, parent: "EasyHTTPAsync", max_concurrency: int = 16, per_device: int = 1):
+        self.parent = parent
+        self.max_concurrency = max_concurrency
+        self.per_device = per_device
+        self.jobs: Dict[str, dict] = {}
+        self.schedule: List[tuple] = []  # (due, seq, job_id, device_id), device_id None refreshes the job
+        self.ready: List[tuple] = []  # (-priority, due, seq, job_id, device_id)
+        self.active: Dict[str, int] = {}
+        self.tasks: Set[asyncio.Task] = set()
+        self.task: Optional[asyncio.Task] = None
+        self.wakeup: Optional[asyncio.Event] = None
+        self.seq = itertools.count()
+        self.slips: deque = deque(maxlen=self.SLIP_SAMPLES)
+        self.counters = {"polls": 0, "errors": 0, "skipped_offline": 0, "missed": 0}
+
+    async def start(self):
+        """Start the scheduler."""
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the scheduler and cancel running polls."""
+        for task in [self.task, *self.tasks]:
+            if task:
+                task.cancel()
+        for task in [self.task, *self.tasks]:
+            if task:
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self.task = None
+        self.tasks.clear()
+
+    def add(
+        self,
+        query: Any = None,
+        devices: Optional[List[str]] = None,
+        tag: Optional[str] = None,
+        interval: float = 10.0,
+        priority: int = 0,
+        jitter: float = 0.1,
+        callback: Optional[Callable] = None,
+    ) -> str:
+        """Add a poll job and return its ID.
+
+        Raises:
+            ValueError: If interval is not positive or jitter is outside [0, 1).
+        """
+        if not interval > 0:
+            raise ValueError("'interval' must be a positive number of seconds")
+        if not 0 <= jitter < 1:
+            raise ValueError("'jitter' must be at least 0 and below 1")
+        job_id = secrets.token_hex(4)
+        job = {
+            "id": job_id,
+            "query": query,
+            "devices": list(devices) if devices is not None else None,
+            "tag": tag,
+            "interval": interval,
+            "priority": priority,
+            "jitter": jitter,
+            "callback": callback,
+            "members": set(),
+            "polls": 0,
+            "errors": 0,
+        }
+        self.jobs[job_id] = job
+        self._refresh(job, time.monotonic())
+        if job["devices"] is None:
+            # Devices with the tag come and go, look for them every interval
+            self._push(job, None, time.monotonic() + interval)
+        self._wake()
+        return job_id
+
+    def cancel(self, job_id: str) -> bool:
+        """Remove a poll job; its queued polls are dropped."""
+        return self.jobs.pop(job_id, None) is not None
+
+    def _targets(self, job: dict) -> Set[str]:
+        if job["devices"] is not None:
+            return set(job["devices"])
+        if job["tag"] is not None:
+            return {
+                device_id
+                for device_id, device in self.parent.devices.items()
+                if job["tag"] in (device.get("tags") or ())
+            }
+        return set(self.parent.devices)
+
+    def _refresh(self, job: dict, now: float) -> None:
+        """Give devices new to a job a random phase within its interval."""
+        targets = self._targets(job)
+        for device_id in targets - job["members"]:
+            self._push(job, device_id, now + random.uniform(0, job["interval"]))
+        job["members"] = targets
+
+    def _push(self, job: dict, device_id: Optional[str], due: float) -> None:
+        heapq.heappush(self.schedule, (due, next(self.seq), job["id"], device_id))
+
+    def _reschedule(self, job: dict, device_id: str, due: float) -> None:
+        """Schedule the next poll one jittered interval after the last due time."""
+        spread = job["interval"] * job["jitter"]
+        next_due = due + job["interval"] + random.uniform(-spread, spread)
+        now = time.monotonic()
+        if next_due < now:
+            # A whole cycle was lost waiting for a slot, do not try to catch up
+            self.counters["missed"] += 1
+            next_due = now + random.uniform(0, spread)
+        self._push(job, device_id, next_due)
+
+    def _wake(self) -> None:
+        if self.wakeup:
+            self.wakeup.set()
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            while self.schedule and self.schedule[0][0] <= now:
+                due, seq, job_id, device_id = heapq.heappop(self.schedule)
+                job = self.jobs.get(job_id)
+                if job is None:
+                    continue
+                if device_id is None:
+                    self._refresh(job, now)
+                    self._push(job, None, due + job["interval"])
+                elif device_id in job["members"]:
+                    heapq.heappush(self.ready, (-job["priority"], due, seq, job_id, device_id))
+            self._launch()
+
+            timeout = self.schedule[0][0] - now if self.schedule else None
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _launch(self) -> None:
+        """Start due polls, highest priority first, while slots are free."""
+        waiting = []
+        while self.ready and len(self.tasks) < self.max_concurrency:
+            item = heapq.heappop(self.ready)
+            _, due, _, job_id, device_id = item
+            job = self.jobs.get(job_id)
+            if job is None or device_id not in job["members"]:
+                continue
+            if self.active.get(device_id, 0) >= self.per_device:
+                waiting.append(item)
+                continue
+            peer = self.parent.peers.get(device_id)
+            known = device_id in self.parent.devices or device_id in self.parent.routes
+            if not known or (peer and peer.is_open):
+                self.counters["skipped_offline"] += 1
+                self._reschedule(job, device_id, due)
+                continue
+            self.active[device_id] = self.active.get(device_id, 0) + 1
+            task = asyncio.create_task(self._poll(job, device_id, due))
+            self.tasks.add(task)
+            task.add_done_callback(self._done)
+        for item in waiting:
+            heapq.heappush(self.ready, item)
+
+    def _done(self, task: asyncio.Task) -> None:
+        self.tasks.discard(task)
+        self._wake()
+
+    async def _poll(self, job: dict, device_id: str, due: float):
+        self.slips.append(max(0.0, time.monotonic() - due))
+        self._reschedule(job, device_id, due)
+        try:
+            response = await self.parent.send(device_id, self.parent.commands.FETCH.value, job["query"])
+            self.counters["polls"] += 1
+            job["polls"] += 1
+            if "error" in response:
+                self.counters["errors"] += 1
+                job["errors"] += 1
+            await self._deliver(job, device_id, response)
+        except Exception as e:
+            if self.parent.debug:
+                log.custom("POLL", Colors.RED, f"Poll of {device_id} failed: {e}")
+        finally:
+            self.active[device_id] -= 1
+            if not self.active[device_id]:
+                del self.active[device_id]
+
+    async def _deliver(self, job: dict, device_id: str, response: dict) -> None:
+        callback = job["callback"]
+        if callback:
+            with self.parent.profiler.track("callback", "poll", device_id):
+                result = callback(device_id, response, job["id"])
+                if asyncio.iscoroutine(result):
+                    await result
+        elif self.parent.event_hub.has("poll"):
+            await self.parent.event_hub.publish(
+                "poll", device_id, {"job": job["id"], "response": response}, time.time()
+            )
+
+    def stats(self) -> dict:
+        """Return poll counters, queue sizes, schedule slip and per-job counts."""
+        slips = sorted(self.slips)
+
+        def percentile(q: float) -> Optional[float]:
+            if not slips:
+                return None
+            return round(slips[min(len(slips) - 1, int(len(slips) * q))], 4)
+
+        return {
+            **self.counters,
+            "running": len(self.tasks),
+            "queued": len(self.ready),
+            "slip_p50": percentile(0.5),
+            "slip_p99": percentile(0.99),
+            "slip_max": round(slips[-1], 4) if slips else None,
+            "jobs": {
+                job_id: {"devices": len(job["members"]), "polls": job["polls"], "errors": job["errors"]}
+                for job_id, job in self.jobs.items()
+            },
+        }
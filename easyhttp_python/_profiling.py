@@ -0,0 +1,190 @@
+"""Hot-path instrumentation module for EasyHTTP."""
+
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from .core import EasyHTTPAsync
+
+from loggity import Logger, Colors, LoggerConfig
+log_config = LoggerConfig(
+    colored = True,
+    timestamps = False,
+    timeformat = None,
+    file = None
+)
+log = Logger(config = log_config)
+
+class Profiler:
+    """Times callbacks, sends and discovery handling and watches event-loop lag."""
+
+    def __init__(
+        self,
+        parent: "EasyHTTPAsync",
+        enabled: bool = False,
+        slow_threshold: float = 0.1,
+        lag_interval: float = 0.5,
+    ):
+        self.parent = parent
+        self.enabled = enabled
+        self.slow_threshold = slow_threshold
+        self.lag_interval = lag_interval
+        self.steps = {}
+        self.slow_events = 0
+        self.loop_lag = {"last": 0.0, "avg": 0.0, "max": 0.0}
+        self.lag_task: asyncio.Task | None = None
+
+    async def start(self):
+        """Start the event-loop lag monitor."""
+        if self.enabled and not self.lag_task:
+            self.lag_task = asyncio.create_task(self._lag_loop())
+
+    async def stop(self):
+        """Stop the event-loop lag monitor."""
+        if self.lag_task:
+            self.lag_task.cancel()
+            try:
+                await self.lag_task
+            except asyncio.CancelledError:
+                pass
+            self.lag_task = None
+
+    @contextmanager
+    def track(self, kind: str, name: str, sender_id: Optional[str] = None):
+        """Time a block of the hot path and report it if it is slow.
+
+        Args:
+            kind: Step kind ('callback', 'send', 'discovery').
+            name: Step name, e.g. the callback event or command.
+            sender_id: Remote device involved in the step, if any.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - started
+            self._record(f"{kind}:{name}", duration)
+            if duration >= self.slow_threshold:
+                self._report_slow(kind, name, duration, sender_id)
+
+    def stats(self) -> dict:
+        """Return timing stats per step and the event-loop lag summary."""
+        return {
+            "steps": {
+                step: {
+                    "count": s["count"],
+                    "avg": s["total"] / s["count"],
+                    "max": s["max"],
+                }
+                for step, s in self.steps.items()
+            },
+            "slow_events": self.slow_events,
+            "loop_lag": dict(self.loop_lag),
+        }
+
+    def reset(self):
+        """Clear collected timing stats."""
+        self.steps.clear()
+        self.slow_events = 0
+        self.loop_lag = {"last": 0.0, "avg": 0.0, "max": 0.0}
+
+    async def snapshot(self, duration: float = 1.0, interval: float = 0.005, top: int = 20) -> dict:
+        """Sample the event-loop thread's stack for a while.
+
+        Sampling happens in a helper thread, so the loop keeps serving
+        requests while it is being observed.
+
+        Args:
+            duration: How long to sample, in seconds.
+            interval: Delay between samples, in seconds.
+            top: Number of hottest stacks and functions to return.
+
+        Returns:
+            Dict with sample count, hottest stacks and hottest functions.
+        """
+        loop = asyncio.get_running_loop()
+        thread_id = threading.get_ident()
+        stacks, functions, samples = await loop.run_in_executor(
+            None, self._sample, thread_id, duration, interval
+        )
+        return {
+            "samples": samples,
+            "stacks": stacks.most_common(top),
+            "functions": functions.most_common(top),
+        }
+
+    def _sample(self, thread_id: int, duration: float, interval: float):
+        """Collect stack samples of the given thread."""
+        stacks = Counter()
+        functions = Counter()
+        samples = 0
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                entries = []
+                while frame is not None:
+                    code = frame.f_code
+                    entries.append(f"{code.co_filename}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                if entries:
+                    stacks[";".join(reversed(entries))] += 1
+                    functions[entries[0]] += 1
+                    samples += 1
+            time.sleep(interval)
+        return stacks, functions, samples
+
+    def _record(self, step: str, duration: float):
+        s = self.steps.get(step)
+        if s is None:
+            s = self.steps[step] = {"count": 0, "total": 0.0, "max": 0.0}
+        s["count"] += 1
+        s["total"] += duration
+        if duration > s["max"]:
+            s["max"] = duration
+
+    def _report_slow(self, kind: str, name: str, duration: float, sender_id: Optional[str]):
+        self.slow_events += 1
+        if self.parent.debug:
+            source = f" ({sender_id})" if sender_id else ""
+            log.custom("SLOW", Colors.YELLOW, f"{kind} {name}{source} took {duration * 1000:.1f} ms")
+
+        callback = self.parent.callbacks.get("on_slow")
+        if not callback:
+            return
+        try:
+            if asyncio.iscoroutinefunction(callback):
+                asyncio.get_running_loop().create_task(
+                    callback(kind=kind, name=name, duration=duration, sender_id=sender_id)
+                )
+            else:
+                callback(kind=kind, name=name, duration=duration, sender_id=sender_id)
+        except Exception as e:
+            if self.parent.debug:
+                log.custom("SLOW", Colors.RED, e)
+
+    async def _lag_loop(self):
+        """Measure how late the loop wakes up after a fixed sleep."""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                expected = loop.time() + self.lag_interval
+                await asyncio.sleep(self.lag_interval)
+                lag = max(0.0, loop.time() - expected)
+                self.loop_lag["last"] = lag
+                self.loop_lag["avg"] = 0.9 * self.loop_lag["avg"] + 0.1 * lag
+                if lag > self.loop_lag["max"]:
+                    self.loop_lag["max"] = lag
+                if lag >= self.slow_threshold:
+                    self._report_slow("loop", "lag", lag, None)
+            except asyncio.CancelledError:
+                break
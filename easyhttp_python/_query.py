@@ -0,0 +1,126 @@
+"""FETCH projection and filtering module for EasyHTTP.
+
+A FETCH query that is a dict may carry these reserved keys, applied by
+the responding device to whatever its on_fetch callback returns:
+
+- 'fields': list of field names to keep; dotted names ('env.temp')
+  reach into nested dicts.
+- 'where': dict of conditions rows of a list result must match, either
+  a plain value (equality) or a dict of operators
+  ('eq', 'ne', 'gt', 'gte', 'lt', 'lte', 'in').
+- 'limit': maximum number of rows of a list result.
+"""
+
+from typing import Any, Iterable, Optional
+
+_MISSING = object()
+
+OPERATORS = {
+    "eq": lambda a, b: a == b,
+    "ne": lambda a, b: a != b,
+    "gt": lambda a, b: a is not None and a > b,
+    "gte": lambda a, b: a is not None and a >= b,
+    "lt": lambda a, b: a is not None and a < b,
+    "lte": lambda a, b: a is not None and a <= b,
+    "in": lambda a, b: a in b,
+}
+
+def has_spec(query: Any) -> bool:
+    """Return True if a FETCH query asks for projection or filtering."""
+    return isinstance(query, dict) and any(k in query for k in ("fields", "where", "limit"))
+
+def apply_spec(result: Any, query: dict) -> Any:
+    """Trim a callback result according to a query's spec.
+
+    Args:
+        result: Value returned by the on_fetch callback.
+        query: FETCH query holding 'fields', 'where' and/or 'limit'.
+
+    Returns:
+        The projected dict, or the filtered and projected list of rows.
+        Other result types are returned unchanged.
+
+    Raises:
+        ValueError: If the spec is malformed.
+    """
+    fields = query.get("fields")
+    where = query.get("where")
+    limit = query.get("limit")
+
+    if fields is not None and not (
+        isinstance(fields, list) and all(isinstance(f, str) for f in fields)
+    ):
+        raise ValueError("'fields' must be a list of field names")
+    if where is not None and not isinstance(where, dict):
+        raise ValueError("'where' must be a dict of conditions")
+    if limit is not None and (not isinstance(limit, int) or limit < 0):
+        raise ValueError("'limit' must be a non-negative integer")
+
+    if isinstance(result, dict):
+        if where and not _matches(result, where):
+            return {}
+        return _project(result, fields) if fields else result
+
+    if isinstance(result, list):
+        rows = (row for row in result if not where or (isinstance(row, dict) and _matches(row, where)))
+        if fields:
+            rows = (_project(row, fields) if isinstance(row, dict) else row for row in rows)
+        trimmed = []
+        for row in rows:
+            if limit is not None and len(trimmed) >= limit:
+                break
+            trimmed.append(row)
+        return trimmed
+
+    return result
+
+def _lookup(data: dict, path: str) -> Any:
+    value = data
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+def _project(data: dict, fields: Iterable[str]) -> dict:
+    projected = {}
+    for path in fields:
+        value = _lookup(data, path)
+        if value is _MISSING:
+            continue
+        target = projected
+        parts = path.split(".")
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return projected
+
+def _matches(row: dict, where: dict) -> bool:
+    for path, condition in where.items():
+        value = _lookup(row, path)
+        value = None if value is _MISSING else value
+        if isinstance(condition, dict) and condition and all(op in OPERATORS for op in condition):
+            try:
+                if not all(OPERATORS[op](value, arg) for op, arg in condition.items()):
+                    return False
+            except TypeError:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+def build_query(query: Any, fields: Optional[list], where: Optional[dict], limit: Optional[int]) -> Any:
+    """Merge projection and filter arguments into a FETCH query.
+
+    Raises:
+        TypeError: If the query is not a dict but a spec was given.
+    """
+    if fields is None and where is None and limit is None:
+        return query
+    if query is not None and not isinstance(query, dict):
+        raise TypeError("Query must be a dict to add fields, where or limit")
+    query = dict(query or {})
+    for key, value in (("fields", fields), ("where", where), ("limit", limit)):
+        if value is not None:
+            query[key] = value
+    return query
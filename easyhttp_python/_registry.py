@@ -0,0 +1,124 @@
+"""Persisted device registry module for EasyHTTP."""
+
+import json
+import os
+from typing import TYPE_CHECKING, Dict
+
+if TYPE_CHECKING:
+    from .core import EasyHTTPAsync
+
+from loggity import Logger, Colors, LoggerConfig
+log_config = LoggerConfig(
+    colored = True,
+    timestamps = False,
+    timeformat = None,
+    file = None
+)
+log = Logger(config = log_config)
+
+class Registry:
+    """Keeps the devices cache on disk between restarts.
+
+    Changes are appended to a JSON-lines journal, one line per device
+    update, so a change never rewrites the whole file. Once the journal
+    grows well past the number of devices it is compacted into a fresh
+    file that atomically replaces the old one.
+    """
+
+    FIELDS = ("ip", "port", "last_seen", "added_manually", "tls", "fingerprint", "uds", "tags", "groups")
+
+    def __init__(
+        self,
+        parent: "EasyHTTPAsync",
+        path: str,
+        min_interval: float = 30.0,
+    ):
+        self.parent = parent
+        self.path = path
+        self.min_interval = min_interval
+        self.lines = 0
+        self._written: Dict[str, dict] = {}
+
+    def load(self) -> Dict[str, dict]:
+        """Read the journal and return the last known state of each device."""
+        devices = {}
+        self.lines = 0
+        try:
+            with open(self.path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line after a crash
+                    if not isinstance(entry, dict) or not isinstance(entry.get("id"), str):
+                        continue
+                    self.lines += 1
+                    devices[entry.pop("id")] = entry
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            if self.parent.debug:
+                log.error(f"Error loading devices: {e}")
+
+        self._written = {device_id: dict(entry) for device_id, entry in devices.items()}
+        return devices
+
+    def record(self, device_id: str) -> None:
+        """Journal the current state of a device if it changed enough."""
+        device = self.parent.devices.get(device_id)
+        if device is None:
+            return
+
+        entry = {field: device.get(field) for field in self.FIELDS}
+        entry["added_manually"] = bool(entry["added_manually"])
+        entry["tls"] = bool(entry["tls"])
+        peer = self.parent.peers.get(device_id)
+        entry["rtt"] = round(peer.srtt, 6) if peer and peer.srtt is not None else None
+        entry["clock_offset"] = round(peer.offset, 6) if peer and peer.offset is not None else None
+
+        previous = self._written.get(device_id)
+        if previous is not None and not self._changed(previous, entry):
+            return
+
+        try:
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"id": device_id, **entry}) + "\n")
+            self._written[device_id] = entry
+            self.lines += 1
+            if self.lines > 4 * len(self._written) + 64:
+                self.compact()
+        except Exception as e:
+            if self.parent.debug:
+                log.error(f"Error saving device {device_id}: {e}")
+
+    def compact(self) -> None:
+        """Rewrite the journal with one line per device, atomically."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for device_id, entry in self._written.items():
+                f.write(json.dumps({"id": device_id, **entry}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.lines = len(self._written)
+        if self.parent.debug:
+            log.custom("REGISTRY", Colors.GREEN, f"Compacted {self.path} to {self.lines} devices")
+
+    def _changed(self, previous: dict, entry: dict) -> bool:
+        """Tell whether an update is worth a journal line.
+
+        Address changes are always written; last_seen, RTT and clock
+        offset updates are throttled so frequent pings don't grow the
+        journal.
+        """
+        if any(previous.get(f) != entry[f] for f in ("ip", "port", "added_manually", "tls", "fingerprint", "uds", "tags", "groups")):
+            return True
+        if (entry["last_seen"] or 0) - (previous.get("last_seen") or 0) >= self.min_interval:
+            return True
+        old_rtt, new_rtt = previous.get("rtt"), entry["rtt"]
+        if new_rtt is not None and (old_rtt is None or abs(new_rtt - old_rtt) > 0.25 * old_rtt):
+            return True
+        old_offset, new_offset = previous.get("clock_offset"), entry["clock_offset"]
+        if new_offset is not None and (old_offset is None or abs(new_offset - old_offset) > 0.005):
+            return True
+        return False
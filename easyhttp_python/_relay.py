@@ -0,0 +1,200 @@
+"""Gateway/relay module for EasyHTTP.
+
+A relay sits between the devices of a site and an upstream collector:
+
+- PUSH/DATA received from local devices are buffered and forwarded
+  upstream as one compressed PUSH per batch, whose header carries
+  'relay' (encoding and record count) and 'routes' (the local devices).
+- Commands the collector addresses to a local device are sent to the
+  relay with a 'route' header field and forwarded to the device; the
+  device sees the collector's ID in the 'origin' header field.
+"""
+
+import asyncio
+import base64
+import json
+import time
+import zlib
+from collections import deque
+from typing import TYPE_CHECKING, Any, List, Optional
+
+if TYPE_CHECKING:
+    from .core import EasyHTTPAsync
+
+from ._lanes import BULK
+
+from loggity import Logger, Colors, LoggerConfig
+log_config = LoggerConfig(
+    colored = True,
+    timestamps = False,
+    timeformat = None,
+    file = None
+)
+log = Logger(config = log_config)
+
+# Header fields that describe the hop, not the message, and are not forwarded
+HOP_FIELDS = (
+    "sender_id",
+    "sender_port",
+    "sender_tls",
+    "sender_host",
+    "sender_uds",
+    "sender_tags",
+    "recipient_id",
+    "timestamp",
+    "sent_at",
+    "clock_offset",
+    "route",
+    "origin",
+    "seq",
+    "seq_epoch",
+)
+
+def encode_batch(records: List[dict], compress: bool) -> Any:
+    """Pack relay records into a JSON-safe payload."""
+    if not compress:
+        return records
+    raw = json.dumps(records, separators=(",", ":")).encode()
+    return base64.b64encode(zlib.compress(raw, 6)).decode("ascii")
+
+def decode_batch(payload: Any, encoding: Optional[str]) -> List[dict]:
+    """Unpack relay records produced by encode_batch().
+
+    Raises:
+        ValueError: If the payload cannot be decoded.
+    """
+    if payload is None:
+        return []
+    if encoding == "zlib+base64":
+        try:
+            payload = json.loads(zlib.decompress(base64.b64decode(payload)))
+        except (zlib.error, TypeError) as e:
+            raise ValueError(f"Invalid relay batch: {e}")
+    if not isinstance(payload, list):
+        raise ValueError("Relay batch must be a list of records")
+    return payload
+
+class Relay:
+    """Fans local PUSH/DATA traffic into batched upstream requests."""
+
+    def __init__(
+        self,
+        parent: "EasyHTTPAsync",
+        upstream_id: str,
+        batch_interval: float = 1.0,
+        batch_size: int = 200,
+        max_buffer: int = 10000,
+        compress: bool = True,
+        announce_interval: float = 30.0,
+    ):
+        self.parent = parent
+        self.upstream_id = upstream_id
+        self.batch_interval = batch_interval
+        self.batch_size = batch_size
+        self.compress = compress
+        self.announce_interval = announce_interval
+        self.max_buffer = max_buffer
+        self.buffer: deque = deque()
+        self.flush_task: asyncio.Task | None = None
+        self.counters = {"collected": 0, "forwarded": 0, "batches": 0, "routed": 0, "dropped": 0}
+        self._wakeup: asyncio.Event | None = None
+        self._last_announce = 0.0
+
+    async def start(self):
+        """Start the upstream flush loop."""
+        if not self.flush_task:
+            self._wakeup = asyncio.Event()
+            self.flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the flush loop after a last attempt to empty the buffer."""
+        if self.flush_task:
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+            self.flush_task = None
+        if self.buffer:
+            await self.flush()
+
+    def collect(self, sender_id: Optional[str], command_type: int, data: Any, timestamp: Any) -> None:
+        """Buffer a payload received from a local device for upstream."""
+        if sender_id == self.upstream_id:
+            return
+        if len(self.buffer) >= self.max_buffer:
+            self.counters["dropped"] += 1
+            return
+        self.buffer.append({"s": sender_id, "c": command_type, "t": timestamp, "d": data})
+        self.counters["collected"] += 1
+        if len(self.buffer) >= self.batch_size and self._wakeup:
+            self._wakeup.set()
+
+    def routes(self) -> List[str]:
+        """Return IDs of the local devices reachable through this relay."""
+        return [did for did in self.parent.devices if did != self.upstream_id]
+
+    async def flush(self) -> bool:
+        """Send buffered records upstream in batches.
+
+        Returns:
+            True if the buffer was emptied.
+        """
+        while True:
+            records = [self.buffer[i] for i in range(min(self.batch_size, len(self.buffer)))]
+            response = await self.parent.send(
+                self.upstream_id,
+                self.parent.commands.PUSH,
+                encode_batch(records, self.compress) if records else [],
+                header={
+                    "relay": {
+                        "count": len(records),
+                        "encoding": "zlib+base64" if self.compress and records else None,
+                    },
+                    "routes": self.routes(),
+                },
+                traffic_class=BULK,
+            )
+            self._last_announce = time.monotonic()
+            if response.get("type") != self.parent.commands.ACK.value:
+                if self.parent.debug:
+                    log.custom("RELAY", Colors.RED, f"Upstream {self.upstream_id} did not accept batch")
+                return False
+
+            for _ in records:
+                self.buffer.popleft()
+            self.counters["forwarded"] += len(records)
+            self.counters["batches"] += 1
+            if not self.buffer:
+                return True
+
+    async def forward(self, route: str, command_type: Any, header: dict, origin: str, data: Any) -> Optional[dict]:
+        """Forward a command from upstream to a local device.
+
+        Returns:
+            The device's response, or an error dict from send().
+        """
+        extra = {k: v for k, v in header.items() if k not in HOP_FIELDS}
+        extra["origin"] = origin
+        self.counters["routed"] += 1
+        return await self.parent.send(route, command_type, data, header=extra)
+
+    def stats(self) -> dict:
+        """Return buffer depth and forwarding counters."""
+        return {"buffered": len(self.buffer), **self.counters}
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.batch_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                if self.buffer or time.monotonic() - self._last_announce >= self.announce_interval:
+                    await self.flush()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                if self.parent.debug:
+                    log.custom("RELAY", Colors.RED, e)
@@ -0,0 +1,136 @@
+"""Replica selection module for EasyHTTP.
+
+Devices advertise tags (capabilities such as 'temperature' or
+'camera') via discovery. send_any() and fetch_any() address a tag
+instead of a device ID and pick the replica with the best expected
+response time: its smoothed RTT, scaled by our requests still waiting
+for it and by the load it reported in its last reply. Replicas that
+were never measured are tried first.
+
+If the chosen replica has not answered once its usual latency (a
+percentile of its recent RTTs) has passed, the request is hedged to
+the next replica and the first answer wins. A replica that fails is
+replaced by the next one.
+"""
+
+import asyncio
+import random
+from typing import TYPE_CHECKING, Any, List, Optional
+
+if TYPE_CHECKING:
+    from .core import EasyHTTPAsync
+
+from loggity import Logger, Colors, LoggerConfig
+log_config = LoggerConfig(
+    colored = True,
+    timestamps = False,
+    timeformat = None,
+    file = None
+)
+log = Logger(config = log_config)
+
+class Replicas:
+    """Picks among devices sharing a tag by latency and load."""
+
+    def __init__(self, parent: "EasyHTTPAsync", hedge_percentile: float = 0.95):
+        self.parent = parent
+        self.hedge_percentile = hedge_percentile
+        self.counters = {"requests": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0}
+
+    def candidates(self, tag: str) -> List[str]:
+        """Return the IDs of devices with a tag whose circuit is closed."""
+        result = []
+        for device_id, device in self.parent.devices.items():
+            if tag not in (device.get("tags") or ()):
+                continue
+            peer = self.parent.peers.get(device_id)
+            if peer and peer.is_open:
+                continue
+            result.append(device_id)
+        return result
+
+    def score(self, device_id: str) -> float:
+        """Return the expected cost of a request to a device, lower is better."""
+        peer = self.parent.peers.get(device_id)
+        if peer is None or peer.srtt is None:
+            return 0.0
+        return peer.srtt * (1 + peer.inflight) * (1 + (peer.load or 0))
+
+    def rank(self, tag: str) -> List[str]:
+        """Return the candidates of a tag, best first."""
+        candidates = self.candidates(tag)
+        random.shuffle(candidates)  # spread ties
+        return sorted(candidates, key=self.score)
+
+    def hedge_delay(self, device_id: str) -> float:
+        """Return how long to wait for a replica before hedging to the next."""
+        peer = self.parent._peer(device_id)
+        return peer.percentile(self.hedge_percentile) or peer.hedge_delay()
+
+    async def _send(self, device_id: str, command_type: int, data: Any, header: Optional[dict]) -> dict:
+        peer = self.parent._peer(device_id)
+        peer.inflight += 1
+        try:
+            return await self.parent.send(device_id, command_type, data, header)
+        finally:
+            peer.inflight -= 1
+
+    async def send(
+        self,
+        tag: str,
+        command_type: int,
+        data: Any = None,
+        header: Optional[dict] = None,
+        hedge: bool = False,
+    ) -> dict:
+        """Send a command to the best replica of a tag.
+
+        Returns:
+            The first successful response, the last error if every
+            replica failed, or a 'no_replica' error.
+        """
+        queue = self.rank(tag)
+        if not queue:
+            return self.parent._send_error(None, "no_replica", 0, tag=tag)
+        self.counters["requests"] += 1
+
+        pending = {}
+        hedged = False
+        result = None
+
+        def launch() -> None:
+            device_id = queue.pop(0)
+            pending[asyncio.create_task(self._send(device_id, command_type, data, header))] = device_id
+
+        launch()
+        first = next(iter(pending.values()))
+        try:
+            while pending:
+                timeout = None
+                if hedge and not hedged and queue and len(pending) == 1:
+                    timeout = self.hedge_delay(next(iter(pending.values())))
+                done, _ = await asyncio.wait(set(pending), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    self.counters["hedged"] += 1
+                    launch()
+                    continue
+                for task in done:
+                    device_id = pending.pop(task)
+                    result = task.result()
+                    if result and "error" not in result:
+                        if device_id != first:
+                            self.counters["hedge_wins" if hedged else "failovers"] += 1
+                        return result
+                    if self.parent.debug:
+                        log.custom("REPLICA", Colors.YELLOW, f"{device_id} failed for '{tag}': {result and result['error']}")
+                if not pending and queue:
+                    launch()
+            return result
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        """Return request, hedge and failover counters."""
+        return dict(self.counters)
@@ -0,0 +1,128 @@
+"""Message serializers and event loop selection for EasyHTTP.
+
+Every packet is encoded and decoded at least once per hop. The standard
+library's json module always works; orjson is used when it is installed
+and is several times faster. uvloop, a faster event loop, is used by the
+synchronous wrapper when installed and can be installed for asyncio
+programs with install_uvloop().
+"""
+
+import asyncio
+import json
+import socket
+from typing import Any, Callable, Dict, Optional, Union
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+class Serializer:
+    """Encodes packets to and decodes them from compact JSON bytes."""
+
+    name = "json"
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    def loads(self, raw: Union[bytes, str]) -> Any:
+        return json.loads(raw)
+
+    def dumps_packet(self, packet: dict, data: bytes) -> bytes:
+        """Encode a packet whose 'data' field was encoded before.
+
+        Args:
+            packet: The packet without its 'data' field.
+            data: The encoded value of the 'data' field.
+        """
+        body = self.dumps(packet)
+        return body[:-1] + b',"data":' + data + b"}"
+
+    def response(self, content: Any, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+        """Build an HTTP response with a JSON body."""
+        return Response(self.dumps(content), status_code=status_code, headers=headers, media_type="application/json")
+
+class OrjsonSerializer(Serializer):
+    """Serializer backed by orjson."""
+
+    name = "orjson"
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # Integers beyond 64 bits and other values orjson refuses
+            return super().dumps(obj)
+
+    def loads(self, raw: Union[bytes, str]) -> Any:
+        return orjson.loads(raw)
+
+SERIALIZERS: Dict[str, Callable[[], Serializer]] = {"json": Serializer}
+if orjson is not None:
+    SERIALIZERS["orjson"] = OrjsonSerializer
+
+def get_serializer(name: str = "auto") -> Serializer:
+    """Return a serializer by name; 'auto' picks the fastest one installed.
+
+    Raises:
+        ValueError: If the serializer is unknown or not installed.
+    """
+    if name == "auto":
+        name = "orjson" if "orjson" in SERIALIZERS else "json"
+    if name not in SERIALIZERS:
+        raise ValueError(f"Serializer '{name}' is not available, choose from {sorted(SERIALIZERS)}")
+    return SERIALIZERS[name]()
+
+def new_event_loop(name: str = "auto") -> asyncio.AbstractEventLoop:
+    """Create an event loop; 'auto' uses uvloop when it is installed.
+
+    Raises:
+        ValueError: If the loop is unknown or not installed.
+    """
+    if name == "auto":
+        name = "uvloop" if uvloop is not None else "asyncio"
+    if name == "uvloop":
+        if uvloop is None:
+            raise ValueError("uvloop is not installed")
+        return uvloop.new_event_loop()
+    if name == "asyncio":
+        return asyncio.new_event_loop()
+    raise ValueError(f"Unknown event loop '{name}', choose 'auto', 'asyncio' or 'uvloop'")
+
+def install_uvloop() -> bool:
+    """Make asyncio create uvloop event loops, if uvloop is installed.
+
+    Call it before asyncio.run().
+
+    Returns:
+        True if uvloop was installed.
+    """
+    if uvloop is None:
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
+async def sock_recvfrom(sock: socket.socket, bufsize: int):
+    """Receive a datagram from a non-blocking socket.
+
+    Works like loop.sock_recvfrom(), which uvloop does not implement.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            return sock.recvfrom(bufsize)
+        except (BlockingIOError, InterruptedError):
+            pass
+        ready = loop.create_future()
+        loop.add_reader(sock.fileno(), lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            loop.remove_reader(sock.fileno())
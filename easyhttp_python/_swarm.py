@@ -0,0 +1,518 @@
+"""Peer-assisted content distribution module for EasyHTTP.
+
+Content (e.g. a firmware image) is split into fixed-size chunks and
+addressed by the SHA-256 of the whole file. Every device that has some
+chunks serves them to others, so the origin only has to hand out about
+one copy while the rest travels between peers:
+
+- share() stores the chunks and a manifest (name, size, chunk size and
+  the SHA-256 of every chunk) and announces the content ID via discovery.
+- GET /easyhttp/swarm/{content_id} returns the chunk indices a device
+  has, the devices it knows to hold the content and, on request, the
+  manifest.
+- GET /easyhttp/swarm/{content_id}/{index} returns one chunk.
+- fetch() downloads missing chunks from several holders in parallel,
+  rarest first and preferring peers over the origin, verifies each chunk
+  against the manifest and the assembled file against the content ID.
+- A device that has recently sent a chunk to seed_copies others answers
+  further requests for it with a 429 listing those devices, so a
+  popular origin hands out each chunk only a few times.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+import aiohttp
+from fastapi import Request
+from fastapi.responses import FileResponse, JSONResponse
+
+if TYPE_CHECKING:
+    from .core import EasyHTTPAsync
+
+from ._lanes import BULK
+
+from loggity import Logger, Colors, LoggerConfig
+log_config = LoggerConfig(
+    colored = True,
+    timestamps = False,
+    timeformat = None,
+    file = None
+)
+log = Logger(config = log_config)
+
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+
+def _valid_manifest(manifest, content_id: str) -> bool:
+    """Check a manifest received from a peer before trusting its paths."""
+    return (
+        isinstance(manifest, dict)
+        and manifest.get("sha256") == content_id
+        and isinstance(manifest.get("chunks"), list)
+        and all(isinstance(d, str) and _DIGEST.fullmatch(d) for d in manifest["chunks"])
+        and isinstance(manifest.get("size"), int)
+    )
+
+class Swarm:
+    """Shares content in chunks and fetches it from many peers at once."""
+
+    # Content IDs carried by one discovery datagram
+    MAX_ANNOUNCED = 8
+    # Holders asked for their chunks per download round
+    POLL_PEERS = 8
+
+    def __init__(
+        self,
+        parent: "EasyHTTPAsync",
+        directory: str,
+        chunk_size: int = 1024 * 1024,
+        max_parallel: int = 8,
+        per_peer: int = 2,
+        seed_copies: int = 2,
+        seed_window: float = 30.0,
+    ):
+        self.parent = parent
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.max_parallel = max_parallel
+        self.per_peer = per_peer
+        self.seed_copies = seed_copies
+        self.seed_window = seed_window
+        self.manifests: Dict[str, dict] = {}
+        self.have: Dict[str, Set[int]] = {}
+        self.holders: Dict[str, Dict[str, float]] = {}
+        self.counters = {
+            "chunks_served": 0,
+            "bytes_served": 0,
+            "chunks_fetched": 0,
+            "bytes_fetched": 0,
+            "chunk_failures": 0,
+            "deferred": 0,
+            "redirected": 0,
+            "corrupt": 0,
+        }
+        self._served: Dict[Tuple[str, int], Dict[str, float]] = {}
+        os.makedirs(os.path.join(directory, "chunks"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "manifests"), exist_ok=True)
+        self._load()
+
+    def register(self, app) -> None:
+        """Add the swarm routes to the FastAPI app."""
+        app.get("/easyhttp/swarm/{content_id}")(self.status_handler)
+        app.get("/easyhttp/swarm/{content_id}/{index}")(self.chunk_handler)
+
+    def _load(self):
+        """Restore manifests and chunk availability from disk."""
+        manifest_dir = os.path.join(self.directory, "manifests")
+        for filename in os.listdir(manifest_dir):
+            try:
+                with open(os.path.join(manifest_dir, filename), "r") as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                continue
+            content_id = manifest.get("sha256") if isinstance(manifest, dict) else None
+            if not isinstance(content_id, str) or not _DIGEST.fullmatch(content_id) or not _valid_manifest(manifest, content_id):
+                log.custom("SWARM", Colors.YELLOW, f"Skipping invalid manifest {filename}")
+                continue
+            self.manifests[content_id] = manifest
+            self.have[content_id] = {
+                index for index, digest in enumerate(manifest["chunks"])
+                if os.path.exists(self._chunk_path(digest))
+            }
+
+    def _chunk_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "chunks", digest)
+
+    def _add_manifest(self, manifest: dict) -> None:
+        content_id = manifest["sha256"]
+        path = os.path.join(self.directory, "manifests", content_id + ".json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(path + ".tmp", path)
+        self.manifests[content_id] = manifest
+        self.have.setdefault(content_id, set())
+
+    def _drop(self, content_id: str) -> None:
+        """Forget a content item with its manifest and the chunks no other item uses."""
+        manifest = self.manifests.pop(content_id, None)
+        self.have.pop(content_id, None)
+        try:
+            os.remove(os.path.join(self.directory, "manifests", content_id + ".json"))
+        except OSError:
+            pass
+        if not manifest:
+            return
+        used = {digest for other in self.manifests.values() for digest in other["chunks"]}
+        for digest in set(manifest["chunks"]) - used:
+            try:
+                os.remove(self._chunk_path(digest))
+            except OSError:
+                pass
+
+    def announced(self) -> List[str]:
+        """Return the content IDs to announce, most complete first."""
+        ranked = sorted(self.have, key=lambda cid: len(self.have[cid]), reverse=True)
+        return [cid for cid in ranked if self.have[cid]][: self.MAX_ANNOUNCED]
+
+    def seen(self, device_id: str, content_ids) -> None:
+        """Record content a device announced."""
+        if not isinstance(content_ids, list):
+            return
+        now = time.time()
+        for content_id in content_ids[: self.MAX_ANNOUNCED]:
+            if isinstance(content_id, str):
+                self.holders.setdefault(content_id, {})[device_id] = now
+
+    def _remember(self, device_id: Optional[str], ip: str, port, content_id: str) -> None:
+        """Learn a holder and make sure it can be contacted.
+
+        The values come from peers, so malformed ones are ignored.
+        """
+        if not isinstance(device_id, str) or not device_id or device_id == self.parent.id:
+            return
+        try:
+            port = int(port) if port is not None and not isinstance(port, bool) else None
+        except (TypeError, ValueError):
+            return
+        if port is not None and not 0 < port < 65536:
+            return
+        if device_id not in self.parent.devices:
+            if not port or not isinstance(ip, str) or not ip:
+                return
+            self.parent.devices[device_id] = {"ip": ip, "port": port, "last_seen": int(time.time())}
+            if self.parent.registry:
+                self.parent.registry.record(device_id)
+        self.holders.setdefault(content_id, {})[device_id] = time.time()
+
+    def _remember_holders(self, holders: Any, content_id: str) -> None:
+        """Learn the holders listed in a peer's answer, skipping malformed entries."""
+        if not isinstance(holders, list):
+            return
+        for holder in holders:
+            if isinstance(holder, dict):
+                self._remember(holder.get("id"), holder.get("ip"), holder.get("port"), content_id)
+
+    def _addresses(self, device_ids) -> List[dict]:
+        addresses = []
+        for device_id in device_ids:
+            device = self.parent.devices.get(device_id)
+            if device:
+                addresses.append({"id": device_id, "ip": device["ip"], "port": device["port"]})
+        return addresses
+
+    def _recent(self, content_id: str, index: int) -> Dict[str, float]:
+        """Return devices this device sent a chunk to within the seed window."""
+        served = self._served.get((content_id, index))
+        if not served:
+            return {}
+        cutoff = time.time() - self.seed_window
+        for device_id in [d for d, at in served.items() if at < cutoff or d not in self.parent.devices]:
+            del served[device_id]
+        return served
+
+    async def status_handler(self, content_id: str, request: Request) -> JSONResponse:
+        """Report the chunks and holders of a content item."""
+        body = {
+            "have": sorted(self.have.get(content_id, ())),
+            "holders": self._addresses(self.holders.get(content_id, {})),
+        }
+        if request.query_params.get("manifest"):
+            body["manifest"] = self.manifests.get(content_id)
+        return JSONResponse(body)
+
+    async def chunk_handler(self, content_id: str, index: int, request: Request):
+        """Serve one chunk of a content item."""
+        manifest = self.manifests.get(content_id)
+        if not manifest or index not in self.have.get(content_id, ()):
+            return JSONResponse({"error": "not_found"}, status_code=404)
+
+        sender_id = request.headers.get("x-easyhttp-sender")
+        recent = self._recent(content_id, index)
+        if sender_id and sender_id not in recent and len(recent) >= self.seed_copies:
+            self.counters["deferred"] += 1
+            return JSONResponse(
+                {"error": "ask_peers", "holders": self._addresses(recent)},
+                status_code=429,
+            )
+
+        # Whoever downloads a chunk can serve it to others soon
+        client_ip = request.client.host if request.client else "0.0.0.0"
+        self._remember(sender_id, client_ip, request.headers.get("x-easyhttp-port"), content_id)
+        if sender_id:
+            self._served.setdefault((content_id, index), {})[sender_id] = time.time()
+        path = self._chunk_path(manifest["chunks"][index])
+        self.counters["chunks_served"] += 1
+        self.counters["bytes_served"] += os.path.getsize(path)
+        return FileResponse(path, media_type="application/octet-stream")
+
+    def _split(self, path: str, name: str) -> dict:
+        """Store the chunks of a file and build its manifest."""
+        whole = hashlib.sha256()
+        chunks = []
+        size = 0
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(self.chunk_size)
+                if not block:
+                    break
+                whole.update(block)
+                digest = hashlib.sha256(block).hexdigest()
+                chunk_path = self._chunk_path(digest)
+                if not os.path.exists(chunk_path):
+                    with open(chunk_path + ".tmp", "wb") as out:
+                        out.write(block)
+                    os.replace(chunk_path + ".tmp", chunk_path)
+                chunks.append(digest)
+                size += len(block)
+        return {
+            "sha256": whole.hexdigest(),
+            "name": name,
+            "size": size,
+            "chunk_size": self.chunk_size,
+            "chunks": chunks,
+        }
+
+    async def share(self, path: str, name: Optional[str] = None) -> str:
+        """Make a file available to peers.
+
+        Returns:
+            The content ID (SHA-256 of the file).
+        """
+        loop = asyncio.get_running_loop()
+        manifest = await loop.run_in_executor(None, self._split, path, name or os.path.basename(path))
+        self._add_manifest(manifest)
+        content_id = manifest["sha256"]
+        self.have[content_id] = set(range(len(manifest["chunks"])))
+        self._announce()
+        if self.parent.debug:
+            log.custom("SWARM", Colors.GREEN, f"Sharing {manifest['name']} as {content_id[:12]} ({len(manifest['chunks'])} chunks)")
+        return content_id
+
+    def _announce(self) -> None:
+        discovery = getattr(self.parent, "discovery", None)
+        if discovery and discovery.enabled:
+            discovery.announce()
+
+    async def fetch(
+        self,
+        content_id: str,
+        source_id: Optional[str] = None,
+        path: Optional[str] = None,
+        timeout: float = 300.0,
+    ) -> dict:
+        """Download a content item from the devices that hold it.
+
+        Args:
+            content_id: SHA-256 of the content.
+            source_id: Device known to hold the content (e.g. the origin).
+                Other holders are learned from it and from discovery.
+            path: Where to write the file. Defaults to the manifest's name
+                inside the swarm directory.
+            timeout: Seconds to keep trying before giving up.
+
+        Returns:
+            Dict with 'status', 'path', 'size' and 'sources' (chunks per
+            device) on success, or an error dict: 'incomplete' if chunks
+            are still missing at the deadline, 'corrupt' if the assembled
+            file does not match the content ID.
+        """
+        deadline = time.monotonic() + timeout
+        sources: Dict[str, int] = {}
+        announced = False
+        if source_id:
+            self.holders.setdefault(content_id, {})[source_id] = time.time()
+
+        session = self.parent._http(BULK)
+        while time.monotonic() < deadline:
+            availability = await self._poll(session, content_id)
+            manifest = self.manifests.get(content_id)
+            if manifest is None:
+                await asyncio.sleep(0.5)
+                continue
+
+            have = self.have[content_id]
+            missing = [i for i in range(len(manifest["chunks"])) if i not in have]
+            if not missing:
+                break
+
+            # Rarest first; ties broken randomly so devices spread out
+            count = {i: sum(i in chunks for chunks in availability.values()) for i in missing}
+            wanted = [i for i in missing if count[i]]
+            random.shuffle(wanted)
+            wanted.sort(key=lambda i: count[i])
+            # Chunks only the source has are taken a few at a time and only
+            # when peers have nothing to offer, so the fleet spreads them
+            # instead of every device asking the origin
+            from_source = [i for i in wanted if count[i] == 1 and i in availability.get(source_id, ())]
+            wanted = [i for i in wanted if i not in from_source] or from_source[: self.per_peer]
+            wanted = wanted[: self.max_parallel * 2]
+            if not wanted:
+                await asyncio.sleep(0.2)
+                continue
+
+            active: Dict[str, int] = {}
+            slots = asyncio.Semaphore(self.max_parallel)
+
+            async def worker(index: int):
+                async with slots:
+                    holders = [d for d, chunks in availability.items() if index in chunks]
+                    holders.sort(key=lambda d: (
+                        active.get(d, 0) >= self.per_peer,
+                        d == source_id,
+                        active.get(d, 0),
+                        random.random(),
+                    ))
+                    device_id = holders[0]
+                    active[device_id] = active.get(device_id, 0) + 1
+                    try:
+                        ok = await self._fetch_chunk(session, device_id, manifest, index)
+                    finally:
+                        active[device_id] -= 1
+                    if ok:
+                        sources[device_id] = sources.get(device_id, 0) + 1
+                    else:
+                        availability[device_id].discard(index)
+
+            await asyncio.gather(*(worker(i) for i in wanted))
+            if not announced and have:
+                # Partial content is worth announcing: peers can use it
+                self._announce()
+                announced = True
+
+        manifest = self.manifests.get(content_id)
+        if manifest is None or len(self.have[content_id]) < len(manifest["chunks"]):
+            return {
+                "error": "incomplete",
+                "device_id": source_id,
+                "content_id": content_id,
+                "chunks": len(self.have.get(content_id, ())),
+                "total": len(manifest["chunks"]) if manifest else None,
+            }
+
+        path = path or os.path.join(self.directory, manifest["name"])
+        if not await asyncio.get_running_loop().run_in_executor(None, self._assemble, manifest, path):
+            # The manifest's chunk digests did not add up to the content
+            self.counters["corrupt"] += 1
+            self._drop(content_id)
+            log.custom("SWARM", Colors.RED, f"Content {content_id[:12]} does not match its ID, discarded")
+            return {"error": "corrupt", "device_id": source_id, "content_id": content_id}
+        self._announce()
+        if self.parent.debug:
+            log.custom("SWARM", Colors.GREEN, f"Fetched {manifest['name']} from {len(sources)} devices")
+        return {"status": "complete", "path": path, "size": manifest["size"], "sources": sources}
+
+    async def _poll(self, session: aiohttp.ClientSession, content_id: str) -> Dict[str, Set[int]]:
+        """Ask every known holder which chunks it has."""
+        want_manifest = content_id not in self.manifests
+        holders = [d for d in self.holders.get(content_id, {}) if d in self.parent.devices]
+        if len(holders) > self.POLL_PEERS:
+            holders = random.sample(holders, self.POLL_PEERS)
+
+        async def ask(device_id: str):
+            device = self.parent.devices[device_id]
+            url = self.parent.tls.url(device, f"/easyhttp/swarm/{content_id}")
+            try:
+                await self.parent._first_use(device_id, self.parent.max_timeout)
+                async with session.get(
+                    url,
+                    params={"manifest": "1"} if want_manifest else None,
+                    timeout=aiohttp.ClientTimeout(total=self.parent.max_timeout),
+                    ssl=self.parent.tls.client_ssl(device),
+                ) as response:
+                    return device_id, await response.json(content_type=None)
+            except (asyncio.TimeoutError, aiohttp.ClientError, OSError, ValueError):
+                return device_id, None
+
+        availability = {}
+        for device_id, body in await asyncio.gather(*(ask(d) for d in holders)):
+            if not isinstance(body, dict):
+                continue
+            manifest = body.get("manifest")
+            if content_id not in self.manifests and _valid_manifest(manifest, content_id):
+                manifest["name"] = os.path.basename(str(manifest.get("name") or "")) or content_id
+                self._add_manifest(manifest)
+            self._remember_holders(body.get("holders"), content_id)
+            have = body.get("have")
+            availability[device_id] = {i for i in have if isinstance(i, int)} if isinstance(have, list) else set()
+        return availability
+
+    async def _fetch_chunk(self, session: aiohttp.ClientSession, device_id: str, manifest: dict, index: int) -> bool:
+        """Download and verify one chunk."""
+        device = self.parent.devices[device_id]
+        content_id = manifest["sha256"]
+        url = self.parent.tls.url(device, f"/easyhttp/swarm/{content_id}/{index}")
+        try:
+            await self.parent._first_use(device_id, self.parent.max_timeout)
+            async with session.get(
+                url,
+                headers={"X-EasyHTTP-Sender": self.parent.id, "X-EasyHTTP-Port": str(self.parent.port)},
+                timeout=aiohttp.ClientTimeout(total=max(self.parent.max_timeout, 30.0)),
+                ssl=self.parent.tls.client_ssl(device),
+            ) as response:
+                if response.status == 429:
+                    # The holder has handed this chunk out enough; ask its peers
+                    body = await response.json(content_type=None)
+                    if isinstance(body, dict):
+                        self._remember_holders(body.get("holders"), content_id)
+                    self.counters["redirected"] += 1
+                    return False
+                if response.status != 200:
+                    raise ValueError(f"HTTP {response.status}")
+                block = await response.read()
+        except (asyncio.TimeoutError, aiohttp.ClientError, OSError, ValueError) as e:
+            self.counters["chunk_failures"] += 1
+            if self.parent.debug:
+                log.custom("SWARM", Colors.RED, f"Chunk {index} from {device_id} failed: {e}")
+            return False
+
+        digest = manifest["chunks"][index]
+        if hashlib.sha256(block).hexdigest() != digest:
+            self.counters["chunk_failures"] += 1
+            return False
+
+        path = self._chunk_path(digest)
+        with open(path + ".tmp", "wb") as f:
+            f.write(block)
+        os.replace(path + ".tmp", path)
+        self.have[content_id].add(index)
+        self.counters["chunks_fetched"] += 1
+        self.counters["bytes_fetched"] += len(block)
+        return True
+
+    def _assemble(self, manifest: dict, path: str) -> bool:
+        """Concatenate the chunks of a content item into a file.
+
+        Returns:
+            False, leaving no file behind, if the result does not hash
+            to the content ID.
+        """
+        whole = hashlib.sha256()
+        with open(path + ".tmp", "wb") as out:
+            for digest in manifest["chunks"]:
+                with open(self._chunk_path(digest), "rb") as f:
+                    while True:
+                        block = f.read(1024 * 1024)
+                        if not block:
+                            break
+                        whole.update(block)
+                        out.write(block)
+        if whole.hexdigest() != manifest["sha256"]:
+            os.remove(path + ".tmp")
+            return False
+        os.replace(path + ".tmp", path)
+        return True
+
+    def stats(self) -> dict:
+        """Return transfer counters and per-content completeness."""
+        return {
+            **self.counters,
+            "content": {
+                cid: {"have": len(self.have[cid]), "chunks": len(m["chunks"])}
+                for cid, m in self.manifests.items()
+            },
+        }
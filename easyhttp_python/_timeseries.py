@@ -0,0 +1,184 @@
+"""On-device time-series store for pushed telemetry."""
+
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+class RingSeries:
+    """Fixed-capacity series of (timestamp, value) pairs in flat arrays.
+
+    The oldest samples are overwritten once the buffer is full, so memory
+    use is constant: two doubles per slot.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self.head = 0
+        self.count = 0
+
+    def append(self, timestamp: float, value: float) -> None:
+        self.times[self.head] = timestamp
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def _slot(self, index: int) -> int:
+        """Map a logical index (0 = oldest) to a position in the arrays."""
+        return (self.head - self.count + index) % self.capacity
+
+    def _bisect(self, timestamp: float) -> int:
+        """Return the logical index of the first sample at or after timestamp."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.times[self._slot(mid)] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def downsample(self, start: float, end: float, buckets: int) -> List[list]:
+        """Aggregate samples in [start, end] into equal-width buckets.
+
+        Returns:
+            List of [bucket_start, min, max, mean, count] for non-empty buckets.
+        """
+        width = (end - start) / buckets if end > start else 1.0
+        result: Dict[int, list] = {}
+        for index in range(self._bisect(start), self.count):
+            slot = self._slot(index)
+            timestamp = self.times[slot]
+            if timestamp > end:
+                break
+            value = self.values[slot]
+            bucket = min(int((timestamp - start) / width), buckets - 1)
+            agg = result.get(bucket)
+            if agg is None:
+                result[bucket] = [value, value, value, 1]
+            else:
+                if value < agg[0]:
+                    agg[0] = value
+                if value > agg[1]:
+                    agg[1] = value
+                agg[2] += value
+                agg[3] += 1
+        return [
+            [start + bucket * width, agg[0], agg[1], agg[2] / agg[3], agg[3]]
+            for bucket, agg in sorted(result.items())
+        ]
+
+    def bounds(self) -> Optional[Tuple[float, float]]:
+        """Return the timestamps of the oldest and newest sample."""
+        if not self.count:
+            return None
+        return self.times[self._slot(0)], self.times[self._slot(self.count - 1)]
+
+class TimeSeriesStore:
+    """Keeps numeric fields of received PUSH/DATA payloads per device.
+
+    Each numeric field becomes a metric stored under the ID of the device
+    that sent it; nested dicts are flattened with dots ('env.temp').
+    """
+
+    def __init__(self, capacity: int = 3600, max_metrics: int = 1024):
+        self.capacity = capacity
+        self.max_metrics = max_metrics
+        self.series: Dict[Tuple[str, str], RingSeries] = {}
+        self.dropped = 0
+
+    def record(self, source: Optional[str], data: Any, timestamp: Optional[float] = None) -> int:
+        """Store every numeric field of a payload.
+
+        Args:
+            source: ID of the device the payload came from.
+            data: Received payload; only dicts carry metrics.
+            timestamp: Sample time, defaults to now.
+
+        Returns:
+            Number of samples stored.
+        """
+        if not isinstance(data, dict):
+            return 0
+        timestamp = time.time() if timestamp is None else timestamp
+        stored = 0
+        for metric, value in self._flatten(data):
+            key = (source or "", metric)
+            series = self.series.get(key)
+            if series is None:
+                if len(self.series) >= self.max_metrics:
+                    self.dropped += 1
+                    continue
+                series = self.series[key] = RingSeries(self.capacity)
+            series.append(timestamp, value)
+            stored += 1
+        return stored
+
+    def query(
+        self,
+        metric: str,
+        source: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        buckets: int = 100,
+    ) -> Optional[dict]:
+        """Return a downsampled range of one metric.
+
+        Args:
+            metric: Metric name, e.g. 'temperature' or 'env.temp'.
+            source: Device the metric came from. Defaults to the only
+                device reporting it.
+            start: Range start (UNIX time). Defaults to the oldest sample.
+            end: Range end (UNIX time). Defaults to the newest sample.
+            buckets: Maximum number of points to return.
+
+        Returns:
+            Dict with 'metric', 'source', 'start', 'end' and 'points'
+            ([bucket_start, min, max, mean, count] each), or None if the
+            metric is unknown.
+        """
+        series = None
+        if source is not None:
+            series = self.series.get((source, metric))
+        else:
+            matches = [(src, s) for (src, name), s in self.series.items() if name == metric]
+            if len(matches) == 1:
+                source, series = matches[0]
+        if series is None or not series.count:
+            return None
+
+        first, last = series.bounds()
+        start = first if start is None else start
+        end = last if end is None else end
+        buckets = max(1, min(int(buckets), series.capacity))
+        return {
+            "metric": metric,
+            "source": source,
+            "start": start,
+            "end": end,
+            "points": series.downsample(start, end, buckets),
+        }
+
+    def metrics(self) -> List[dict]:
+        """List stored metrics with their sample count and time range."""
+        result = []
+        for (source, metric), series in self.series.items():
+            bounds = series.bounds()
+            result.append({
+                "metric": metric,
+                "source": source,
+                "count": series.count,
+                "start": bounds[0] if bounds else None,
+                "end": bounds[1] if bounds else None,
+            })
+        return result
+
+    def _flatten(self, data: dict, prefix: str = ""):
+        for key, value in data.items():
+            name = f"{prefix}{key}"
+            if isinstance(value, dict):
+                yield from self._flatten(value, name + ".")
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield name, float(value)
@@ -0,0 +1,187 @@
+"""TLS module for EasyHTTP.
+
+With a certificate and key, the server speaks HTTPS and announces via
+discovery and in the header of every packet that it does. Those claims
+travel unauthenticated, so they only tell peers to use HTTPS: without a
+CA file, a peer pins the certificate it sees on its first handshake with
+a device (trust on first use), so self-signed certificates work without
+a CA. With a CA file, unpinned devices are verified against it instead.
+
+Connections are kept alive and reused, which saves handshakes. TLS
+session resumption is not used: neither aiohttp nor asyncio streams
+accept an ssl.SSLSession, so a new connection does a full handshake.
+"""
+
+import asyncio
+import hashlib
+import ssl
+from typing import Dict, Optional, Union
+
+import aiohttp
+
+class PinMismatch(ssl.SSLError):
+    """A device's certificate does not match its pinned fingerprint."""
+
+def cert_fingerprint(certfile: str) -> str:
+    """Return the SHA-256 hex fingerprint of a PEM certificate."""
+    with open(certfile, "r") as f:
+        der = ssl.PEM_cert_to_DER_cert(f.read())
+    return hashlib.sha256(der).hexdigest()
+
+class TLS:
+    """Server certificate and per-peer client verification settings."""
+
+    def __init__(
+        self,
+        certfile: Optional[str] = None,
+        keyfile: Optional[str] = None,
+        cafile: Optional[str] = None,
+    ):
+        self.certfile = certfile
+        self.keyfile = keyfile
+        self.cafile = cafile
+        self.fingerprint = cert_fingerprint(certfile) if certfile else None
+
+        self.counters = {"connections": 0, "reused": 0, "pin_failures": 0}
+        self._pins: Dict[str, aiohttp.Fingerprint] = {}
+        self._context: Optional[ssl.SSLContext] = None
+        self._pinned_context: Optional[ssl.SSLContext] = None
+
+    @property
+    def context(self) -> ssl.SSLContext:
+        """Client context verifying peers against the CA file."""
+        # Loading the CAs is slow, so it waits until a TLS peer is contacted
+        if self._context is None:
+            # Peers are addressed by IP, so names are not checked
+            self._context = ssl.create_default_context(cafile=self.cafile)
+            self._context.check_hostname = False
+        return self._context
+
+    @property
+    def verifying(self) -> bool:
+        """True if unpinned devices are checked against a CA file rather than pinned on first use."""
+        return bool(self.cafile)
+
+    @property
+    def pinned_context(self) -> ssl.SSLContext:
+        """Client context for pinned peers, checked by fingerprint after the handshake,
+        and for the first handshake with a peer that is pinned on first use."""
+        if self._pinned_context is None:
+            self._pinned_context = ssl.create_default_context()
+            self._pinned_context.check_hostname = False
+            self._pinned_context.verify_mode = ssl.CERT_NONE
+        return self._pinned_context
+
+    @property
+    def enabled(self) -> bool:
+        """True if this device serves HTTPS."""
+        return bool(self.certfile)
+
+    def server_config(self) -> dict:
+        """Return the uvicorn.Config arguments for HTTPS."""
+        if not self.enabled:
+            return {}
+        return {"ssl_certfile": self.certfile, "ssl_keyfile": self.keyfile}
+
+    def url(self, device: dict, path: str) -> str:
+        """Build the URL of a path on a device."""
+        scheme = "https" if device.get("tls") else "http"
+        return f"{scheme}://{device['ip']}:{device['port']}{path}"
+
+    def client_ssl(self, device: dict) -> Union[bool, ssl.SSLContext, aiohttp.Fingerprint]:
+        """Return the aiohttp 'ssl' argument for requests to a device."""
+        if not device.get("tls"):
+            return True
+        fingerprint = device.get("fingerprint")
+        if fingerprint:
+            # Pooled connections are keyed by this object, so reuse it
+            pin = self._pins.get(fingerprint)
+            if pin is None:
+                pin = self._pins[fingerprint] = aiohttp.Fingerprint(bytes.fromhex(fingerprint))
+            return pin
+        return self.context if self.verifying else self.pinned_context
+
+    def stream_ssl(self, device: dict) -> Optional[ssl.SSLContext]:
+        """Return the 'ssl' argument for asyncio.open_connection() to a device."""
+        if not device.get("tls"):
+            return None
+        if device.get("fingerprint") or not self.verifying:
+            return self.pinned_context
+        return self.context
+
+    def trust(self, device: dict, transport) -> bool:
+        """Pin the certificate of the first handshake with an unpinned device.
+
+        Args:
+            device: Entry of the device in the devices cache.
+            transport: Connection the handshake happened on (anything
+                with get_extra_info(), e.g. a stream writer).
+
+        Returns:
+            True if the device was pinned now.
+        """
+        if not device.get("tls") or device.get("fingerprint") or self.verifying or transport is None:
+            return False
+        ssl_object = transport.get_extra_info("ssl_object")
+        der = ssl_object.getpeercert(binary_form=True) if ssl_object else None
+        if not der:
+            return False
+        device["fingerprint"] = hashlib.sha256(der).hexdigest()
+        return True
+
+    async def first_use(self, device: dict, timeout: float) -> bool:
+        """Pin an unpinned device by a handshake of its own before the first request.
+
+        The HTTP client does not expose the connection of a response, so
+        the certificate is read from a separate short-lived connection;
+        the request that follows is then checked against the pin.
+
+        Returns:
+            True if the device was pinned now.
+
+        Raises:
+            OSError, asyncio.TimeoutError: If the device cannot be reached.
+        """
+        if not device.get("tls") or device.get("fingerprint") or self.verifying:
+            return False
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(device["ip"], device["port"], ssl=self.pinned_context),
+            timeout,
+        )
+        try:
+            return self.trust(device, writer)
+        finally:
+            writer.close()
+
+    def check_peer(self, device: dict, writer) -> None:
+        """Verify the pinned fingerprint of a stream connection.
+
+        Raises:
+            PinMismatch: If the peer's certificate does not match.
+        """
+        expected = device.get("fingerprint")
+        ssl_object = writer.get_extra_info("ssl_object")
+        if not expected or ssl_object is None:
+            return
+        actual = hashlib.sha256(ssl_object.getpeercert(binary_form=True)).hexdigest()
+        if actual != expected:
+            self.counters["pin_failures"] += 1
+            raise PinMismatch(f"Certificate fingerprint mismatch: {actual}")
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """Return a trace config counting new and reused connections."""
+        trace = aiohttp.TraceConfig()
+
+        async def created(session, context, params):
+            self.counters["connections"] += 1
+
+        async def reused(session, context, params):
+            self.counters["reused"] += 1
+
+        trace.on_connection_create_end.append(created)
+        trace.on_connection_reuseconn.append(reused)
+        return trace
+
+    def stats(self) -> dict:
+        """Return connection counters; each new connection to a TLS peer is a handshake."""
+        return dict(self.counters)
@@ -0,0 +1,375 @@
+"""Binary file transfer module for EasyHTTP.
+
+Files bypass the JSON API, so they are neither base64-encoded nor
+copied through Python objects:
+
+- The sender streams the raw bytes in a PUT to /easyhttp/files/{sha256}
+  with os.sendfile() (loop.sendfile falls back to plain writes where it
+  is not available, e.g. over TLS or on uvloop).
+- The receiver appends the body to a partial file as it arrives.
+  'Content-Range: bytes START-END/TOTAL' says where the body belongs; a
+  body that does not start at the receiver's offset gets a 416 carrying
+  the offset to resume from.
+- GET /easyhttp/files/{sha256} returns the receiver's offset, so an
+  interrupted transfer resumes where it stopped.
+- Once all bytes are there, the SHA-256 of the file is checked before it
+  gets its final name and the on_file callback runs.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import ssl
+from typing import TYPE_CHECKING, Dict, Optional, Set, Tuple
+from urllib.parse import quote, unquote
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from starlette.requests import ClientDisconnect
+
+from ._tls import PinMismatch
+
+if TYPE_CHECKING:
+    from .core import EasyHTTPAsync
+
+from loggity import Logger, Colors, LoggerConfig
+log_config = LoggerConfig(
+    colored = True,
+    timestamps = False,
+    timeformat = None,
+    file = None
+)
+log = Logger(config = log_config)
+
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+_RANGE = re.compile(r"bytes (?:(\d+)-\d+|\*)/(\d+)")
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """Return the SHA-256 hex digest of a file.
+
+    The file is read into one reusable buffer, so hashing a large file
+    does not allocate a bytes object per chunk.
+    """
+    sha = hashlib.sha256()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            size = f.readinto(buffer)
+            if not size:
+                break
+            sha.update(view[:size])
+    return sha.hexdigest()
+
+def _parse_range(value: Optional[str], offset: int) -> Tuple[int, int]:
+    """Parse a Content-Range header into (start, total).
+
+    'bytes */TOTAL' carries no bytes and starts at the current offset.
+
+    Raises:
+        ValueError: If the header is missing or malformed.
+    """
+    match = _RANGE.fullmatch((value or "").strip())
+    if not match:
+        raise ValueError("Content-Range must be 'bytes START-END/TOTAL'")
+    start = offset if match.group(1) is None else int(match.group(1))
+    return start, int(match.group(2))
+
+def _safe_name(name: str) -> str:
+    name = os.path.basename(unquote(name).replace("\\", "/"))
+    if name in ("", ".", "..") or name.startswith("."):
+        raise ValueError(f"Invalid file name: {name!r}")
+    return name
+
+class FileTransfer:
+    """Sends files to peers and receives files into a directory."""
+
+    def __init__(
+        self,
+        parent: "EasyHTTPAsync",
+        directory: Optional[str] = None,
+        max_size: Optional[int] = None,
+        response_timeout: float = 60.0,
+    ):
+        self.parent = parent
+        self.directory = directory
+        self.max_size = max_size
+        self.response_timeout = response_timeout
+        self.completed: Dict[str, str] = {}
+        self.counters = {
+            "sent": 0,
+            "received": 0,
+            "resumed": 0,
+            "checksum_failures": 0,
+            "bytes_sent": 0,
+            "bytes_received": 0,
+        }
+        self._active: Set[str] = set()
+        if directory:
+            os.makedirs(os.path.join(directory, ".partial"), exist_ok=True)
+
+    def register(self, app) -> None:
+        """Add the file routes to the FastAPI app."""
+        app.get("/easyhttp/files/{digest}")(self.status_handler)
+        app.put("/easyhttp/files/{digest}")(self.upload_handler)
+
+    def _part_path(self, digest: str) -> str:
+        return os.path.join(self.directory, ".partial", digest + ".part")
+
+    def _offset(self, digest: str) -> int:
+        try:
+            return os.path.getsize(self._part_path(digest))
+        except OSError:
+            return 0
+
+    def _check(self, digest: str) -> Optional[JSONResponse]:
+        if not self.directory:
+            return JSONResponse({"error": "files_disabled"}, status_code=404)
+        if not _DIGEST.fullmatch(digest):
+            return JSONResponse({"error": "invalid_digest"}, status_code=400)
+        return None
+
+    async def status_handler(self, digest: str) -> JSONResponse:
+        """Report how much of a file has been received."""
+        rejection = self._check(digest)
+        if rejection:
+            return rejection
+        path = self.completed.get(digest)
+        if path and os.path.exists(path):
+            return JSONResponse({"offset": os.path.getsize(path), "complete": True})
+        return JSONResponse({"offset": self._offset(digest), "complete": False})
+
+    async def upload_handler(self, digest: str, request: Request) -> JSONResponse:
+        """Append an uploaded range to the partial file and finish it when complete."""
+        rejection = self._check(digest)
+        if rejection:
+            return rejection
+
+        offset = self._offset(digest)
+        try:
+            start, total = _parse_range(request.headers.get("content-range"), offset)
+            name = _safe_name(request.headers.get("x-easyhttp-name") or digest)
+        except ValueError as e:
+            return JSONResponse({"error": "invalid_request", "detail": str(e)}, status_code=400)
+        if self.max_size is not None and total > self.max_size:
+            return JSONResponse({"error": "too_large", "max_size": self.max_size}, status_code=413)
+        if digest in self._active:
+            return JSONResponse({"error": "busy", "offset": offset}, status_code=409)
+        if start != offset:
+            return JSONResponse({"error": "range_mismatch", "offset": offset}, status_code=416)
+
+        sender_id = request.headers.get("x-easyhttp-sender")
+        part = self._part_path(digest)
+        size = offset
+        self._active.add(digest)
+        try:
+            with open(part, "ab") as f:
+                async for chunk in request.stream():
+                    if size + len(chunk) > total:
+                        break
+                    f.write(chunk)
+                    size += len(chunk)
+        except ClientDisconnect:
+            # Whatever arrived stays on disk for the sender to resume from
+            if self.parent.debug:
+                log.custom("FILE", Colors.YELLOW, f"Upload of {name} from {sender_id} interrupted at {size}/{total}")
+            return JSONResponse({"status": "partial", "offset": size})
+        finally:
+            self._active.discard(digest)
+            self.counters["bytes_received"] += size - offset
+
+        if size < total:
+            return JSONResponse({"status": "partial", "offset": size})
+
+        actual = await asyncio.get_running_loop().run_in_executor(None, file_digest, part)
+        if actual != digest or size != total:
+            os.remove(part)
+            self.counters["checksum_failures"] += 1
+            if self.parent.debug:
+                log.custom("FILE", Colors.RED, f"Checksum mismatch for {name} from {sender_id}")
+            return JSONResponse({"error": "checksum_mismatch", "offset": 0}, status_code=422)
+
+        path = os.path.join(self.directory, name)
+        os.replace(part, path)
+        self.completed[digest] = path
+        self.counters["received"] += 1
+        if self.parent.debug:
+            log.custom("FILE", Colors.GREEN, f"Received {name} ({total} bytes) from {sender_id}")
+        await self.parent._run_callback("on_file", sender_id, name=name, path=path, size=total)
+        return JSONResponse({"status": "complete", "size": total})
+
+    async def send(self, device_id: str, path: str, name: Optional[str] = None) -> dict:
+        """Upload a file to a device, resuming after interruptions.
+
+        Returns:
+            Dict with 'status' ('complete'), 'size', 'sha256' and
+            'resumed_from' on success, or an error dict.
+        """
+        if device_id not in self.parent.devices:
+            return self.parent._send_error(device_id, "unknown_device", 0)
+
+        loop = asyncio.get_running_loop()
+        size = os.path.getsize(path)
+        digest = await loop.run_in_executor(None, file_digest, path)
+        name = name or os.path.basename(path)
+        resumed_from = None
+        error: dict = {}
+        attempts = 0
+
+        while attempts <= self.parent.retries:
+            if attempts:
+                await asyncio.sleep(self.parent.retry_backoff * 2 ** (attempts - 1))
+            attempts += 1
+            device = self.parent.devices[device_id]
+            pinned = device.get("fingerprint")
+            try:
+                status, body = await self._request(device, "GET", digest)
+                if status != 200:
+                    error = {"error": body.get("error", "http_status"), "status": status}
+                    break
+                offset = body.get("offset", 0)
+                if not body.get("complete"):
+                    if offset:
+                        self.counters["resumed"] += 1
+                    if resumed_from is None:
+                        resumed_from = offset
+                    status, body = await self._upload(device, path, digest, name, offset, size)
+            except (PinMismatch, ssl.SSLCertVerificationError) as e:
+                error = {"error": "certificate", "detail": str(e)}
+                break
+            except (OSError, EOFError, asyncio.TimeoutError, ValueError) as e:
+                error = {"error": "connection", "detail": str(e)}
+                continue
+            finally:
+                if device.get("fingerprint") != pinned:
+                    self.parent._pinned(device_id)
+
+            if status == 200 and body.get("status") != "partial":
+                self.counters["sent"] += 1
+                self.parent._peer_seen(device_id)
+                return {
+                    "status": "complete",
+                    "size": size,
+                    "sha256": digest,
+                    "resumed_from": resumed_from or 0,
+                }
+            error = {"error": body.get("error", "incomplete"), "status": status}
+            if status not in (200, 409, 416, 422):
+                break
+
+        if self.parent.debug:
+            log.custom("FILE", Colors.RED, f"Sending {name} to {device_id} failed: {error}")
+        return self.parent._send_error(device_id, error.pop("error", "connection"), attempts, **error)
+
+    async def _connect(self, device: dict):
+        """Open a stream to a device, over TLS if it serves HTTPS.
+
+        Devices on the same host are reached through their Unix domain socket.
+        """
+        path = self.parent.unix.route(device)
+        if path:
+            try:
+                return await asyncio.wait_for(asyncio.open_unix_connection(path), self.parent.max_timeout)
+            except OSError:
+                self.parent.unix.drop(device)
+        tls = self.parent.tls
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(device["ip"], device["port"], ssl=tls.stream_ssl(device)),
+            self.parent.max_timeout,
+        )
+        try:
+            tls.check_peer(device, writer)
+        except PinMismatch:
+            writer.close()
+            raise
+        tls.trust(device, writer)
+        return reader, writer
+
+    async def _upload(self, device: dict, path: str, digest: str, name: str, offset: int, size: int):
+        """Stream a file from offset to the end with sendfile()."""
+        count = size - offset
+        content_range = f"bytes {offset}-{size - 1}/{size}" if count else f"bytes */{size}"
+        head = (
+            f"PUT /easyhttp/files/{digest} HTTP/1.1\r\n"
+            f"Host: {device['ip']}:{device['port']}\r\n"
+            f"Content-Type: application/octet-stream\r\n"
+            f"Content-Length: {count}\r\n"
+            f"Content-Range: {content_range}\r\n"
+            f"X-EasyHTTP-Sender: {self.parent.id}\r\n"
+            f"X-EasyHTTP-Name: {quote(name)}\r\n"
+            f"Connection: close\r\n\r\n"
+        )
+        reader, writer = await self._connect(device)
+        try:
+            writer.write(head.encode())
+            await writer.drain()
+            if count:
+                with open(path, "rb") as f:
+                    try:
+                        await asyncio.get_running_loop().sendfile(writer.transport, f, offset, count)
+                    except NotImplementedError:
+                        # Event loops without sendfile support, such as uvloop
+                        await self._copy(f, writer, offset, count)
+                self.counters["bytes_sent"] += count
+            return await asyncio.wait_for(self._read_response(reader), self.response_timeout)
+        finally:
+            writer.close()
+
+    async def _copy(self, f, writer: asyncio.StreamWriter, offset: int, count: int) -> None:
+        """Write count bytes of a file from offset with plain writes."""
+        f.seek(offset)
+        while count > 0:
+            chunk = f.read(min(count, 1 << 18))
+            if not chunk:
+                raise EOFError("File shrank during upload")
+            writer.write(chunk)
+            await writer.drain()
+            count -= len(chunk)
+
+    async def _request(self, device: dict, method: str, digest: str):
+        """Send a bodyless request to the file routes of a device."""
+        reader, writer = await self._connect(device)
+        try:
+            writer.write(
+                f"{method} /easyhttp/files/{digest} HTTP/1.1\r\n"
+                f"Host: {device['ip']}:{device['port']}\r\n"
+                f"Connection: close\r\n\r\n".encode()
+            )
+            await writer.drain()
+            return await asyncio.wait_for(self._read_response(reader), self.parent.max_timeout)
+        finally:
+            writer.close()
+
+    async def _read_response(self, reader: asyncio.StreamReader):
+        """Read a JSON HTTP response.
+
+        Returns:
+            Tuple of (status code, body dict).
+
+        Raises:
+            ValueError: If the response is not valid HTTP/JSON.
+        """
+        status_line = await reader.readline()
+        parts = status_line.split()
+        if len(parts) < 2 or not parts[1].isdigit():
+            raise ValueError(f"Invalid HTTP status line: {status_line[:80]!r}")
+        length = None
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            if key.strip().lower() == "content-length":
+                length = int(value.strip())
+        raw = await (reader.readexactly(length) if length is not None else reader.read())
+        body = json.loads(raw) if raw else {}
+        return int(parts[1]), body if isinstance(body, dict) else {}
+
+    def stats(self) -> dict:
+        """Return transfer counters and the number of partial files."""
+        partial = 0
+        if self.directory:
+            partial = len(os.listdir(os.path.join(self.directory, ".partial")))
+        return {**self.counters, "partial": partial}
@@ -0,0 +1,147 @@
+"""Unix domain socket transport for EasyHTTP.
+
+A device can serve its API on a Unix domain socket next to the TCP port.
+The socket path is announced via discovery and in the header of every
+packet, together with an ID of the host. Peers on the same host record
+the path and send to it instead of going through the TCP stack. If the
+socket is gone, the peer forgets it and falls back to TCP.
+
+The host ID is no secret (it is in every packet), so an announced path
+is only trusted when the packet came from a local address and the path
+lies in the directory of this device's own socket.
+"""
+
+import hashlib
+import ipaddress
+import os
+import socket
+from typing import Dict, Optional, Set, Tuple
+
+import aiohttp
+
+def host_id() -> str:
+    """Return a short ID of this host, the same for every process on it."""
+    try:
+        with open("/etc/machine-id", "r") as f:
+            seed = f.read().strip()
+    except OSError:
+        seed = ""
+    return hashlib.sha256((seed or socket.gethostname()).encode()).hexdigest()[:16]
+
+class UnixTransport:
+    """Serves on and sends to Unix domain sockets of co-located devices."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = os.path.abspath(path) if path else None
+        self.directory = os.path.dirname(self.path) if self.path else None
+        self.host = host_id()
+        self._local: Optional[Set[str]] = None
+        self.counters = {"requests": 0, "fallbacks": 0}
+        self._sessions: Dict[Tuple[str, str], aiohttp.ClientSession] = {}
+
+    @property
+    def enabled(self) -> bool:
+        """True if this device serves on a Unix domain socket."""
+        return bool(self.path) and hasattr(socket, "AF_UNIX")
+
+    def server_config(self) -> dict:
+        """Return the uvicorn.Config arguments for the socket server."""
+        return {"uds": self.path}
+
+    def endpoint(self) -> dict:
+        """Return the fields announcing the socket, or {} if disabled."""
+        if not self.enabled:
+            return {}
+        return {"host": self.host, "uds": self.path}
+
+    def _local_addresses(self) -> Set[str]:
+        """Return the addresses of this host's interfaces, looked up once."""
+        if self._local is None:
+            addresses = set()
+            try:
+                for info in socket.getaddrinfo(socket.gethostname(), None):
+                    addresses.add(info[4][0])
+            except OSError:
+                pass
+            try:
+                # Connecting a UDP socket sends nothing but picks the
+                # address of the interface with the default route
+                with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+                    probe.connect(("192.0.2.1", 9))
+                    addresses.add(probe.getsockname()[0])
+            except OSError:
+                pass
+            self._local = addresses
+        return self._local
+
+    def is_local(self, ip) -> bool:
+        """Tell whether an address belongs to this host."""
+        try:
+            if ipaddress.ip_address(ip).is_loopback:
+                return True
+        except ValueError:
+            return False
+        return ip in self._local_addresses()
+
+    def allowed(self, path) -> bool:
+        """Tell whether a socket path lies in this device's socket directory."""
+        if not self.directory or not isinstance(path, str) or not os.path.isabs(path):
+            return False
+        path = os.path.normpath(path)
+        return os.path.dirname(path) != path and os.path.commonpath([self.directory, path]) == self.directory
+
+    def learn(self, device: Optional[dict], host, path, ip) -> bool:
+        """Record the socket of a device if it runs on this host.
+
+        Args:
+            device: Entry of the device in the devices cache.
+            host: Host ID the device announced.
+            path: Socket path the device announced.
+            ip: Address the announcement came from.
+
+        Returns:
+            True if the device entry changed.
+        """
+        if device is None or host != self.host or not self.allowed(path) or not self.is_local(ip):
+            return False
+        path = os.path.normpath(path)
+        if device.get("uds") == path:
+            return False
+        device["uds"] = path
+        return True
+
+    def route(self, device: dict) -> Optional[str]:
+        """Return the socket path to use for a device, or None for TCP."""
+        path = device.get("uds")
+        if path and os.path.exists(path):
+            return path
+        return None
+
+    def session(self, path: str, traffic_class: str = "control") -> aiohttp.ClientSession:
+        """Return the client session of a socket and traffic class, keeping its connections alive."""
+        session = self._sessions.get((path, traffic_class))
+        if session is None or session.closed:
+            session = self._sessions[(path, traffic_class)] = aiohttp.ClientSession(
+                connector=aiohttp.UnixConnector(path=path)
+            )
+        return session
+
+    def drop(self, device: dict) -> None:
+        """Forget the socket of a device after it failed."""
+        self.counters["fallbacks"] += 1
+        device.pop("uds", None)
+
+    async def close(self) -> None:
+        """Close the client sessions and remove the socket file."""
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions.clear()
+        if self.enabled:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        """Return the number of requests sent over sockets and TCP fallbacks."""
+        return dict(self.counters)
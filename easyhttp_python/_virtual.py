@@ -0,0 +1,212 @@
+"""In-memory virtual network for EasyHTTP simulations.
+
+Instances created with network=VirtualNetwork() get a virtual IP address
+instead of binding real sockets. API requests, discovery multicast and
+datagrams are passed between instances in memory, JSON-encoded like on
+the wire, across links with configurable latency, jitter, loss and
+bandwidth. Thousands of instances fit in one process, which makes scale
+tests and protocol-overhead benchmarks possible.
+
+File transfers and content distribution use real sockets and are not
+available on a virtual network.
+"""
+
+import asyncio
+import json
+import random
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    from .core import EasyHTTPAsync
+
+Handler = Callable[[bytes, tuple], Awaitable[Any]]
+
+class Link:
+    """Properties of the path between two virtual hosts."""
+
+    def __init__(
+        self,
+        latency: float = 0.001,
+        jitter: float = 0.0,
+        loss: float = 0.0,
+        bandwidth: Optional[float] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.bandwidth = bandwidth
+        self.busy_until = 0.0
+
+    def delay(self, size: int, rng: random.Random) -> float:
+        """Return the one-way delay of a message, queueing it behind earlier ones."""
+        delay = self.latency + (rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if self.bandwidth:
+            now = time.monotonic()
+            start = max(now, self.busy_until)
+            self.busy_until = start + size / self.bandwidth
+            delay += self.busy_until - now
+        return delay
+
+class VirtualNetwork:
+    """Connects EasyHTTPAsync instances in memory.
+
+    Args:
+        latency: Default one-way latency in seconds.
+        jitter: Default extra random latency, up to this many seconds.
+        loss: Default probability that a message is lost.
+        bandwidth: Default link bandwidth in bytes per second, None for
+            unlimited.
+        seed: Seed of the random generator for loss and jitter.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.001,
+        jitter: float = 0.0,
+        loss: float = 0.0,
+        bandwidth: Optional[float] = None,
+        seed: Optional[int] = None,
+    ):
+        self.defaults = {"latency": latency, "jitter": jitter, "loss": loss, "bandwidth": bandwidth}
+        self.links: Dict[Tuple[str, str], Link] = {}
+        self.hosts: Dict[str, "EasyHTTPAsync"] = {}
+        self.sockets: Dict[Tuple[str, int], Handler] = {}
+        self.groups: Dict[Tuple[str, int], Set[str]] = {}
+        self.random = random.Random(seed)
+        self.counters = {
+            "requests": 0,
+            "request_bytes": 0,
+            "response_bytes": 0,
+            "datagrams": 0,
+            "datagram_bytes": 0,
+            "lost": 0,
+            "refused": 0,
+        }
+        self._next_host = 1
+
+    def attach(self, instance: "EasyHTTPAsync") -> str:
+        """Give an instance a virtual IP address and make it reachable."""
+        index = self._next_host
+        self._next_host += 1
+        ip = f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}"
+        self.hosts[ip] = instance
+        return ip
+
+    def detach(self, ip: str) -> None:
+        """Take a host off the network."""
+        self.hosts.pop(ip, None)
+        for key in [k for k in self.sockets if k[0] == ip]:
+            del self.sockets[key]
+        for members in self.groups.values():
+            members.discard(ip)
+
+    def set_link(
+        self,
+        a: str,
+        b: str,
+        latency: Optional[float] = None,
+        jitter: Optional[float] = None,
+        loss: Optional[float] = None,
+        bandwidth: Optional[float] = None,
+        symmetric: bool = True,
+    ) -> None:
+        """Override the properties of the link from host a to host b."""
+        settings = {
+            "latency": latency,
+            "jitter": jitter,
+            "loss": loss,
+            "bandwidth": bandwidth,
+        }
+        for key in [(a, b), (b, a)] if symmetric else [(a, b)]:
+            link = self._link(*key)
+            for name, value in settings.items():
+                if value is not None:
+                    setattr(link, name, value)
+
+    def _link(self, src: str, dst: str) -> Link:
+        link = self.links.get((src, dst))
+        if link is None:
+            link = self.links[(src, dst)] = Link(**self.defaults)
+        return link
+
+    def _lost(self, link: Link) -> bool:
+        if link.loss and self.random.random() < link.loss:
+            self.counters["lost"] += 1
+            return True
+        return False
+
+    async def request(self, src: str, dst: str, port: int, packet: dict) -> Tuple[int, Any]:
+        """Deliver an API request and wait for the response.
+
+        A lost request or response never completes; callers bound the
+        wait with their timeout, like a real client would.
+
+        Returns:
+            Tuple of (status code, decoded response body).
+
+        Raises:
+            ConnectionRefusedError: If nothing listens at dst:port.
+        """
+        raw = json.dumps(packet).encode()
+        self.counters["requests"] += 1
+        self.counters["request_bytes"] += len(raw)
+
+        link = self._link(src, dst)
+        lost = self._lost(link)
+        await asyncio.sleep(link.delay(len(raw), self.random))
+        if lost:
+            await asyncio.Event().wait()
+
+        host = self.hosts.get(dst)
+        if host is None or host.port != port:
+            self.counters["refused"] += 1
+            raise ConnectionRefusedError(f"Connection refused by {dst}:{port}")
+
+        response = await host._serve(json.loads(raw), src)
+        body = bytes(response.body)
+        self.counters["response_bytes"] += len(body)
+
+        link = self._link(dst, src)
+        lost = self._lost(link)
+        await asyncio.sleep(link.delay(len(body), self.random))
+        if lost:
+            await asyncio.Event().wait()
+        return response.status_code, json.loads(body)
+
+    def bind(self, ip: str, port: int, handler: Handler) -> None:
+        """Receive datagrams sent to ip:port."""
+        self.sockets[(ip, port)] = handler
+
+    def unbind(self, ip: str, port: int) -> None:
+        self.sockets.pop((ip, port), None)
+
+    def join(self, group: str, port: int, ip: str) -> None:
+        """Add a host to a multicast group."""
+        self.groups.setdefault((group, port), set()).add(ip)
+
+    def leave(self, group: str, port: int, ip: str) -> None:
+        self.groups.get((group, port), set()).discard(ip)
+
+    def sendto(self, src: Tuple[str, int], payload: bytes, addr: Tuple[str, int]) -> None:
+        """Send a datagram to a host or multicast group without waiting."""
+        members = self.groups.get(addr)
+        targets = list(members) if members is not None else [addr[0]]
+        loop = asyncio.get_running_loop()
+        for ip in targets:
+            handler = self.sockets.get((ip, addr[1]))
+            if handler is None:
+                continue
+            self.counters["datagrams"] += 1
+            self.counters["datagram_bytes"] += len(payload)
+            link = self._link(src[0], ip)
+            if self._lost(link):
+                continue
+            loop.call_later(
+                link.delay(len(payload), self.random),
+                lambda h=handler: asyncio.ensure_future(h(payload, src)),
+            )
+
+    def stats(self) -> dict:
+        """Return traffic counters and the number of attached hosts."""
+        return {**self.counters, "hosts": len(self.hosts)}
@@ -1,6 +1,7 @@
 """EasyHTTP - Simple HTTP-based P2P framework for IoT."""
 
 import os
+import random
 import secrets
 import time
 import logging
@@ -8,7 +9,7 @@ import json
 import struct
 from pathlib import Path
 from enum import Enum, auto
-from typing import Optional, Union, Dict, Any, Callable
+from typing import Optional, Union, Dict, Any, Callable, List
 
 # API libraries
 import aiohttp
@@ -16,10 +17,34 @@ import asyncio
 import socket
 import uvicorn
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response
 
 # EasyHTTP modules
 from ._discovery import Discovery
+from ._profiling import Profiler
+from ._peers import PeerHealth
+from ._admission import AdmissionControl
+from ._outbox import Outbox
+from ._registry import Registry
+from ._timeseries import TimeSeriesStore
+from ._query import has_spec, apply_spec, build_query
+from ._delta import DeltaEncoder, DeltaDecoder
+from ._relay import Relay, decode_batch
+from ._events import EventHub, Subscription
+from ._transfer import FileTransfer
+from ._swarm import Swarm
+from ._dedupe import DedupeCache, IN_PROGRESS
+from ._datagram import DatagramChannel
+from ._tls import TLS
+from ._virtual import VirtualNetwork
+from ._unix import UnixTransport
+from ._serializer import get_serializer
+from ._replicas import Replicas
+from ._groups import Groups
+from ._poller import Poller
+from ._lanes import Lanes, CONTROL, BULK, TRAFFIC_CLASSES
+from ._faults import FaultInjector
+from ._ordering import SenderOrdering
 
 # Initializing logger
 from loggity import Logger, Colors, LoggerConfig
@@ -31,10 +56,16 @@ log_config = LoggerConfig(
 )
 log = Logger(config = log_config)
 
+JSON_HEADERS = {"Content-Type": "application/json"}
+
 class EasyHTTPAsync:
     """Simple asynchronous HTTP-based core of P2P framework for IoT."""
     __version__ = "0.4.0-alpha.6"
 
+    # send() errors after which push() keeps the payload in the outbox. An
+    # unknown device is not among them: it may be a typo and never show up.
+    QUEUEABLE_ERRORS = ("circuit_open", "timeout", "connection", "overloaded")
+
     class commands(Enum):
         """Enumeration of available command types."""
 
@@ -55,17 +86,249 @@ class EasyHTTPAsync:
         port: int = 5000,
         config_file=None,
         enable_discovery: bool = True,
+        profiling: bool = False,
+        slow_callback_threshold: float = 0.1,
+        retries: int = 0,
+        retry_backoff: float = 0.2,
+        min_timeout: float = 1.0,
+        max_timeout: float = 3.0,
+        breaker_threshold: int = 3,
+        breaker_reset: float = 10.0,
+        hedge_fetch: bool = False,
+        max_inflight: Optional[int] = None,
+        max_queue: int = 64,
+        queue_timeout: float = 1.0,
+        rate_limit: Optional[float] = None,
+        rate_burst: int = 10,
+        outbox_dir: Optional[str] = None,
+        outbox_fsync: str = "interval",
+        outbox_max_bytes: int = 64 * 1024 * 1024,
+        persist_devices: bool = True,
+        timeseries: bool = False,
+        timeseries_capacity: int = 3600,
+        delta: bool = False,
+        relay_upstream: Optional[str] = None,
+        relay_batch_interval: float = 1.0,
+        relay_compress: bool = True,
+        files_dir: Optional[str] = None,
+        max_file_size: Optional[int] = None,
+        swarm_dir: Optional[str] = None,
+        swarm_chunk_size: int = 1024 * 1024,
+        dedupe_window: float = 60.0,
+        dedupe_max_bytes: int = 4 * 1024 * 1024,
+        datagram: bool = False,
+        datagram_max_size: int = 1200,
+        datagram_sequence: bool = True,
+        tls_certfile: Optional[str] = None,
+        tls_keyfile: Optional[str] = None,
+        tls_cafile: Optional[str] = None,
+        network: Optional[VirtualNetwork] = None,
+        unix_socket: Optional[str] = None,
+        serializer: str = "auto",
+        tags: Optional[List[str]] = None,
+        hedge_percentile: float = 0.95,
+        groups: Optional[List[str]] = None,
+        group_port: int = 37021,
+        poll_concurrency: int = 16,
+        poll_per_device: int = 1,
+        control_limit: Optional[int] = 16,
+        bulk_limit: Optional[int] = 2,
+        bulk_threshold: int = 64 * 1024,
+        bulk_timeout: float = 30.0,
+        faults: Optional[FaultInjector] = None,
+        ordered: bool = False,
+        order_queue: int = 64,
+        order_gap_timeout: float = 0.5,
     ):
         """Initialize the EasyHTTPAsync instance.
 
         Args:
             debug: Enable debug output. Defaults to False.
             port: Port to run the HTTP server on. Defaults to 5000.
+            profiling: Time callbacks, sends and discovery handling and
+                monitor event-loop lag. Defaults to False.
+            slow_callback_threshold: Seconds after which a step is
+                reported as slow. Defaults to 0.1.
+            retries: Extra attempts after a timeout or connection error.
+                Defaults to 0.
+            retry_backoff: Base delay before the first retry, doubled for
+                every further retry. Defaults to 0.2.
+            min_timeout: Lower bound of the adaptive per-device timeout,
+                leaving the device time to run its callbacks. Defaults to 1.0.
+            max_timeout: Upper bound of the adaptive per-device timeout,
+                also used for devices without RTT samples. Defaults to 3.0.
+            breaker_threshold: Consecutive failures after which sends to
+                a device fail fast. Defaults to 3.
+            breaker_reset: Seconds between background probes of a device
+                with an open circuit. Defaults to 10.0.
+            hedge_fetch: Send a duplicate FETCH when the first one is
+                slower than usual. Defaults to False.
+            max_inflight: Maximum number of bulk requests (FETCH, PUSH,
+                DATA) handled at once, None for no limit. Defaults to None.
+            max_queue: Maximum number of bulk requests waiting for a slot.
+                Defaults to 64.
+            queue_timeout: Seconds a bulk request may wait for a slot
+                before it is shed. Defaults to 1.0.
+            rate_limit: Bulk requests per second allowed per sender, None
+                for no limit. Defaults to None.
+            rate_burst: Burst size of the per-sender rate limit.
+                Defaults to 10.
+            outbox_dir: Directory of the durable outbound queue that keeps
+                PUSHes for offline devices, None to disable it.
+                Defaults to None.
+            outbox_fsync: When queued payloads are fsynced: 'always',
+                'interval' (at most once a second) or 'never'.
+                Defaults to 'interval'.
+            outbox_max_bytes: Disk budget of the outbound queue.
+                Defaults to 64 MiB.
+            persist_devices: Keep the devices cache in a journal next to
+                the config file and restore it on startup. Defaults to True.
+            timeseries: Keep numeric fields of received PUSH/DATA payloads
+                in ring buffers that can be queried with FETCH.
+                Defaults to False.
+            timeseries_capacity: Samples kept per metric. Defaults to 3600.
+            delta: Send PUSH/DATA dicts as deltas against the last state
+                each device acknowledged; see enable_delta() to choose per
+                device. Defaults to False.
+            relay_upstream: ID of an upstream collector. When set, this
+                instance acts as a relay: PUSH/DATA from local devices are
+                forwarded upstream in batches and commands from upstream
+                are routed to local devices. Defaults to None.
+            relay_batch_interval: Seconds between upstream batches.
+                Defaults to 1.0.
+            relay_compress: Compress upstream batches. Defaults to True.
+            files_dir: Directory that files sent with send_file() are
+                received into. None refuses incoming files. Defaults to None.
+            max_file_size: Largest incoming file in bytes, None for no
+                limit. Defaults to None.
+            swarm_dir: Directory of content chunks shared with peers
+                (share_content/fetch_content). None disables content
+                distribution. Defaults to None.
+            swarm_chunk_size: Chunk size of shared content in bytes.
+                Defaults to 1 MiB.
+            dedupe_window: Seconds the response to a message is kept to
+                be replayed for retried duplicates, 0 to disable.
+                Defaults to 60.0.
+            dedupe_max_bytes: Memory budget of kept responses. Defaults
+                to 4 MiB.
+            datagram: Accept and allow fire-and-forget PUSH/DATA over UDP
+                on the same port number (send_datagram). Defaults to False.
+            datagram_max_size: Largest datagram in bytes; bigger payloads
+                are sent over HTTP. Defaults to 1200.
+            datagram_sequence: Number datagrams per recipient so receivers
+                can count lost and reordered ones. Defaults to True.
+            tls_certfile: PEM certificate to serve HTTPS with. Its
+                fingerprint is announced so peers know to use HTTPS. Defaults to
+                None (plain HTTP).
+            tls_keyfile: PEM private key of the certificate. Defaults to None.
+            tls_cafile: CA bundle to verify TLS peers without a pinned
+                fingerprint. Defaults to None (pin the certificate seen on
+                the first handshake with each peer).
+            network: Virtual network to run on instead of real sockets,
+                for simulations. Defaults to None.
+            unix_socket: Path of a Unix domain socket to serve the API on
+                as well. Devices on the same host send to it instead of
+                the TCP port. Defaults to None.
+            serializer: Message encoder, 'json' (standard library),
+                'orjson', or 'auto' for the fastest one installed.
+                Defaults to 'auto'.
+            tags: Capabilities of this device, announced via discovery so
+                others can address it with send_any()/fetch_any().
+                Defaults to None.
+            hedge_percentile: Percentile of a replica's recent RTTs after
+                which fetch_any() hedges to the next replica. Defaults
+                to 0.95.
+            groups: Multicast groups to join, announced via discovery so
+                others can address them with push_group(). Defaults to None.
+            group_port: UDP port of the multicast groups. Defaults to 37021.
+            poll_concurrency: Most poll() FETCHes running at once.
+                Defaults to 16.
+            poll_per_device: Most poll() FETCHes running at once against
+                one device. Defaults to 1.
+            control_limit: Most control requests (PING and small
+                commands) in flight to one device; None for no limit.
+                Defaults to 16.
+            bulk_limit: Most bulk requests in flight to one device; None
+                for no limit. Defaults to 2.
+            bulk_threshold: Size in bytes from which a payload is sent as
+                bulk traffic. Defaults to 64 KiB.
+            bulk_timeout: Lower bound of the timeout of bulk requests, in
+                seconds. Defaults to 30.0.
+            faults: Fault injector to pass outgoing requests, served
+                requests and received discovery datagrams through, for
+                testing under loss. Defaults to None.
+            ordered: Handle the commands of each sender one at a time, in
+                the order they were sent. Defaults to False.
+            order_queue: Commands of one sender that can wait for their
+                turn before further ones are rejected. Defaults to 64.
+            order_gap_timeout: Seconds to wait for a missing command
+                before moving on without it. Defaults to 0.5.
         """
 
         self.debug = debug
         self.port = port
         self.enable_discovery = enable_discovery
+        self.profiler = Profiler(self, enabled=profiling, slow_threshold=slow_callback_threshold)
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.hedge_fetch = hedge_fetch
+        self.peers: Dict[str, PeerHealth] = {}
+        self.admission = AdmissionControl(
+            self,
+            max_inflight=max_inflight,
+            max_queue=max_queue,
+            queue_timeout=queue_timeout,
+            rate_limit=rate_limit,
+            rate_burst=rate_burst,
+        )
+        self.outbox = (
+            Outbox(self, outbox_dir, fsync=outbox_fsync, max_bytes=outbox_max_bytes)
+            if outbox_dir
+            else None
+        )
+        self.timeseries = TimeSeriesStore(capacity=timeseries_capacity) if timeseries else None
+        self.delta = delta
+        self.delta_peers: Dict[str, bool] = {}
+        self.delta_encoder = DeltaEncoder()
+        self.delta_decoder = DeltaDecoder()
+        self.relay = (
+            Relay(self, relay_upstream, batch_interval=relay_batch_interval, compress=relay_compress)
+            if relay_upstream
+            else None
+        )
+        self.routes: Dict[str, str] = {}
+        self.event_hub = EventHub()
+        self.tls = TLS(tls_certfile, tls_keyfile, tls_cafile)
+        self.faults = faults
+        self.ordering = SenderOrdering(self, max_queue=order_queue, gap_timeout=order_gap_timeout) if ordered else None
+        self._sequences: Dict[str, int] = {}
+        self._sequence_epoch = secrets.token_hex(4)
+        self.lanes = Lanes(
+            self,
+            control_limit=control_limit,
+            bulk_limit=bulk_limit,
+            bulk_threshold=bulk_threshold,
+            bulk_timeout=bulk_timeout,
+        )
+        self.network = network
+        self.network_ip: Optional[str] = None
+        self.unix = UnixTransport(unix_socket)
+        self.serializer = get_serializer(serializer)
+        self.tags = sorted(set(tags or []))
+        self.replicas = Replicas(self, hedge_percentile=hedge_percentile)
+        self.datagram = (
+            DatagramChannel(self, max_size=datagram_max_size, sequence=datagram_sequence)
+            if datagram
+            else None
+        )
+        self.groups = Groups(self, groups or [], port=group_port, max_size=datagram_max_size)
+        self.poller = Poller(self, max_concurrency=poll_concurrency, per_device=poll_per_device)
+        self.dedupe = DedupeCache(dedupe_window, max_bytes=dedupe_max_bytes) if dedupe_window > 0 else None
+        self._probe_tasks: Dict[str, asyncio.Task] = {}
 
         if self.enable_discovery:
             self.discovery = Discovery(self)
@@ -88,14 +351,29 @@ class EasyHTTPAsync:
             "on_fetch": None,
             "on_data": None,
             "on_push": None,
+            "on_slow": None,
+            "on_file": None,
         }
         self.devices = {}
         self.app = FastAPI(title="EasyHTTP API", docs_url=None, redoc_url=None)
         self.app.post("/easyhttp/api")(self.api_handler)
+        self.files = FileTransfer(self, files_dir, max_size=max_file_size)
+        self.files.register(self.app)
+        self.swarm = Swarm(self, swarm_dir, chunk_size=swarm_chunk_size) if swarm_dir else None
+        if self.swarm:
+            self.swarm.register(self.app)
         self.server_task = None
+        self.unix_server = None
+        self.unix_server_task = None
+        self._verify_task = None
 
         self._load_config()
 
+        self.registry = None
+        if persist_devices:
+            self.registry = Registry(self, os.path.splitext(self.config_file)[0] + ".devices.jsonl")
+            self._load_devices()
+
     async def __aenter__(self):
         """Enter the async context manager."""
         await self.start()
@@ -131,7 +409,51 @@ class EasyHTTPAsync:
             if self.debug:
                 log.error(f"Error saving config: {e}")
 
+    def _load_devices(self):
+        """Restore the devices cache and learned RTTs from the registry."""
+        for device_id, entry in self.registry.load().items():
+            if device_id == self.id or not entry.get("ip"):
+                continue
+            # The journal holds what peers told us; skip entries that
+            # could not have been written by a sane peer
+            if not isinstance(entry["ip"], str) or not self._valid_port(entry.get("port")):
+                if self.debug:
+                    log.error(f"Skipping invalid devices cache entry for {device_id}")
+                continue
+            self.devices[device_id] = {
+                "ip": entry["ip"],
+                "port": entry["port"],
+                "last_seen": entry.get("last_seen") or 0,
+                "added_manually": entry.get("added_manually", False),
+            }
+            if entry.get("tls"):
+                self.devices[device_id]["tls"] = True
+                if entry.get("fingerprint"):
+                    self.devices[device_id]["fingerprint"] = entry["fingerprint"]
+            if self.unix.allowed(entry.get("uds")):
+                self.devices[device_id]["uds"] = entry["uds"]
+            if entry.get("tags"):
+                self.devices[device_id]["tags"] = entry["tags"]
+            if entry.get("groups"):
+                self.devices[device_id]["groups"] = entry["groups"]
+            if isinstance(entry.get("rtt"), (int, float)) and entry["rtt"] > 0:
+                self._peer(device_id).observe(entry["rtt"])
+            if isinstance(entry.get("clock_offset"), (int, float)):
+                self._peer(device_id).offset = entry["clock_offset"]
+
+        if self.debug and self.devices:
+            log.info(f"Restored {len(self.devices)} devices from {self.registry.path}")
+
+    async def _verify_devices(self):
+        """Ping all restored devices at once to see which are still there."""
+        device_ids = list(self.devices)
+        results = await asyncio.gather(*(self.ping(device_id) for device_id in device_ids))
+        if self.debug:
+            log.info(f"Verified restored devices: {sum(results)}/{len(device_ids)} online")
+
     def _get_local_ip(self):
+        if self.network_ip:
+            return self.network_ip
         try:
             s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             s.connect(("8.8.8.8", 80))
@@ -174,33 +496,196 @@ class EasyHTTPAsync:
         else:
             raise ValueError(f"Unknown event: {event}")
 
-    def add(self, device_id: str, device_ip: str, device_port: int) -> None:
+    def events(
+        self,
+        kinds: Optional[list] = None,
+        maxsize: int = 1000,
+        overflow: str = "block",
+        block_timeout: float = 1.0,
+    ) -> Subscription:
+        """Subscribe to received events as an async iterator.
+
+        Events are dicts with 'kind', 'sender_id', 'data', 'timestamp'
+        and 'received_at'. A PUSH with no on_push callback is acknowledged
+        when at least one subscription admits it.
+
+        Args:
+            kinds: Event kinds to receive ('ping', 'pong', 'push', 'data',
+                'poll'). Defaults to all.
+            maxsize: Capacity of the subscription's queue. Defaults to 1000.
+            overflow: What to do when the queue is full: 'block' (wait up
+                to block_timeout, then reject), 'drop_oldest' or
+                'drop_newest'. Defaults to 'block'.
+            block_timeout: Seconds a 'block' subscription may hold up the
+                request. Defaults to 1.0.
+
+        Returns:
+            Subscription to iterate with `async for`; close() it when done.
+
+        Raises:
+            ValueError: If a kind or the overflow policy is unknown.
+        """
+        return self.event_hub.subscribe(kinds, maxsize, overflow, block_timeout)
+
+    def add(
+        self,
+        device_id: str,
+        device_ip: str,
+        device_port: int,
+        tls: bool = False,
+        fingerprint: Optional[str] = None,
+        unix_socket: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        groups: Optional[List[str]] = None,
+    ) -> None:
         """Manually add a device to the local devices cache.
 
         Args:
             device_id: 6-character device identifier.
             device_ip: IP address of the device.
             device_port: Port number of the device.
+            tls: The device serves HTTPS. Defaults to False.
+            fingerprint: SHA-256 hex fingerprint of the device's
+                certificate to pin (implies tls). Defaults to None.
+            unix_socket: Path of the device's Unix domain socket, if it
+                runs on this host. Defaults to None.
+            tags: Capabilities of the device, for send_any()/fetch_any().
+                Defaults to None (learned when the device answers a PING).
+            groups: Multicast groups the device is a member of, for
+                push_group(). Defaults to None (learned via discovery).
 
         Raises:
-            ValueError: If device_id is not 6 characters.
+            ValueError: If device_id is not 6 characters or device_port
+                is not a port number.
         """
 
         if len(device_id) != 6:
             raise ValueError("Device ID must be 6 characters")
+        device_port = int(device_port)
+        if not self._valid_port(device_port):
+            raise ValueError(f"Invalid port: {device_port}")
 
-        if device_id not in self.devices:
+        known = self.devices.get(device_id)
+        if known is None or (known["ip"], known["port"]) != (device_ip, device_port):
+            # A restored or discovered entry may carry a stale address
             self.devices[device_id] = {
                 "ip": device_ip,
-                "port": int(device_port),
+                "port": device_port,
                 "last_seen": time.time(),
                 "added_manually": True,
             }
+            if self.registry:
+                self.registry.record(device_id)
             if self.debug:
                 log.debug(f"Added device {device_id}: {device_ip}:{device_port}")
-        else:
+        elif self.debug:
             log.debug("Device already exists")
 
+        if tls or fingerprint:
+            device = self.devices[device_id]
+            device["tls"] = True
+            if fingerprint:
+                device["fingerprint"] = fingerprint.replace(":", "").lower()
+            if self.registry:
+                self.registry.record(device_id)
+
+        if unix_socket:
+            self.devices[device_id]["uds"] = os.path.abspath(unix_socket)
+            if self.registry:
+                self.registry.record(device_id)
+
+        if tags is not None:
+            self._learn_tags(device_id, sorted(set(tags)))
+
+        if groups is not None:
+            self._learn_groups(device_id, sorted(set(groups)))
+
+    def _learn_tls(self, device_id: str, fingerprint) -> None:
+        """Note that a device announced a certificate, so it is reached over HTTPS.
+
+        The announced fingerprint is not pinned: anyone can send it. The
+        pin comes from the first handshake (see _first_use()).
+        """
+        device = self.devices.get(device_id)
+        if device is None or device.get("tls") or not isinstance(fingerprint, str):
+            return
+        device["tls"] = True
+        if self.registry:
+            self.registry.record(device_id)
+
+    async def _first_use(self, device_id: str, timeout: float) -> None:
+        """Pin the certificate of a TLS device that has none pinned yet."""
+        if await self.tls.first_use(self.devices[device_id], timeout):
+            self._pinned(device_id)
+
+    def _pinned(self, device_id: str) -> None:
+        """Persist the certificate pinned on the first handshake with a device."""
+        if self.registry:
+            self.registry.record(device_id)
+        if self.debug:
+            log.debug(f"Pinned certificate of {device_id}: {self.devices[device_id]['fingerprint'][:16]}...")
+
+    @staticmethod
+    def _valid_port(port) -> bool:
+        """Tell whether a port number from a peer or from disk is usable."""
+        return isinstance(port, int) and not isinstance(port, bool) and 0 < port < 65536
+
+    def _learn_sender(self, sender_id, ip: str, port) -> None:
+        """Add a device that contacted us and is not known yet.
+
+        The port comes from the sender's header; a device without a
+        usable one is not added, since it could not be reached.
+        """
+        if not isinstance(sender_id, str) or not sender_id or sender_id == self.id:
+            return
+        if sender_id in self.devices or not self._valid_port(port):
+            return
+        self.devices[sender_id] = {
+            "ip": ip,
+            "port": port,
+            "last_seen": int(time.time()),
+        }
+        if self.registry:
+            self.registry.record(sender_id)
+
+    def _learn_address(self, device_id: str, ip: str, port) -> None:
+        """Record the address a known device announced, e.g. after a DHCP change."""
+        device = self.devices.get(device_id)
+        if device is None or not self._valid_port(port):
+            return
+        if (device["ip"], device["port"]) != (ip, port):
+            if self.debug:
+                log.info(f"Device {device_id} moved from {device['ip']}:{device['port']} to {ip}:{port}")
+            device["ip"] = ip
+            device["port"] = port
+            if self.registry:
+                self.registry.record(device_id)
+
+    def _learn_socket(self, device_id: str, host, path, ip: str) -> None:
+        """Record the Unix domain socket a device on the same host announced from ip."""
+        if self.unix.learn(self.devices.get(device_id), host, path, ip):
+            if self.registry:
+                self.registry.record(device_id)
+            if self.debug:
+                log.debug(f"Device {device_id} is local, using {path}")
+
+    def _learn_tags(self, device_id: str, tags) -> None:
+        """Record the tags a device announced."""
+        self._learn_names(device_id, "tags", tags)
+
+    def _learn_groups(self, device_id: str, groups) -> None:
+        """Record the multicast groups a device announced."""
+        self._learn_names(device_id, "groups", groups)
+
+    def _learn_names(self, device_id: str, field: str, names) -> None:
+        device = self.devices.get(device_id)
+        if device is None or not isinstance(names, list) or not all(isinstance(n, str) for n in names):
+            return
+        if (device.get(field) or []) != names:
+            device[field] = names
+            if self.registry:
+                self.registry.record(device_id)
+
     async def start(self) -> None:
         """Start the HTTP server and generate a device ID if not set."""
 
@@ -208,32 +693,68 @@ class EasyHTTPAsync:
             self._generate_id()
 
         try:
-            config = uvicorn.Config(
-                self.app,
-                host="0.0.0.0",
-                port=self.port,
-                log_level="warning",
-                lifespan="off",
-            )
+            if self.network:
+                self.network_ip = self.network.attach(self)
+            else:
+                config = uvicorn.Config(
+                    self.app,
+                    host="0.0.0.0",
+                    port=self.port,
+                    log_level="warning",
+                    lifespan="off",
+                    **self.tls.server_config(),
+                )
 
-            server = uvicorn.Server(config)
-            self.server_task = asyncio.create_task(server.serve())
+                server = uvicorn.Server(config)
+                self.server_task = asyncio.create_task(server.serve())
 
-            logging.getLogger("werkzeug").disabled = True
-            logging.getLogger("uvicorn.error").propagate = False
-            logging.getLogger("uvicorn.access").propagate = False
+                if self.unix.enabled:
+                    unix_config = uvicorn.Config(
+                        self.app,
+                        log_level="warning",
+                        lifespan="off",
+                        **self.unix.server_config(),
+                    )
+                    self.unix_server = uvicorn.Server(unix_config)
+                    self.unix_server_task = asyncio.create_task(self.unix_server.serve())
+
+                logging.getLogger("werkzeug").disabled = True
+                logging.getLogger("uvicorn.error").propagate = False
+                logging.getLogger("uvicorn.access").propagate = False
 
             # Starting discovery
             if self.enable_discovery:
                 await self.discovery.start()
 
-            await asyncio.sleep(2)  # Give server time to start
+            await self.profiler.start()
+
+            if self.outbox:
+                self.outbox.kick_all()
+
+            if self.relay:
+                await self.relay.start()
+
+            if self.datagram:
+                await self.datagram.start()
+
+            await self.groups.start()
+
+            await self.poller.start()
+
+            if self.registry and self.devices:
+                self._verify_task = asyncio.create_task(self._verify_devices())
+
+            if not self.network:
+                await asyncio.sleep(2)  # Give server time to start
 
             if self.debug:
                 log.info(f"\033[1;32mEasyHTTP \033[37m{self.__version__}\033[0m has been started!")
                 log.info(f"Device's ID: {self.id}")
                 log.info(f"EasyHTTP starting on port {self.port}")
-                log.info(f"API running on \033[1mhttp://{self._get_local_ip()}:{self.port}/easyhttp/api\033[0m")
+                scheme = "https" if self.tls.enabled else "http"
+                log.info(f"API running on \033[1m{scheme}://{self._get_local_ip()}:{self.port}/easyhttp/api\033[0m")
+                if self.unix.enabled:
+                    log.info(f"API also listening on \033[1m{self.unix.path}\033[0m")
                 if self.enable_discovery:
                     log.info(f"Discovery enabled on {self.discovery.multicast_group}:{self.discovery.multicast_port}")
 
@@ -248,6 +769,45 @@ class EasyHTTPAsync:
         if hasattr(self, 'discovery') and self.discovery:
             await self.discovery.stop()
 
+        await self.profiler.stop()
+
+        if self._verify_task:
+            self._verify_task.cancel()
+            self._verify_task = None
+
+        if self.relay:
+            await self.relay.stop()
+
+        if self.datagram:
+            await self.datagram.stop()
+
+        await self.groups.stop()
+
+        await self.poller.stop()
+
+        for task in self._probe_tasks.values():
+            task.cancel()
+        self._probe_tasks.clear()
+
+        if self.outbox:
+            await self.outbox.stop()
+
+        await self.lanes.close()
+
+        if self.network and self.network_ip:
+            self.network.detach(self.network_ip)
+            self.network_ip = None
+
+        if self.unix_server_task:
+            # Shut down gracefully, so local peers' kept-alive connections are closed
+            self.unix_server.should_exit = True
+            try:
+                await asyncio.wait_for(self.unix_server_task, 5)
+            except (asyncio.CancelledError, asyncio.TimeoutError):
+                pass
+            self.unix_server = None
+            self.unix_server_task = None
+
         if self.server_task:
             self.server_task.cancel()
             try:
@@ -255,6 +815,8 @@ class EasyHTTPAsync:
             except asyncio.CancelledError:
                 pass
 
+        await self.unix.close()
+
     async def start_discovery(self):
         """Manually start discovery service."""
         if self.debug:
@@ -269,6 +831,17 @@ class EasyHTTPAsync:
         self.enable_discovery = False
         await self.discovery.stop()
 
+    async def profile_snapshot(self, duration: float = 1.0) -> dict:
+        """Take a sampling profile of the event loop.
+
+        Args:
+            duration: How long to sample, in seconds.
+
+        Returns:
+            Dict with sample count, hottest stacks and hottest functions.
+        """
+        return await self.profiler.snapshot(duration)
+
     def get_discovered(self) -> list:
         """Return list of auto-discovered device IDs."""
         return [
@@ -282,60 +855,473 @@ class EasyHTTPAsync:
         device_id: str,
         command_type: Union[int, "commands"],
         data: Optional[Any] = None,
+        header: Optional[dict] = None,
+        traffic_class: Optional[str] = None,
     ) -> Optional[dict]:
         """Send a JSON-formatted command to another device.
 
+        The request timeout adapts to the device's measured round-trip
+        time. Devices that keep failing are fast-failed by a circuit
+        breaker until a background probe finds them online again.
+
+        Bulk traffic (payloads of at least bulk_threshold bytes) uses
+        its own connections and per-device limit, so it never delays
+        PINGs and other control traffic.
+
         Args:
             device_id: ID of the target device (must be 6 characters).
             command_type: Command type (commands enum member) or its integer value.
             data: JSON-serializable data to send (dict, list, str, or None).
+            header: Extra header fields to send along. Defaults to None.
+            traffic_class: 'control' or 'bulk'. Defaults to None (by
+                command and payload size).
 
         Returns:
-            Response JSON dict if successful, None otherwise.
+            Response JSON dict if successful, or an error dict otherwise.
             Response typically contains 'type', 'header', and optionally 'data' fields.
+            Error dicts contain 'error' (one of 'unknown_device', 'circuit_open',
+            'timeout', 'connection', 'overloaded', 'http_status',
+            'invalid_response', 'certificate'), 'device_id' and 'attempts'.
+
+        Raises:
+            ValueError: If the traffic class is unknown.
 
         Note:
             The device must be added to the devices cache before sending.
         """
 
+        if isinstance(command_type, self.commands):
+            command_type = command_type.value
+        if traffic_class is not None and traffic_class not in TRAFFIC_CLASSES:
+            raise ValueError(f"Unknown traffic class '{traffic_class}', choose from {TRAFFIC_CLASSES}")
+
+        if (
+            header is None
+            and isinstance(data, dict)
+            and command_type in (self.commands.PUSH.value, self.commands.DATA.value)
+            and self.delta_peers.get(device_id, self.delta)
+        ):
+            return await self._send_delta(device_id, command_type, data, traffic_class)
+
+        # Devices behind a relay are reached through it
+        if device_id not in self.devices and device_id in self.routes:
+            return await self.send(
+                self.routes[device_id],
+                command_type,
+                data,
+                header={**(header or {}), "route": device_id},
+                traffic_class=traffic_class,
+            )
+
         if device_id not in self.devices:
             if self.debug:
                 log.error(f"Device {device_id} not found in devices cache")
-            return None
+            return self._send_error(device_id, "unknown_device", 0)
+
+        peer = self._peer(device_id)
+        if peer.is_open:
+            if self.debug:
+                log.error(f"Circuit open for {device_id}, skipping send")
+            return self._send_error(
+                device_id,
+                "circuit_open",
+                0,
+                retry_after=max(0.0, peer.opened_at + self.breaker_reset - time.time()),
+            )
 
         packet = {
             "version": self.__version__,
-            "type": (
-                command_type
-                if isinstance(command_type, self.commands)
-                else command_type
-            ),
+            "type": command_type,
             "header": {
                 "sender_id": self.id,
                 "sender_port": self.port,
                 "recipient_id": device_id,
                 "timestamp": int(time.time()),
+                # Same ID on every retry, so the device can drop duplicates
+                "message_id": secrets.token_hex(8),
             },
         }
-
+        if not self.admission.is_control(command_type):
+            # Numbered per recipient, so it can keep the order of commands
+            self._sequences[device_id] = self._sequences.get(device_id, 0) + 1
+            packet["header"]["seq"] = self._sequences[device_id]
+            packet["header"]["seq_epoch"] = self._sequence_epoch
+        if self.tls.enabled:
+            packet["header"]["sender_tls"] = self.tls.fingerprint
+        if self.unix.enabled:
+            packet["header"]["sender_host"] = self.unix.host
+            packet["header"]["sender_uds"] = self.unix.path
+
+        if header:
+            packet["header"].update(header)
+
+        # Encoded once: classified by its size and reused by every attempt
+        payload = None
         if data:
             packet["data"] = data
+            payload = self.serializer.dumps(data)
+        if traffic_class is None:
+            traffic_class = self.lanes.classify(command_type, len(payload) if payload else 0)
+
+        hedge = self.hedge_fetch and packet["type"] == self.commands.FETCH.value
+        error = None
+        attempts = 0
+        with self.profiler.track("send", str(packet["type"]), device_id):
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    delay = self.retry_backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+                    # An overloaded device tells us how long to back off
+                    await asyncio.sleep(max(delay, error.get("retry_after") or 0))
+
+                attempts += 1
+                if hedge:
+                    response, error = await self._hedged_post(device_id, packet, traffic_class, payload)
+                else:
+                    response, error = await self._post(device_id, packet, traffic_class, payload)
 
-        recipient_url = f"http://{self.devices[device_id]['ip']}:{self.devices[device_id]['port']}/easyhttp/api"
+                if error is None:
+                    return response
+                # Only transport failures and load shedding are worth retrying
+                if error["error"] not in ("timeout", "connection", "overloaded") or peer.is_open:
+                    break
 
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    recipient_url, json=packet, timeout=3
+        if self.debug:
+            log.error(f"Failed to send to {device_id}: {error['error']}")
+        return self._send_error(device_id, attempts=attempts, **error)
+
+    async def _send_delta(
+        self,
+        device_id: str,
+        command_type: int,
+        data: dict,
+        traffic_class: Optional[str] = None,
+    ) -> dict:
+        """Send only the keys that changed since the last acknowledged state.
+
+        Falls back to the full state once if the receiver asks to resync.
+        traffic_class is passed on to send(), which otherwise classifies
+        the delta by its encoded size.
+        """
+
+        key = (device_id, command_type)
+        for full in (False, True):
+            payload, spec = self.delta_encoder.encode(key, data, full=full)
+            response = await self.send(
+                device_id, command_type, payload, header={"delta": spec}, traffic_class=traffic_class
+            )
+
+            if response.get("type") == self.commands.NACK.value and response.get("header", {}).get("resync"):
+                if self.debug:
+                    log.custom("DELTA", Colors.YELLOW, f"{device_id} asked for a resync")
+                self.delta_encoder.resync(key)
+                continue
+
+            if response.get("type") == self.commands.ACK.value or response.get("status") == "data_received":
+                self.delta_encoder.acked(key, spec["seq"], data)
+            return response
+        return response
+
+    def enable_delta(self, device_id: str, enabled: bool = True) -> None:
+        """Turn delta encoding of PUSH/DATA dicts on or off for one device.
+
+        Args:
+            device_id: ID of the device.
+            enabled: Whether dict payloads to it are delta-encoded.
+        """
+        self.delta_peers[device_id] = enabled
+        if not enabled:
+            self.delta_encoder.resync((device_id, self.commands.PUSH.value))
+            self.delta_encoder.resync((device_id, self.commands.DATA.value))
+
+    def _peer(self, device_id: str) -> PeerHealth:
+        """Return the health tracker of a device, creating it if needed."""
+        peer = self.peers.get(device_id)
+        if peer is None:
+            peer = self.peers[device_id] = PeerHealth(
+                min_timeout=self.min_timeout,
+                max_timeout=self.max_timeout,
+                initial_timeout=self.max_timeout,
+                breaker_threshold=self.breaker_threshold,
+            )
+        return peer
+
+    def _http(self, traffic_class: str = CONTROL) -> aiohttp.ClientSession:
+        """Return the shared client session of a traffic class."""
+        return self.lanes.session(traffic_class)
+
+    async def _exchange(
+        self,
+        device_id: str,
+        packet: dict,
+        timeout: float,
+        traffic_class: str = CONTROL,
+        payload: Optional[bytes] = None,
+    ):
+        """POST a packet to a device's API over HTTP or the virtual network.
+
+        Devices on the same host are reached through their Unix domain
+        socket, falling back to TCP if it does not answer. payload is the
+        packet's 'data' already encoded, so only the header is encoded
+        again.
+
+        Returns:
+            Tuple of (status code, decoded response body).
+        """
+        device = self.devices[device_id]
+        if self.network:
+            return await asyncio.wait_for(
+                self.network.request(self.network_ip, device["ip"], device["port"], packet),
+                timeout,
+            )
+        if payload is None:
+            body = self.serializer.dumps(packet)
+        else:
+            body = self.serializer.dumps_packet({k: v for k, v in packet.items() if k != "data"}, payload)
+        path = self.unix.route(device)
+        if path:
+            try:
+                async with self.unix.session(path, traffic_class).post(
+                    "http://localhost/easyhttp/api",
+                    data=body,
+                    headers=JSON_HEADERS,
+                    timeout=aiohttp.ClientTimeout(total=timeout),
                 ) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    return None
+                    self.unix.counters["requests"] += 1
+                    return response.status, self.serializer.loads(await response.read())
+            except aiohttp.ClientConnectionError:
+                # The process behind the socket is gone or was replaced
+                self.unix.drop(device)
+        await self._first_use(device_id, timeout)
+        async with self._http(traffic_class).post(
+            self.tls.url(device, "/easyhttp/api"),
+            data=body,
+            headers=JSON_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+            ssl=self.tls.client_ssl(device),
+        ) as response:
+            return response.status, self.serializer.loads(await response.read())
+
+    def _send_error(self, device_id: str, error: str, attempts: int, **details) -> dict:
+        """Build a structured error result for send()."""
+        result = {"error": error, "device_id": device_id, "attempts": attempts}
+        result.update(details)
+        return result
+
+    async def _post(
+        self,
+        device_id: str,
+        packet: dict,
+        traffic_class: str = CONTROL,
+        payload: Optional[bytes] = None,
+    ):
+        """POST a packet to a device once, updating its health.
 
-        except Exception as e:
-            if self.debug:
-                log.error(f"Failed to send to {device_id}: {e}")
-            return None
+        Waits for a free slot of the traffic class first. Bulk requests
+        answer slower the larger they are, so their duration is not used
+        as an RTT sample and timing out does not count as a failure.
+
+        Returns:
+            Tuple of (response dict, None) on success or (None, error dict).
+        """
+
+        device = self.devices[device_id]
+        peer = self._peer(device_id)
+        async with self.lanes.slot(device_id, traffic_class):
+            timeout = self.lanes.timeout(traffic_class, peer.timeout())
+            started = time.perf_counter()
+
+            try:
+                packet["header"]["sent_at"] = time.time()
+                if self.faults:
+                    status, body = await self.faults.send(
+                        device_id,
+                        packet["type"],
+                        timeout,
+                        lambda: self._exchange(device_id, packet, timeout, traffic_class, payload),
+                    )
+                else:
+                    status, body = await self._exchange(device_id, packet, timeout, traffic_class, payload)
+                answered = time.time()
+                if traffic_class == BULK:
+                    peer.success()
+                else:
+                    peer.observe(time.perf_counter() - started)
+                if status == 200:
+                    reply_header = body.get("header") if isinstance(body, dict) else None
+                    if isinstance(reply_header, dict):
+                        if reply_header.get("sender_uds"):
+                            self._learn_socket(
+                                device_id, reply_header.get("sender_host"), reply_header["sender_uds"], device["ip"]
+                            )
+                        if reply_header.get("ping_sent_at") is not None:
+                            self._observe_clock(device_id, reply_header, answered)
+                        if "sender_tags" in reply_header:
+                            self._learn_tags(device_id, reply_header["sender_tags"])
+                        if isinstance(reply_header.get("load"), int):
+                            peer.load = reply_header["load"]
+                    return body, None
+                if status in (429, 503) and isinstance(body, dict):
+                    return None, {
+                        "error": "overloaded",
+                        "status": status,
+                        "retry_after": body.get("header", {}).get("retry_after"),
+                    }
+                return None, {"error": "http_status", "status": status, "response": body}
+
+            except asyncio.TimeoutError:
+                error = {"error": "timeout", "timeout": timeout}
+                if traffic_class == BULK:
+                    return None, error
+            except (aiohttp.ServerFingerprintMismatch, aiohttp.ClientConnectorCertificateError) as e:
+                # Retrying will not change the certificate the device presents
+                self.tls.counters["pin_failures"] += 1
+                return None, {"error": "certificate", "detail": str(e)}
+            except (aiohttp.ClientError, OSError) as e:
+                error = {"error": "connection", "detail": str(e)}
+            except ValueError as e:
+                return None, {"error": "invalid_response", "detail": str(e)}
+
+            if peer.failure():
+                if self.debug:
+                    log.error(f"Circuit opened for {device_id} after {peer.failures} failures")
+                self._schedule_probe(device_id)
+            return None, error
+
+    async def _hedged_post(
+        self,
+        device_id: str,
+        packet: dict,
+        traffic_class: str = CONTROL,
+        payload: Optional[bytes] = None,
+    ):
+        """POST a packet and send a duplicate if the first one is slow.
+
+        Returns:
+            The first successful result, or the last error.
+        """
+
+        first = asyncio.create_task(self._post(device_id, packet, traffic_class, payload))
+        done, _ = await asyncio.wait({first}, timeout=self._peer(device_id).hedge_delay())
+        if done:
+            return first.result()
+
+        # A fresh message ID, or dedupe on the device would park the copy
+        # until the slow original finishes; FETCH is safe to run twice
+        duplicate = {**packet, "header": {**packet["header"], "message_id": secrets.token_hex(8)}}
+        pending = {first, asyncio.create_task(self._post(device_id, duplicate, traffic_class, payload))}
+        result = (None, None)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if result[1] is None:
+                    for other in pending:
+                        other.cancel()
+                    return result
+        return result
+
+    def _schedule_probe(self, device_id: str) -> None:
+        """Start a background probe of a device with an open circuit."""
+        task = self._probe_tasks.get(device_id)
+        if task is None or task.done():
+            self._probe_tasks[device_id] = asyncio.create_task(self._probe(device_id))
+
+    async def _probe(self, device_id: str) -> None:
+        """Periodically PING a dead device until it answers again."""
+        peer = self._peer(device_id)
+        packet = {
+            "version": self.__version__,
+            "type": self.commands.PING.value,
+            "header": {
+                "sender_id": self.id,
+                "sender_port": self.port,
+                "recipient_id": device_id,
+            },
+        }
+        while peer.is_open and device_id in self.devices:
+            await asyncio.sleep(self.breaker_reset)
+            packet["header"]["timestamp"] = int(time.time())
+            response, error = await self._post(device_id, packet)
+            if error is None and response.get("type") == self.commands.PONG.value:
+                if self.debug:
+                    log.custom("PING", Colors.GREEN, f"{device_id} is back online")
+                self._peer_seen(device_id)
+        self._probe_tasks.pop(device_id, None)
+
+    def _sender_time(self, header: dict, received_at: float) -> Any:
+        """Return when a message was sent, on the local clock if possible.
+
+        Also feeds the one-way latency of the message to the sender's
+        health tracker once its clock offset is known.
+        """
+        sent_at = header.get("sent_at")
+        if not isinstance(sent_at, (int, float)):
+            return header.get("timestamp")
+        peer = self.peers.get(header.get("sender_id"))
+        if peer is None or peer.offset is None:
+            return sent_at
+        local = sent_at - peer.offset
+        peer.observe_latency(max(0.0, received_at - local))
+        return local
+
+    def _observe_clock(self, device_id: str, header: dict, answered: float) -> None:
+        """Feed the timestamps of a PONG to the device's clock estimate."""
+        try:
+            self._peer(device_id).observe_clock(
+                float(header["ping_sent_at"]),
+                float(header["received_at"]),
+                float(header["sent_at"]),
+                answered,
+            )
+        except (KeyError, TypeError, ValueError):
+            pass
+
+    def _peer_seen(self, device_id: str) -> None:
+        """Mark a device as alive and deliver anything queued for it."""
+        if device_id in self.devices:
+            self.devices[device_id]["last_seen"] = time.time()
+            if self.registry:
+                self.registry.record(device_id)
+            if self.outbox:
+                self.outbox.kick(device_id)
+
+    def get_peer_stats(self, device_id: str) -> Optional[dict]:
+        """Return RTT estimate, timeout and breaker state of a device.
+
+        Args:
+            device_id: ID of the device.
+
+        Returns:
+            Dict with 'srtt', 'rttvar', 'timeout', 'failures', 'circuit_open',
+            'samples', 'clock_offset' (device's clock minus ours),
+            'clock_delay', 'latency' (one-way, of messages from the
+            device) and 'load' (as last reported by the device), or None
+            if nothing was sent to the device yet.
+        """
+        peer = self.peers.get(device_id)
+        return peer.as_dict() if peer else None
+
+    def get_latency_stats(self) -> dict:
+        """Summarize clock offsets and delivery latency across devices.
+
+        Returns:
+            Dict with 'devices' (per device: 'clock_offset', 'clock_delay'
+            and 'latency', in seconds) and fleet-wide 'latency_avg',
+            'latency_max' and 'offset_max' (largest absolute clock
+            offset), which are None until something was measured.
+        """
+        devices = {
+            device_id: {"clock_offset": peer.offset, "clock_delay": peer.delay, "latency": peer.latency}
+            for device_id, peer in self.peers.items()
+            if peer.offset is not None
+        }
+        latencies = [d["latency"] for d in devices.values() if d["latency"] is not None]
+        return {
+            "devices": devices,
+            "latency_avg": sum(latencies) / len(latencies) if latencies else None,
+            "latency_max": max(latencies) if latencies else None,
+            "offset_max": max((abs(d["clock_offset"]) for d in devices.values()), default=None),
+        }
 
     async def ping(self, device_id: str) -> bool:
         """Send a PING request to a device and check if it's online.
@@ -347,13 +1333,17 @@ class EasyHTTPAsync:
             True if device responded with PONG, False otherwise.
         """
 
-        response = await self.send(device_id, self.commands.PING.value)
+        # Share our clock estimate, so the device can correct our timestamps too
+        peer = self.peers.get(device_id)
+        header = {"clock_offset": peer.offset} if peer and peer.offset is not None else {}
+        if self.tags:
+            header["sender_tags"] = self.tags
+        response = await self.send(device_id, self.commands.PING.value, header=header)
 
         if response and response.get("type") == self.commands.PONG.value:
             if self.debug:
                 log.custom("PING", Colors.GREEN, f"{device_id} is online")
-            if device_id in self.devices:
-                self.devices[device_id]["last_seen"] = time.time()
+            self._peer_seen(device_id)
             return True
         else:
             if self.debug:
@@ -361,22 +1351,199 @@ class EasyHTTPAsync:
             return False
 
     async def fetch(
-        self, device_id: str, query: Optional[Any] = None
+        self,
+        device_id: str,
+        query: Optional[Any] = None,
+        fields: Optional[list] = None,
+        where: Optional[dict] = None,
+        limit: Optional[int] = None,
+        traffic_class: Optional[str] = None,
     ) -> Optional[dict]:
         """Send a FETCH request to another device and return the response.
 
+        The responding device trims its on_fetch result to the requested
+        fields and rows before sending it, so only needed data travels.
+
         Args:
             device_id: ID of the target device.
             query: Query data to send with the FETCH request.
+            fields: Field names to keep in the result; dotted names reach
+                into nested dicts. Defaults to all fields.
+            where: Conditions rows of a list result must match, either a
+                value or a dict of operators ('eq', 'ne', 'gt', 'gte',
+                'lt', 'lte', 'in'). Defaults to None.
+            limit: Maximum number of rows of a list result. Defaults to None.
+            traffic_class: 'bulk' for FETCHes with large results, see
+                send(). Defaults to None.
 
         Returns:
-            Response data from the device, or None if failed.
-            The dict typically contains 'type', 'header', and 'data' fields.
+            Response data from the device, or an error dict if failed.
+            The dict typically contains 'type', 'header', and 'data' fields;
+            error dicts contain an 'error' field (see send()).
+
+        Raises:
+            TypeError: If fields, where or limit is given with a non-dict query.
         """
 
-        response = await self.send(device_id, self.commands.FETCH.value, query)
+        query = build_query(query, fields, where, limit)
+        response = await self.send(device_id, self.commands.FETCH.value, query, traffic_class=traffic_class)
         return response
 
+    async def send_any(
+        self,
+        tag: str,
+        command_type: Union[int, "commands"],
+        data: Optional[Any] = None,
+        header: Optional[dict] = None,
+        hedge: bool = False,
+    ) -> dict:
+        """Send a command to the fastest device with a tag.
+
+        Devices are ranked by RTT and load. If the chosen device fails,
+        the next one is tried.
+
+        Args:
+            tag: Tag the device must have announced.
+            command_type: Command type (commands enum member) or its integer value.
+            data: JSON-serializable data to send. Defaults to None.
+            header: Extra header fields to send along. Defaults to None.
+            hedge: Also send to the next device if the first one is slower
+                than usual; only safe for commands without side effects.
+                Defaults to False.
+
+        Returns:
+            Response dict from the device that answered first (its ID is
+            in the response header's 'sender_id'), or an error dict; the
+            error is 'no_replica' if no reachable device has the tag.
+        """
+        if isinstance(command_type, self.commands):
+            command_type = command_type.value
+        return await self.replicas.send(tag, command_type, data, header, hedge=hedge)
+
+    async def fetch_any(
+        self,
+        tag: str,
+        query: Optional[Any] = None,
+        fields: Optional[list] = None,
+        where: Optional[dict] = None,
+        limit: Optional[int] = None,
+        hedge: bool = True,
+    ) -> dict:
+        """Send a FETCH to the fastest device with a tag.
+
+        If the device has not answered after its usual latency (see
+        hedge_percentile), the FETCH is also sent to the next device and
+        the first answer is returned.
+
+        Args:
+            tag: Tag the device must have announced.
+            query: Query data to send with the FETCH request.
+            fields: Field names to keep in the result (see fetch()).
+            where: Conditions rows of a list result must match (see fetch()).
+            limit: Maximum number of rows of a list result. Defaults to None.
+            hedge: Hedge slow requests to a second device. Defaults to True.
+
+        Returns:
+            Response from the device that answered first, or an error dict
+            (see send_any()).
+        """
+        query = build_query(query, fields, where, limit)
+        return await self.replicas.send(tag, self.commands.FETCH.value, query, hedge=hedge)
+
+    def poll(
+        self,
+        query: Optional[Any] = None,
+        devices: Optional[List[str]] = None,
+        tag: Optional[str] = None,
+        interval: float = 10.0,
+        priority: int = 0,
+        jitter: float = 0.1,
+        callback: Optional[Callable] = None,
+        fields: Optional[list] = None,
+        where: Optional[dict] = None,
+        limit: Optional[int] = None,
+    ) -> str:
+        """FETCH from a set of devices periodically.
+
+        Every device gets a random phase within the interval, so the
+        polls are spread out. At most poll_concurrency polls run at
+        once (poll_per_device per device), higher priority first.
+        Devices with an open circuit are skipped until the next cycle.
+
+        Args:
+            query: Query data to send with every FETCH.
+            devices: IDs of the devices to poll. Defaults to None.
+            tag: Poll the devices with this tag instead, including ones
+                found later. Defaults to None (all devices if devices is
+                not given either).
+            interval: Seconds between two polls of a device. Defaults to 10.0.
+            priority: Polls of jobs with a higher priority get free slots
+                first. Defaults to 0.
+            jitter: Fraction of the interval each cycle is randomly
+                shifted by. Defaults to 0.1.
+            callback: Called as callback(device_id, response, job_id),
+                sync or async, with every response. Defaults to None
+                (responses are published to event streams as 'poll'
+                events).
+            fields: Field names to keep in the result (see fetch()).
+            where: Conditions rows of a list result must match (see fetch()).
+            limit: Maximum number of rows of a list result. Defaults to None.
+
+        Returns:
+            ID of the poll job, for cancel_poll().
+
+        Raises:
+            ValueError: If interval is not positive or jitter is outside [0, 1).
+        """
+        query = build_query(query, fields, where, limit)
+        return self.poller.add(query, devices, tag, interval, priority, jitter, callback)
+
+    def cancel_poll(self, job_id: str) -> bool:
+        """Stop a poll job.
+
+        Args:
+            job_id: ID returned by poll().
+
+        Returns:
+            True if the job existed.
+        """
+        return self.poller.cancel(job_id)
+
+    async def fetch_series(
+        self,
+        device_id: str,
+        metric: str,
+        source: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        buckets: int = 100,
+    ) -> Optional[dict]:
+        """Request a downsampled metric range from a device's time-series store.
+
+        Args:
+            device_id: ID of the device keeping the store.
+            metric: Metric name, e.g. 'temperature' or 'env.temp'.
+            source: ID of the device that reported the metric. Defaults to
+                the only device reporting it.
+            start: Range start (UNIX time). Defaults to the oldest sample.
+            end: Range end (UNIX time). Defaults to the newest sample.
+            buckets: Maximum number of points to return. Defaults to 100.
+
+        Returns:
+            Dict with 'metric', 'source', 'start', 'end' and 'points'
+            ([bucket_start, min, max, mean, count] each), or None if failed.
+        """
+
+        spec = {"metric": metric, "buckets": buckets}
+        for key, value in (("source", source), ("start", start), ("end", end)):
+            if value is not None:
+                spec[key] = value
+
+        response = await self.fetch(device_id, {"timeseries": spec}, traffic_class=BULK)
+        if response.get("type") == self.commands.DATA.value:
+            return response.get("data")
+        return None
+
     async def push(self, device_id: str, data: Optional[Any] = None) -> bool:
         """Send data to another device using PUSH command.
 
@@ -384,8 +1551,14 @@ class EasyHTTPAsync:
             device_id: ID of the target device.
             data: JSON-serializable data to send.
 
+        When the outbound queue is enabled, data for a known device that
+        is unreachable (or still has queued data) is stored on disk and
+        delivered in order once the device is seen again. Data for a
+        device that is not in the devices cache is not queued.
+
         Returns:
-            True if data was successfully sent and acknowledged, False otherwise.
+            True if data was successfully sent and acknowledged (or queued
+            for later delivery), False otherwise.
 
         Raises:
             TypeError: If data is not JSON-serializable.
@@ -394,8 +1567,19 @@ class EasyHTTPAsync:
         if data is not None and not isinstance(data, (dict, list, str)):
             raise TypeError("Data must be JSON-serializable (dict, list, str)")
 
+        # Keep order: nothing overtakes payloads already waiting in the queue
+        if self.outbox and self.outbox.pending(device_id):
+            queued = await self.outbox.put(device_id, data)
+            self.outbox.kick(device_id)
+            return queued
+
         response = await self.send(device_id, self.commands.PUSH, data)
 
+        if self.outbox and response.get("error") in self.QUEUEABLE_ERRORS:
+            if self.debug:
+                log.custom("PUSH", Colors.YELLOW, f"{device_id} unreachable, queued for later delivery")
+            return await self.outbox.put(device_id, data)
+
         if response and response.get("type") == self.commands.ACK.value:
             if self.debug:
                 log.custom("PUSH", Colors.GREEN, f"Successfully wrote to {device_id}")
@@ -405,185 +1589,615 @@ class EasyHTTPAsync:
                 log.custom("PUSH", Colors.RED, f"Error writing to {device_id}")
             return False
 
-    async def api_handler(self, request: Request) -> JSONResponse:
+    async def send_datagram(
+        self,
+        device_id: str,
+        command_type: Union[int, "commands"],
+        data: Optional[Any] = None,
+    ) -> bool:
+        """Send a PUSH or DATA as a single UDP datagram (QoS 0).
+
+        There is no ACK and no retry: the device runs its on_push/on_data
+        callback if the datagram arrives. Payloads that do not fit in
+        datagram_max_size are sent over HTTP instead.
+
+        Args:
+            device_id: ID of the target device (must have datagram enabled).
+            command_type: commands.PUSH or commands.DATA (or their values).
+            data: JSON-serializable data to send.
+
+        Returns:
+            True if the datagram was sent (or the HTTP fallback succeeded).
+
+        Raises:
+            RuntimeError: If datagram is not enabled.
+            ValueError: If the command is not PUSH or DATA.
+        """
+        if not self.datagram:
+            raise RuntimeError("Datagrams are disabled, set datagram=True")
+        if isinstance(command_type, self.commands):
+            command_type = command_type.value
+        if command_type not in (self.commands.PUSH.value, self.commands.DATA.value):
+            raise ValueError("Only PUSH and DATA can be sent as datagrams")
+        return await self.datagram.send(device_id, command_type, data)
+
+    def join_group(self, name: str) -> None:
+        """Join a multicast group, so push_group() to it reaches this device.
+
+        Args:
+            name: Group name, e.g. 'lights/floor-2'.
+        """
+        self.groups.join(name)
+
+    def leave_group(self, name: str) -> None:
+        """Leave a multicast group.
+
+        Args:
+            name: Group name.
+        """
+        self.groups.leave(name)
+
+    async def push_group(
+        self,
+        name: str,
+        data: Optional[Any] = None,
+        ack: bool = True,
+        deadline: float = 0.5,
+        retry: bool = True,
+        members: Optional[List[str]] = None,
+    ) -> dict:
+        """Send a PUSH to every member of a group in a single multicast datagram.
+
+        Members run their on_push callback as for push(). With ack, they
+        answer with an ACK datagram; members known to be in the group
+        (announced via discovery, or listed in members) that have not
+        answered within the deadline are retried over HTTP. Payloads
+        that do not fit in datagram_max_size go to every known member
+        over HTTP instead.
+
+        Args:
+            name: Group name.
+            data: JSON-serializable data to send.
+            ack: Collect ACKs from the members. Defaults to True.
+            deadline: Seconds to wait for ACKs. Defaults to 0.5.
+            retry: Retry members that did not answer over HTTP. Defaults
+                to True.
+            members: Device IDs expected in the group besides those that
+                announced it. Defaults to None.
+
+        Returns:
+            Dict with 'group', 'message_id', 'acked' and 'nacked' (members
+            that answered the datagram), 'retried' (reached over HTTP),
+            'failed' and 'transmissions'.
+
+        Raises:
+            TypeError: If data is not JSON-serializable.
+        """
+        if data is not None and not isinstance(data, (dict, list, str)):
+            raise TypeError("Data must be JSON-serializable (dict, list, str)")
+        return await self.groups.push(name, data, ack=ack, deadline=deadline, retry=retry, members=members)
+
+    async def send_file(self, device_id: str, path: str, name: Optional[str] = None) -> dict:
+        """Send a file to a device as raw bytes.
+
+        The file is streamed with sendfile() instead of being wrapped in a
+        JSON packet. An interrupted transfer resumes from the bytes the
+        device already has, and the device verifies the SHA-256 of the
+        whole file before running its on_file callback.
+
+        Args:
+            device_id: Target device ID (must have files_dir set).
+            path: Path of the file to send.
+            name: File name on the device. Defaults to the local name.
+
+        Returns:
+            Dict with 'status', 'size', 'sha256' and 'resumed_from' if the
+            device has the complete file, or an error dict otherwise.
+        """
+        return await self.files.send(device_id, path, name)
+
+    async def share_content(self, path: str, name: Optional[str] = None) -> str:
+        """Make a file available for peer-assisted distribution.
+
+        The file is split into chunks that this device serves to peers,
+        and its content ID is announced via discovery.
+
+        Args:
+            path: Path of the file to share.
+            name: File name given to fetching devices. Defaults to the
+                local name.
+
+        Returns:
+            The content ID (SHA-256 of the file).
+
+        Raises:
+            RuntimeError: If swarm_dir is not set.
+        """
+        if not self.swarm:
+            raise RuntimeError("Content distribution is disabled, set swarm_dir")
+        return await self.swarm.share(path, name)
+
+    async def fetch_content(
+        self,
+        content_id: str,
+        source_id: Optional[str] = None,
+        path: Optional[str] = None,
+        timeout: float = 300.0,
+    ) -> dict:
+        """Download shared content from all devices that hold it.
+
+        Chunks are fetched from several devices in parallel, preferring
+        peers over the source, and verified against the content's
+        manifest. Chunks received so far are served to other devices
+        right away.
+
+        Args:
+            content_id: Content ID returned by share_content().
+            source_id: Device known to hold the content, e.g. the origin.
+                Other holders are learned from it and from discovery.
+            path: Where to write the file. Defaults to the shared name
+                inside swarm_dir.
+            timeout: Seconds to keep trying. Defaults to 300.0.
+
+        Returns:
+            Dict with 'status', 'path', 'size' and 'sources' (chunks per
+            device), or an error dict with 'error' set to 'incomplete' or,
+            if the assembled file does not hash to content_id, 'corrupt'.
+
+        Raises:
+            RuntimeError: If swarm_dir is not set.
+        """
+        if not self.swarm:
+            raise RuntimeError("Content distribution is disabled, set swarm_dir")
+        return await self.swarm.fetch(content_id, source_id, path, timeout)
+
+    async def _run_callback(self, event: str, sender_id: Optional[str] = None, **kwargs) -> Any:
+        """Invoke a registered callback, sync or async, and time it.
+
+        Args:
+            event: Callback event name ('on_ping', 'on_fetch', etc.).
+            sender_id: ID of the device that triggered the event.
+            **kwargs: Extra keyword arguments passed to the callback.
+
+        Returns:
+            The callback's return value, or None if no callback is set.
+        """
+
+        callback = self.callbacks.get(event)
+        if not callback:
+            return None
+
+        with self.profiler.track("callback", event, sender_id):
+            if asyncio.iscoroutinefunction(callback):
+                return await callback(sender_id=sender_id, **kwargs)
+            return callback(sender_id=sender_id, **kwargs)
+
+    def _reply(
+        self,
+        command_type: "commands",
+        recipient_id: Optional[str],
+        data: Optional[Any] = None,
+        status_code: int = 200,
+        **header,
+    ) -> Response:
+        """Build a protocol response addressed to another device.
+
+        Args:
+            command_type: Command of the response (commands enum member).
+            recipient_id: ID of the device the response is for.
+            data: Optional payload of the response.
+            status_code: HTTP status code. Defaults to 200.
+            **header: Extra header fields.
+
+        Returns:
+            Response to the client.
+        """
+
+        packet = {
+            "version": self.__version__,
+            "type": command_type.value,
+            "header": {
+                "sender_id": self.id,
+                "sender_port": self.port,
+                "recipient_id": recipient_id,
+                "timestamp": int(time.time()),
+                "sent_at": time.time(),
+                # Bulk commands running or queued here, for replica selection
+                "load": self.admission.inflight + self.admission.waiting,
+                **header,
+            },
+        }
+        if command_type == self.commands.PONG and self.tags:
+            packet["header"]["sender_tags"] = self.tags
+        if self.unix.enabled:
+            packet["header"]["sender_host"] = self.unix.host
+            packet["header"]["sender_uds"] = self.unix.path
+        if data is not None:
+            packet["data"] = data
+        return self.serializer.response(packet, status_code=status_code)
+
+    async def _apply_push(self, sender_id: Optional[str], item: Any, timestamp: Any) -> bool:
+        """Store a pushed payload and hand it to the on_push callback.
+
+        Returns:
+            True if the payload was accepted.
+        """
+
+        if self.timeseries:
+            self.timeseries.record(sender_id, item)
+        if self.relay:
+            self.relay.collect(sender_id, self.commands.PUSH.value, item, timestamp)
+        # Without a callback, admission into an event stream decides the ACK
+        admitted = False
+        if self.event_hub.has("push"):
+            admitted = await self.event_hub.publish("push", sender_id, item, timestamp)
+        if not self.callbacks["on_push"]:
+            return admitted or self.timeseries is not None or self.relay is not None
+        return bool(await self._run_callback("on_push", sender_id, data=item, timestamp=timestamp))
+
+    async def _accept_relay_batch(self, relay_id: Optional[str], header: dict, payload: Any) -> Response:
+        """Unpack a batch forwarded by a relay and dispatch its records.
+
+        Devices listed in the batch are remembered as reachable through
+        the relay, so later sends to them are routed there.
+        """
+
+        try:
+            records = decode_batch(payload, header["relay"].get("encoding"))
+        except ValueError as e:
+            return self._reply(self.commands.NACK, relay_id, status_code=400, error=str(e))
+
+        routed = set(header.get("routes") or []) | {r.get("s") for r in records if isinstance(r, dict)}
+        for device_id in routed:
+            if device_id and device_id != self.id and device_id not in self.devices:
+                self.routes[device_id] = relay_id
+
+        accepted = 0
+        for record in records:
+            if not isinstance(record, dict):
+                continue
+            if record.get("c") == self.commands.PUSH.value:
+                accepted += await self._apply_push(record.get("s"), record.get("d"), record.get("t"))
+            elif record.get("c") == self.commands.DATA.value:
+                if self.timeseries:
+                    self.timeseries.record(record.get("s"), record.get("d"))
+                await self.event_hub.publish("data", record.get("s"), record.get("d"), record.get("t"))
+                await self._run_callback("on_data", record.get("s"), data=record.get("d"), timestamp=record.get("t"))
+                accepted += 1
+        return self._reply(self.commands.ACK, relay_id, accepted=accepted)
+
+    def _series_query(self, spec: Any) -> dict:
+        """Pick the supported time-series query arguments from a FETCH query.
+
+        Raises:
+            ValueError: If the query is malformed.
+        """
+        if isinstance(spec, str):
+            spec = {"metric": spec}
+        if not isinstance(spec, dict):
+            raise ValueError("'timeseries' must be a metric name or a dict")
+
+        def is_number(value: Any) -> bool:
+            return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+        if not isinstance(spec.get("metric"), str) or not spec["metric"]:
+            raise ValueError("'metric' must be a metric name")
+        if spec.get("source") is not None and not isinstance(spec["source"], str):
+            raise ValueError("'source' must be a device ID")
+        for key in ("start", "end"):
+            if spec.get(key) is not None and not is_number(spec[key]):
+                raise ValueError(f"'{key}' must be a UNIX time")
+        buckets = spec.get("buckets", 1)
+        if not (is_number(buckets) and isinstance(buckets, int) and buckets > 0):
+            raise ValueError("'buckets' must be a positive integer")
+        return {
+            key: spec[key]
+            for key in ("metric", "source", "start", "end", "buckets")
+            if key in spec
+        }
+
+    async def api_handler(self, request: Request) -> Response:
         """Handle incoming API requests and route commands to callbacks.
 
+        A retried message (same sender and 'message_id') gets the stored
+        response of the first attempt without running callbacks again. If
+        the first attempt is still running after max_timeout, the retry
+        gets a 503 NACK with error 'in_progress' and 'retry_after'.
+
+        Bulk commands pass admission control first; when the device is
+        overloaded or the sender exceeds its rate limit, a NACK with a
+        'retry_after' header field is returned right away.
+
+        With ordered=True, the commands of each sender are handled one at
+        a time in the order of their 'seq' header field; commands of
+        different senders run in parallel.
+
         Args:
             request: FastAPI request object.
 
         Returns:
-            JSONResponse: Response to the client.
+            Response to the client.
         """
 
         try:
-            data = await request.json()
+            data = self.serializer.loads(await request.body())
         except:
-            return JSONResponse({"error": "Invalid JSON data"}, status_code=400)
+            return self.serializer.response({"error": "Invalid JSON data"}, status_code=400)
+
+        if request.client:
+            client_ip = request.client.host
+        else:
+            # Clients of the Unix domain socket run on this host
+            client_ip = "127.0.0.1" if self.unix.enabled else "0.0.0.0"
+        return await self._serve(data, client_ip)
+
+    async def _serve(self, data: Any, client_ip: str) -> Response:
+        """Handle a decoded API request from HTTP, a Unix domain socket or
+        the virtual network, passing it through the 'receive' fault rules
+        first.
+
+        Args:
+            data: Decoded packet.
+            client_ip: Address the packet came from.
+
+        Returns:
+            Response to the client.
+        """
+        if self.faults and isinstance(data, dict):
+            header = data.get("header") if isinstance(data.get("header"), dict) else {}
+            return await self.faults.receive(
+                header.get("sender_id"),
+                data.get("type"),
+                lambda: self._dispatch(data, client_ip),
+            )
+        return await self._dispatch(data, client_ip)
+
+    async def _dispatch(self, data: Any, client_ip: str) -> Response:
+        """Handle a decoded API packet from any transport.
 
+        Args:
+            data: Decoded packet.
+            client_ip: Address the packet came from.
+
+        Returns:
+            Response to the client.
+        """
+        received_at = time.time()
         if not data:
-            return JSONResponse({"error": "No JSON data"}, status_code=400)
+            return self.serializer.response({"error": "No JSON data"}, status_code=400)
 
         command_type = data.get("type")
         header = data.get("header", {})
         sender_id = header.get("sender_id")
 
-        client_ip = request.client.host if request.client else "0.0.0.0"
+        if sender_id:
+            self._learn_sender(sender_id, client_ip, header.get("sender_port", self.port))
+        if sender_id and header.get("sender_tls"):
+            self._learn_tls(sender_id, header["sender_tls"])
+        if sender_id and header.get("sender_uds"):
+            self._learn_socket(sender_id, header.get("sender_host"), header["sender_uds"], client_ip)
+        if sender_id and "sender_tags" in header:
+            self._learn_tags(sender_id, header["sender_tags"])
+
+        dedupe_key = None
+        if (
+            self.dedupe
+            and header.get("message_id")
+            and command_type not in (self.commands.PING.value, self.commands.PONG.value)
+        ):
+            dedupe_key = (sender_id, str(header["message_id"]))
+            replay = await self.dedupe.lookup(dedupe_key, self.max_timeout)
+            if replay is IN_PROGRESS:
+                # Handling it again would apply it twice, let the sender retry later
+                if self.debug:
+                    log.custom("DEDUPE", Colors.YELLOW, f"Duplicate {dedupe_key[1]} from {sender_id} still in progress")
+                response = self._reply(
+                    self.commands.NACK,
+                    sender_id,
+                    status_code=503,
+                    error="in_progress",
+                    retry_after=self.dedupe.RETRY_AFTER,
+                )
+                response.headers["Retry-After"] = str(max(1, round(self.dedupe.RETRY_AFTER)))
+                return response
+            if replay:
+                if self.debug:
+                    log.custom("DEDUPE", Colors.YELLOW, f"Replayed response to duplicate {dedupe_key[1]} from {sender_id}")
+                status_code, body, media_type = replay
+                return Response(body, status_code=status_code, media_type=media_type)
+
+        ordered_sender = None
+        if self.ordering and sender_id and not self.admission.is_control(command_type):
+            rejection = await self.ordering.acquire(sender_id, header.get("seq"), header.get("seq_epoch"))
+            if rejection:
+                return self._reject(command_type, sender_id, rejection, dedupe_key)
+            ordered_sender = sender_id
 
-        if sender_id and sender_id != self.id and sender_id not in self.devices:
-            self.devices[sender_id] = {
-                "ip": client_ip,
-                "port": header.get("sender_port", self.port),
-                "last_seen": int(time.time()),
-            }
+        try:
+            rejection = await self.admission.acquire(sender_id, command_type)
+            if rejection:
+                return self._reject(command_type, sender_id, rejection, dedupe_key)
+
+            # Commands routed through a relay act on behalf of their origin
+            sender_id = header.get("origin") or sender_id
+
+            response = None
+            try:
+                response = await self._handle_command(command_type, header, sender_id, data, received_at)
+                return response
+            finally:
+                self.admission.release(command_type)
+                if dedupe_key:
+                    if response is None or response.status_code in (429, 503):
+                        self.dedupe.forget(dedupe_key)
+                    else:
+                        self.dedupe.store(dedupe_key, response.status_code, bytes(response.body), response.media_type)
+        finally:
+            if ordered_sender:
+                self.ordering.release(ordered_sender)
+
+    def _reject(self, command_type: Any, sender_id: Optional[str], rejection: dict, dedupe_key: Optional[tuple]) -> Response:
+        """Build the NACK for a command that was shed before it was handled."""
+        if dedupe_key:
+            self.dedupe.forget(dedupe_key)
+        if self.debug:
+            log.custom("SHED", Colors.YELLOW, f"Rejected command {command_type} from {sender_id}")
+        response = self._reply(
+            self.commands.NACK,
+            sender_id,
+            status_code=rejection["status"],
+            retry_after=round(rejection["retry_after"], 3),
+        )
+        response.headers["Retry-After"] = str(max(1, round(rejection["retry_after"])))
+        return response
+
+    async def _handle_command(
+        self,
+        command_type: Any,
+        header: dict,
+        sender_id: Optional[str],
+        data: dict,
+        received_at: Optional[float] = None,
+    ) -> Response:
+        """Route an admitted command to its callback and build the reply.
+
+        Callbacks get the time the message was sent, converted to the
+        local clock when the sender's clock offset is known.
+        """
+        if received_at is None:
+            received_at = time.time()
+
+        # Commands for a device behind this relay are forwarded to it
+        route = header.get("route")
+        if route and route != self.id:
+            if not self.relay or route not in self.devices:
+                return self._reply(self.commands.NACK, sender_id, status_code=404, error="no_route")
+            response = await self.relay.forward(route, command_type, header, sender_id, data.get("data"))
+            if "error" in response:
+                return self._reply(self.commands.NACK, sender_id, status_code=502, error=response["error"])
+            return self.serializer.response(response)
+
+        timestamp = self._sender_time(header, received_at)
+
+        # Rebuild delta-encoded PUSH/DATA payloads before any callback sees them
+        delta = header.get("delta")
+        if delta is not None and command_type in (self.commands.PUSH.value, self.commands.DATA.value):
+            seq = delta.get("seq") if isinstance(delta, dict) else None
+            if not isinstance(seq, int) or isinstance(seq, bool):
+                return self._reply(self.commands.NACK, sender_id, resync=True)
+            delta_key = (sender_id, command_type)
+            state = self.delta_decoder.decode(delta_key, data.get("data"), delta)
+            if state is None:
+                return self._reply(self.commands.NACK, sender_id, resync=True)
+            data = dict(data, data=state)
+        else:
+            delta = None
 
         # Handle PING response
         if command_type == self.commands.PING.value:
-            if self.callbacks["on_ping"]:
-                callback = self.callbacks["on_ping"]
-                if asyncio.iscoroutinefunction(callback):
-                    await callback(
-                        sender_id=sender_id, timestamp=header.get("timestamp")
-                    )
-                else:
-                    callback(sender_id=sender_id, timestamp=header.get("timestamp"))
-
-            return JSONResponse(
-                {
-                    "version": self.__version__,
-                    "type": self.commands.PONG.value,
-                    "header": {
-                        "sender_id": self.id,
-                        "sender_port": self.port,
-                        "recipient_id": sender_id,
-                        "timestamp": int(time.time()),
-                    },
-                }
+            offset = header.get("clock_offset")
+            if sender_id and isinstance(offset, (int, float)):
+                peer = self._peer(sender_id)
+                if not peer.clock_samples:
+                    # Use the sender's estimate until we measure our own
+                    peer.offset = -offset
+            await self.event_hub.publish("ping", sender_id, timestamp=timestamp)
+            await self._run_callback(
+                "on_ping", sender_id, timestamp=timestamp
+            )
+            return self._reply(
+                self.commands.PONG,
+                sender_id,
+                ping_sent_at=header.get("sent_at"),
+                received_at=received_at,
             )
 
         # Handle PONG answer
         elif command_type == self.commands.PONG.value:
-            if self.callbacks["on_pong"]:
-                callback = self.callbacks["on_pong"]
-                if asyncio.iscoroutinefunction(callback):
-                    await callback(
-                        sender_id=sender_id, timestamp=header.get("timestamp")
-                    )
-                else:
-                    callback(sender_id=sender_id, timestamp=header.get("timestamp"))
+            await self.event_hub.publish("pong", sender_id, timestamp=timestamp)
+            await self._run_callback(
+                "on_pong", sender_id, timestamp=timestamp
+            )
 
             if self.debug:
                 log.custom("PONG", Colors.GREEN, f"Received from {sender_id}")
-            if sender_id in self.devices:
-                self.devices[sender_id]["last_seen"] = time.time()
-            return JSONResponse({"status": "pong_received"})
+            self._peer_seen(sender_id)
+            return self.serializer.response({"status": "pong_received"})
 
         # Handle FETCH response
         elif command_type == self.commands.FETCH.value:
+            query = data.get("data")
+            if self.timeseries and isinstance(query, dict) and "timeseries" in query:
+                try:
+                    series_query = self._series_query(query["timeseries"])
+                except ValueError as e:
+                    return self._reply(self.commands.NACK, sender_id, status_code=400, error=str(e))
+                result = self.timeseries.query(**series_query)
+                if result is None:
+                    return self._reply(self.commands.NACK, sender_id, status_code=404)
+                return self._reply(self.commands.DATA, sender_id, result)
+
             if self.callbacks["on_fetch"]:
-                callback = self.callbacks["on_fetch"]
-                if asyncio.iscoroutinefunction(callback):
-                    response_data = await callback(
-                        sender_id=sender_id,
-                        query=data.get("data"),
-                        timestamp=header.get("timestamp"),
-                    )
-                else:
-                    response_data = callback(
-                        sender_id=sender_id,
-                        query=data.get("data"),
-                        timestamp=header.get("timestamp"),
-                    )
+                response_data = await self._run_callback(
+                    "on_fetch",
+                    sender_id,
+                    query=query,
+                    timestamp=timestamp,
+                )
                 if response_data:
-                    return JSONResponse(
-                        {
-                            "version": self.__version__,
-                            "type": self.commands.DATA.value,
-                            "header": {
-                                "sender_id": self.id,
-                                "sender_port": self.port,
-                                "recipient_id": sender_id,
-                                "timestamp": int(time.time()),
-                            },
-                            "data": response_data,
-                        }
-                    )
-            return JSONResponse({"status": "fetch_handled"})
+                    if has_spec(query):
+                        try:
+                            response_data = apply_spec(response_data, query)
+                        except ValueError as e:
+                            return self._reply(self.commands.NACK, sender_id, status_code=400, error=str(e))
+                    return self._reply(self.commands.DATA, sender_id, response_data)
+            return self.serializer.response({"status": "fetch_handled"})
+
+        # Handle batches forwarded by a relay
+        elif command_type == self.commands.PUSH.value and isinstance(header.get("relay"), dict):
+            return await self._accept_relay_batch(sender_id, header, data.get("data"))
 
         # Handle PUSH response
         elif command_type == self.commands.PUSH.value:
-            if not self.callbacks["on_push"]:
-                return JSONResponse(
-                    {
-                        "version": self.__version__,
-                        "type": self.commands.NACK.value,
-                        "header": {
-                            "sender_id": self.id,
-                            "sender_port": self.port,
-                            "recipient_id": sender_id,
-                            "timestamp": int(time.time()),
-                        },
-                    },
-                    status_code=400,
-                )
+            if not (self.callbacks["on_push"] or self.timeseries or self.relay or self.event_hub.has("push")):
+                return self._reply(self.commands.NACK, sender_id, status_code=400)
 
-            callback = self.callbacks["on_push"]
-            if asyncio.iscoroutinefunction(callback):
-                success = await callback(
-                    sender_id=sender_id,
-                    data=data.get("data"),
-                    timestamp=header.get("timestamp"),
-                )
-            else:
-                success = callback(
-                    sender_id=sender_id,
-                    data=data.get("data"),
-                    timestamp=header.get("timestamp"),
-                )
+            # Batches from an outbox are applied in order up to the first failure
+            if header.get("batch") and isinstance(data.get("data"), list):
+                accepted = 0
+                for item in data["data"]:
+                    if not await self._apply_push(sender_id, item, timestamp):
+                        break
+                    accepted += 1
+                command = self.commands.ACK if accepted == len(data["data"]) else self.commands.NACK
+                return self._reply(command, sender_id, accepted=accepted)
+
+            success = await self._apply_push(sender_id, data.get("data"), timestamp)
+
+            if success and delta:
+                self.delta_decoder.commit(delta_key, delta["seq"], data["data"])
 
             if success:
-                return JSONResponse(
-                    {
-                        "version": self.__version__,
-                        "type": self.commands.ACK.value,
-                        "header": {
-                            "sender_id": self.id,
-                            "sender_port": self.port,
-                            "recipient_id": sender_id,
-                            "timestamp": int(time.time()),
-                        },
-                    }
-                )
+                return self._reply(self.commands.ACK, sender_id)
             else:
-                return JSONResponse(
-                    {
-                        "version": self.__version__,
-                        "type": self.commands.NACK.value,
-                        "header": {
-                            "sender_id": self.id,
-                            "sender_port": self.port,
-                            "recipient_id": sender_id,
-                            "timestamp": int(time.time()),
-                        },
-                    }
-                )
+                return self._reply(self.commands.NACK, sender_id)
 
         # Handle DATA
         elif command_type == self.commands.DATA.value:
-            if self.callbacks["on_data"]:
-                callback = self.callbacks["on_data"]
-                if asyncio.iscoroutinefunction(callback):
-                    await callback(
-                        sender_id=sender_id,
-                        data=data.get("data"),
-                        timestamp=header.get("timestamp"),
-                    )
-                else:
-                    callback(
-                        sender_id=sender_id,
-                        data=data.get("data"),
-                        timestamp=header.get("timestamp"),
-                    )
-            return JSONResponse({"status": "data_received"})
+            if self.timeseries:
+                self.timeseries.record(sender_id, data.get("data"))
+            if self.relay:
+                self.relay.collect(sender_id, command_type, data.get("data"), timestamp)
+            if delta:
+                self.delta_decoder.commit(delta_key, delta["seq"], data["data"])
+            await self.event_hub.publish("data", sender_id, data.get("data"), timestamp)
+            await self._run_callback(
+                "on_data",
+                sender_id,
+                data=data.get("data"),
+                timestamp=timestamp,
+            )
+            return self.serializer.response({"status": "data_received"})
 
         # Handle unknown command types
-        return JSONResponse({"error": "Unknown command type"}, status_code=400)
+        return self.serializer.response({"error": "Unknown command type"}, status_code=400)
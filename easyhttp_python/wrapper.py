@@ -1,8 +1,11 @@
 """EasyHTTP - Simple HTTP-based P2P framework for IoT."""
 
 import asyncio
-from typing import Optional, Any, Callable
+from typing import Optional, Any, Callable, List
 from .core import EasyHTTPAsync
+from ._virtual import VirtualNetwork
+from ._faults import FaultInjector
+from ._serializer import new_event_loop
 
 class EasyHTTP:
     """Simple HTTP-based P2P framework with asynchronous core for IoT."""
@@ -13,12 +16,187 @@ class EasyHTTP:
         port: int = 5000,
         config_file: Optional[str] = None,
         enable_discovery: bool = True,
+        profiling: bool = False,
+        slow_callback_threshold: float = 0.1,
+        retries: int = 0,
+        retry_backoff: float = 0.2,
+        min_timeout: float = 1.0,
+        max_timeout: float = 3.0,
+        breaker_threshold: int = 3,
+        breaker_reset: float = 10.0,
+        hedge_fetch: bool = False,
+        max_inflight: Optional[int] = None,
+        max_queue: int = 64,
+        queue_timeout: float = 1.0,
+        rate_limit: Optional[float] = None,
+        rate_burst: int = 10,
+        outbox_dir: Optional[str] = None,
+        outbox_fsync: str = "interval",
+        outbox_max_bytes: int = 64 * 1024 * 1024,
+        persist_devices: bool = True,
+        timeseries: bool = False,
+        timeseries_capacity: int = 3600,
+        delta: bool = False,
+        relay_upstream: Optional[str] = None,
+        relay_batch_interval: float = 1.0,
+        relay_compress: bool = True,
+        files_dir: Optional[str] = None,
+        max_file_size: Optional[int] = None,
+        swarm_dir: Optional[str] = None,
+        swarm_chunk_size: int = 1024 * 1024,
+        dedupe_window: float = 60.0,
+        dedupe_max_bytes: int = 4 * 1024 * 1024,
+        datagram: bool = False,
+        datagram_max_size: int = 1200,
+        datagram_sequence: bool = True,
+        tls_certfile: Optional[str] = None,
+        tls_keyfile: Optional[str] = None,
+        tls_cafile: Optional[str] = None,
+        network: Optional[VirtualNetwork] = None,
+        unix_socket: Optional[str] = None,
+        serializer: str = "auto",
+        event_loop: str = "auto",
+        tags: Optional[List[str]] = None,
+        hedge_percentile: float = 0.95,
+        groups: Optional[List[str]] = None,
+        group_port: int = 37021,
+        poll_concurrency: int = 16,
+        poll_per_device: int = 1,
+        control_limit: Optional[int] = 16,
+        bulk_limit: Optional[int] = 2,
+        bulk_threshold: int = 64 * 1024,
+        bulk_timeout: float = 30.0,
+        faults: Optional[FaultInjector] = None,
+        ordered: bool = False,
+        order_queue: int = 64,
+        order_gap_timeout: float = 0.5,
     ):
         """Initialize the EasyHTTP instance.
 
         Args:
             debug: Enable debug output. Defaults to False.
             port: Port to run the HTTP server on. Defaults to 5000.
+            profiling: Time callbacks, sends and discovery handling and
+                monitor event-loop lag. Defaults to False.
+            slow_callback_threshold: Seconds after which a step is
+                reported as slow. Defaults to 0.1.
+            retries: Extra attempts after a timeout or connection error.
+                Defaults to 0.
+            retry_backoff: Base delay before the first retry, doubled for
+                every further retry. Defaults to 0.2.
+            min_timeout: Lower bound of the adaptive per-device timeout,
+                leaving the device time to run its callbacks. Defaults to 1.0.
+            max_timeout: Upper bound of the adaptive per-device timeout,
+                also used for devices without RTT samples. Defaults to 3.0.
+            breaker_threshold: Consecutive failures after which sends to
+                a device fail fast. Defaults to 3.
+            breaker_reset: Seconds between background probes of a device
+                with an open circuit. Defaults to 10.0.
+            hedge_fetch: Send a duplicate FETCH when the first one is
+                slower than usual. Defaults to False.
+            max_inflight: Maximum number of bulk requests (FETCH, PUSH,
+                DATA) handled at once, None for no limit. Defaults to None.
+            max_queue: Maximum number of bulk requests waiting for a slot.
+                Defaults to 64.
+            queue_timeout: Seconds a bulk request may wait for a slot
+                before it is shed. Defaults to 1.0.
+            rate_limit: Bulk requests per second allowed per sender, None
+                for no limit. Defaults to None.
+            rate_burst: Burst size of the per-sender rate limit.
+                Defaults to 10.
+            outbox_dir: Directory of the durable outbound queue that keeps
+                PUSHes for offline devices, None to disable it.
+                Defaults to None.
+            outbox_fsync: When queued payloads are fsynced: 'always',
+                'interval' (at most once a second) or 'never'.
+                Defaults to 'interval'.
+            outbox_max_bytes: Disk budget of the outbound queue.
+                Defaults to 64 MiB.
+            persist_devices: Keep the devices cache in a journal next to
+                the config file and restore it on startup. Defaults to True.
+            timeseries: Keep numeric fields of received PUSH/DATA payloads
+                in ring buffers that can be queried with FETCH.
+                Defaults to False.
+            timeseries_capacity: Samples kept per metric. Defaults to 3600.
+            delta: Send PUSH/DATA dicts as deltas against the last state
+                each device acknowledged; see enable_delta() to choose per
+                device. Defaults to False.
+            relay_upstream: ID of an upstream collector. When set, this
+                instance acts as a relay: PUSH/DATA from local devices are
+                forwarded upstream in batches and commands from upstream
+                are routed to local devices. Defaults to None.
+            relay_batch_interval: Seconds between upstream batches.
+                Defaults to 1.0.
+            relay_compress: Compress upstream batches. Defaults to True.
+            files_dir: Directory that files sent with send_file() are
+                received into. None refuses incoming files. Defaults to None.
+            max_file_size: Largest incoming file in bytes, None for no
+                limit. Defaults to None.
+            swarm_dir: Directory of content chunks shared with peers
+                (share_content/fetch_content). None disables content
+                distribution. Defaults to None.
+            swarm_chunk_size: Chunk size of shared content in bytes.
+                Defaults to 1 MiB.
+            dedupe_window: Seconds the response to a message is kept to
+                be replayed for retried duplicates, 0 to disable.
+                Defaults to 60.0.
+            dedupe_max_bytes: Memory budget of kept responses. Defaults
+                to 4 MiB.
+            datagram: Accept and allow fire-and-forget PUSH/DATA over UDP
+                on the same port number (send_datagram). Defaults to False.
+            datagram_max_size: Largest datagram in bytes; bigger payloads
+                are sent over HTTP. Defaults to 1200.
+            datagram_sequence: Number datagrams per recipient so receivers
+                can count lost and reordered ones. Defaults to True.
+            tls_certfile: PEM certificate to serve HTTPS with. Its
+                fingerprint is announced so peers know to use HTTPS. Defaults to
+                None (plain HTTP).
+            tls_keyfile: PEM private key of the certificate. Defaults to None.
+            tls_cafile: CA bundle to verify TLS peers without a pinned
+                fingerprint. Defaults to None (pin the certificate seen on
+                the first handshake with each peer).
+            network: Virtual network to run on instead of real sockets,
+                for simulations. Defaults to None.
+            unix_socket: Path of a Unix domain socket to serve the API on
+                as well. Devices on the same host send to it instead of
+                the TCP port. Defaults to None.
+            serializer: Message encoder, 'json' (standard library),
+                'orjson', or 'auto' for the fastest one installed.
+                Defaults to 'auto'.
+            event_loop: Event loop to run the core on, 'asyncio',
+                'uvloop', or 'auto' to use uvloop when installed.
+                Defaults to 'auto'.
+            tags: Capabilities of this device, announced via discovery so
+                others can address it with send_any()/fetch_any().
+                Defaults to None.
+            hedge_percentile: Percentile of a replica's recent RTTs after
+                which fetch_any() hedges to the next replica. Defaults
+                to 0.95.
+            groups: Multicast groups to join, announced via discovery so
+                others can address them with push_group(). Defaults to None.
+            group_port: UDP port of the multicast groups. Defaults to 37021.
+            poll_concurrency: Most poll() FETCHes running at once.
+                Defaults to 16.
+            poll_per_device: Most poll() FETCHes running at once against
+                one device. Defaults to 1.
+            control_limit: Most control requests (PING and small
+                commands) in flight to one device; None for no limit.
+                Defaults to 16.
+            bulk_limit: Most bulk requests in flight to one device; None
+                for no limit. Defaults to 2.
+            bulk_threshold: Size in bytes from which a payload is sent as
+                bulk traffic. Defaults to 64 KiB.
+            bulk_timeout: Lower bound of the timeout of bulk requests, in
+                seconds. Defaults to 30.0.
+            faults: Fault injector to pass outgoing requests, served
+                requests and received discovery datagrams through, for
+                testing under loss. Defaults to None.
+            ordered: Handle the commands of each sender one at a time, in
+                the order they were sent. Defaults to False.
+            order_queue: Commands of one sender that can wait for their
+                turn before further ones are rejected. Defaults to 64.
+            order_gap_timeout: Seconds to wait for a missing command
+                before moving on without it. Defaults to 0.5.
         """
 
         self._core = EasyHTTPAsync(
@@ -26,7 +204,61 @@ class EasyHTTP:
             port=port,
             config_file=config_file,
             enable_discovery=enable_discovery,
+            profiling=profiling,
+            slow_callback_threshold=slow_callback_threshold,
+            retries=retries,
+            retry_backoff=retry_backoff,
+            min_timeout=min_timeout,
+            max_timeout=max_timeout,
+            breaker_threshold=breaker_threshold,
+            breaker_reset=breaker_reset,
+            hedge_fetch=hedge_fetch,
+            max_inflight=max_inflight,
+            max_queue=max_queue,
+            queue_timeout=queue_timeout,
+            rate_limit=rate_limit,
+            rate_burst=rate_burst,
+            outbox_dir=outbox_dir,
+            outbox_fsync=outbox_fsync,
+            outbox_max_bytes=outbox_max_bytes,
+            persist_devices=persist_devices,
+            timeseries=timeseries,
+            timeseries_capacity=timeseries_capacity,
+            delta=delta,
+            relay_upstream=relay_upstream,
+            relay_batch_interval=relay_batch_interval,
+            relay_compress=relay_compress,
+            files_dir=files_dir,
+            max_file_size=max_file_size,
+            swarm_dir=swarm_dir,
+            swarm_chunk_size=swarm_chunk_size,
+            dedupe_window=dedupe_window,
+            dedupe_max_bytes=dedupe_max_bytes,
+            datagram=datagram,
+            datagram_max_size=datagram_max_size,
+            datagram_sequence=datagram_sequence,
+            tls_certfile=tls_certfile,
+            tls_keyfile=tls_keyfile,
+            tls_cafile=tls_cafile,
+            network=network,
+            unix_socket=unix_socket,
+            serializer=serializer,
+            tags=tags,
+            hedge_percentile=hedge_percentile,
+            groups=groups,
+            group_port=group_port,
+            poll_concurrency=poll_concurrency,
+            poll_per_device=poll_per_device,
+            control_limit=control_limit,
+            bulk_limit=bulk_limit,
+            bulk_threshold=bulk_threshold,
+            bulk_timeout=bulk_timeout,
+            faults=faults,
+            ordered=ordered,
+            order_queue=order_queue,
+            order_gap_timeout=order_gap_timeout,
         )
+        self._event_loop = event_loop
         self._loop = None
         self._running = False
         self.commands = self._core.commands
@@ -35,7 +267,7 @@ class EasyHTTP:
     def _ensure_loop(self):
         """Ensure event loop is running."""
         if not self._loop:
-            self._loop = asyncio.new_event_loop()
+            self._loop = new_event_loop(self._event_loop)
             asyncio.set_event_loop(self._loop)
 
     def on(self, event: str, callback_func: Callable) -> None:
@@ -50,18 +282,47 @@ class EasyHTTP:
         """
         self._core.on(event, callback_func)
 
-    def add(self, device_id: str, device_ip: str, device_port: int) -> None:
+    def add(
+        self,
+        device_id: str,
+        device_ip: str,
+        device_port: int,
+        tls: bool = False,
+        fingerprint: Optional[str] = None,
+        unix_socket: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        groups: Optional[List[str]] = None,
+    ) -> None:
         """Manually add a device to the local devices cache.
 
         Args:
             device_id: 6-character device identifier.
             device_ip: IP address of the device.
             device_port: Port number of the device.
+            tls: The device serves HTTPS. Defaults to False.
+            fingerprint: SHA-256 hex fingerprint of the device's
+                certificate to pin (implies tls). Defaults to None.
+            unix_socket: Path of the device's Unix domain socket, if it
+                runs on this host. Defaults to None.
+            tags: Capabilities of the device, for send_any()/fetch_any().
+                Defaults to None (learned when the device answers a PING).
+            groups: Multicast groups the device is a member of, for
+                push_group(). Defaults to None (learned via discovery).
 
         Raises:
-            ValueError: If device_id is not 6 characters.
+            ValueError: If device_id is not 6 characters or device_port
+                is not a port number.
+        """
+        self._core.add(device_id, device_ip, device_port, tls, fingerprint, unix_socket, tags, groups)
+
+    def enable_delta(self, device_id: str, enabled: bool = True) -> None:
+        """Turn delta encoding of PUSH/DATA dicts on or off for one device.
+
+        Args:
+            device_id: ID of the device.
+            enabled: Whether dict payloads to it are delta-encoded.
         """
-        self._core.add(device_id, device_ip, device_port)
+        self._core.enable_delta(device_id, enabled)
 
     def start(self) -> None:
         """Start the HTTP server and generate a device ID if not set."""
@@ -76,7 +337,12 @@ class EasyHTTP:
             self._running = False
 
     def send(
-        self, device_id: str, command_type: Any, data: Optional[Any] = None
+        self,
+        device_id: str,
+        command_type: Any,
+        data: Optional[Any] = None,
+        header: Optional[dict] = None,
+        traffic_class: Optional[str] = None,
     ) -> Optional[dict]:
         """Send a JSON-formatted command to another device.
 
@@ -84,10 +350,14 @@ class EasyHTTP:
             device_id: ID of the target device (must be 6 characters).
             command_type: Command type (commands enum member) or its integer value.
             data: JSON-serializable data to send (dict, list, str, or None).
+            header: Extra header fields to send along. Defaults to None.
+            traffic_class: 'control' or 'bulk'. Defaults to None (by
+                command and payload size).
 
         Returns:
-            Response JSON dict if successful, None otherwise.
+            Response JSON dict if successful, or an error dict otherwise.
             Response typically contains 'type', 'header', and optionally 'data' fields.
+            Error dicts contain 'error', 'device_id' and 'attempts'.
 
         Note:
             The device must be added to the devices cache before sending.
@@ -95,7 +365,7 @@ class EasyHTTP:
         if not self._loop:
             self._ensure_loop()
         return self._loop.run_until_complete(
-            self._core.send(device_id, command_type, data)
+            self._core.send(device_id, command_type, data, header, traffic_class)
         )
 
     def ping(self, device_id: str) -> bool:
@@ -109,18 +379,178 @@ class EasyHTTP:
         """
         return self._loop.run_until_complete(self._core.ping(device_id))
 
-    def fetch(self, device_id: str, query: Optional[Any] = None) -> Optional[dict]:
+    def fetch(
+        self,
+        device_id: str,
+        query: Optional[Any] = None,
+        fields: Optional[list] = None,
+        where: Optional[dict] = None,
+        limit: Optional[int] = None,
+        traffic_class: Optional[str] = None,
+    ) -> Optional[dict]:
         """Send a FETCH request to another device and return the response.
 
+        The responding device trims its on_fetch result to the requested
+        fields and rows before sending it, so only needed data travels.
+
         Args:
             device_id: ID of the target device.
             query: Query data to send with the FETCH request.
+            fields: Field names to keep in the result; dotted names reach
+                into nested dicts. Defaults to all fields.
+            where: Conditions rows of a list result must match, either a
+                value or a dict of operators ('eq', 'ne', 'gt', 'gte',
+                'lt', 'lte', 'in'). Defaults to None.
+            limit: Maximum number of rows of a list result. Defaults to None.
+            traffic_class: 'bulk' for FETCHes with large results, see
+                send(). Defaults to None.
+
+        Returns:
+            Response data from the device, or an error dict if failed.
+            The dict typically contains 'type', 'header', and 'data' fields;
+            error dicts contain an 'error' field (see send()).
+
+        Raises:
+            TypeError: If fields, where or limit is given with a non-dict query.
+        """
+        return self._loop.run_until_complete(
+            self._core.fetch(device_id, query, fields, where, limit, traffic_class)
+        )
+
+    def send_any(
+        self,
+        tag: str,
+        command_type: Any,
+        data: Optional[Any] = None,
+        header: Optional[dict] = None,
+        hedge: bool = False,
+    ) -> dict:
+        """Send a command to the fastest device with a tag.
+
+        Args:
+            tag: Tag the device must have announced.
+            command_type: Command type (commands enum member) or its integer value.
+            data: JSON-serializable data to send. Defaults to None.
+            header: Extra header fields to send along. Defaults to None.
+            hedge: Also send to the next device if the first one is slower
+                than usual; only safe for commands without side effects.
+                Defaults to False.
+
+        Returns:
+            Response dict from the device that answered first, or an error
+            dict ('no_replica' if no reachable device has the tag).
+        """
+        return self._loop.run_until_complete(
+            self._core.send_any(tag, command_type, data, header, hedge)
+        )
+
+    def fetch_any(
+        self,
+        tag: str,
+        query: Optional[Any] = None,
+        fields: Optional[list] = None,
+        where: Optional[dict] = None,
+        limit: Optional[int] = None,
+        hedge: bool = True,
+    ) -> dict:
+        """Send a FETCH to the fastest device with a tag, hedging slow requests.
+
+        Args:
+            tag: Tag the device must have announced.
+            query: Query data to send with the FETCH request.
+            fields: Field names to keep in the result (see fetch()).
+            where: Conditions rows of a list result must match (see fetch()).
+            limit: Maximum number of rows of a list result. Defaults to None.
+            hedge: Hedge slow requests to a second device. Defaults to True.
+
+        Returns:
+            Response from the device that answered first, or an error dict.
+        """
+        return self._loop.run_until_complete(
+            self._core.fetch_any(tag, query, fields, where, limit, hedge)
+        )
+
+    def poll(
+        self,
+        query: Optional[Any] = None,
+        devices: Optional[List[str]] = None,
+        tag: Optional[str] = None,
+        interval: float = 10.0,
+        priority: int = 0,
+        jitter: float = 0.1,
+        callback: Optional[Callable] = None,
+        fields: Optional[list] = None,
+        where: Optional[dict] = None,
+        limit: Optional[int] = None,
+    ) -> str:
+        """FETCH from a set of devices periodically.
+
+        Polls run on the event loop, i.e. while a call of this instance
+        is in progress.
+
+        Args:
+            query: Query data to send with every FETCH.
+            devices: IDs of the devices to poll. Defaults to None.
+            tag: Poll the devices with this tag instead, including ones
+                found later. Defaults to None (all devices if devices is
+                not given either).
+            interval: Seconds between two polls of a device. Defaults to 10.0.
+            priority: Polls of jobs with a higher priority get free slots
+                first. Defaults to 0.
+            jitter: Fraction of the interval each cycle is randomly
+                shifted by. Defaults to 0.1.
+            callback: Called as callback(device_id, response, job_id) with
+                every response. Defaults to None.
+            fields: Field names to keep in the result (see fetch()).
+            where: Conditions rows of a list result must match (see fetch()).
+            limit: Maximum number of rows of a list result. Defaults to None.
+
+        Returns:
+            ID of the poll job, for cancel_poll().
+
+        Raises:
+            ValueError: If interval is not positive or jitter is outside [0, 1).
+        """
+        return self._core.poll(query, devices, tag, interval, priority, jitter, callback, fields, where, limit)
+
+    def cancel_poll(self, job_id: str) -> bool:
+        """Stop a poll job.
+
+        Args:
+            job_id: ID returned by poll().
+
+        Returns:
+            True if the job existed.
+        """
+        return self._core.cancel_poll(job_id)
+
+    def fetch_series(
+        self,
+        device_id: str,
+        metric: str,
+        source: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        buckets: int = 100,
+    ) -> Optional[dict]:
+        """Request a downsampled metric range from a device's time-series store.
+
+        Args:
+            device_id: ID of the device keeping the store.
+            metric: Metric name, e.g. 'temperature' or 'env.temp'.
+            source: ID of the device that reported the metric. Defaults to
+                the only device reporting it.
+            start: Range start (UNIX time). Defaults to the oldest sample.
+            end: Range end (UNIX time). Defaults to the newest sample.
+            buckets: Maximum number of points to return. Defaults to 100.
 
         Returns:
-            Response data from the device, or None if failed.
-            The dict typically contains 'type', 'header', and 'data' fields.
+            Dict with 'metric', 'source', 'start', 'end' and 'points'
+            ([bucket_start, min, max, mean, count] each), or None if failed.
         """
-        return self._loop.run_until_complete(self._core.fetch(device_id, query))
+        return self._loop.run_until_complete(
+            self._core.fetch_series(device_id, metric, source, start, end, buckets)
+        )
 
     def push(self, device_id: str, data: Optional[Any] = None) -> bool:
         """Send data to another device using PUSH command.
@@ -129,14 +559,185 @@ class EasyHTTP:
             device_id: ID of the target device.
             data: JSON-serializable data to send.
 
+        When the outbound queue is enabled, data for a device that is
+        unreachable (or still has queued data) is stored on disk and
+        delivered in order once the device is seen again.
+
         Returns:
-            True if data was successfully sent and acknowledged, False otherwise.
+            True if data was successfully sent and acknowledged (or queued
+            for later delivery), False otherwise.
 
         Raises:
             TypeError: If data is not JSON-serializable.
         """
         return self._loop.run_until_complete(self._core.push(device_id, data))
 
+    def send_datagram(
+        self,
+        device_id: str,
+        command_type: Any,
+        data: Optional[Any] = None,
+    ) -> bool:
+        """Send a PUSH or DATA as a single UDP datagram (QoS 0).
+
+        Args:
+            device_id: ID of the target device (must have datagram enabled).
+            command_type: commands.PUSH or commands.DATA (or their values).
+            data: JSON-serializable data to send.
+
+        Returns:
+            True if the datagram was sent (or the HTTP fallback succeeded).
+
+        Raises:
+            RuntimeError: If datagram is not enabled.
+            ValueError: If the command is not PUSH or DATA.
+        """
+        return self._loop.run_until_complete(
+            self._core.send_datagram(device_id, command_type, data)
+        )
+
+    def join_group(self, name: str) -> None:
+        """Join a multicast group, so push_group() to it reaches this device.
+
+        Args:
+            name: Group name, e.g. 'lights/floor-2'.
+        """
+        self._core.join_group(name)
+
+    def leave_group(self, name: str) -> None:
+        """Leave a multicast group.
+
+        Args:
+            name: Group name.
+        """
+        self._core.leave_group(name)
+
+    def push_group(
+        self,
+        name: str,
+        data: Optional[Any] = None,
+        ack: bool = True,
+        deadline: float = 0.5,
+        retry: bool = True,
+        members: Optional[List[str]] = None,
+    ) -> dict:
+        """Send a PUSH to every member of a group in a single multicast datagram.
+
+        Args:
+            name: Group name.
+            data: JSON-serializable data to send.
+            ack: Collect ACKs from the members. Defaults to True.
+            deadline: Seconds to wait for ACKs. Defaults to 0.5.
+            retry: Retry members that did not answer over HTTP. Defaults
+                to True.
+            members: Device IDs expected in the group besides those that
+                announced it. Defaults to None.
+
+        Returns:
+            Dict with 'group', 'message_id', 'acked' and 'nacked' (members
+            that answered the datagram), 'retried' (reached over HTTP),
+            'failed' and 'transmissions'.
+
+        Raises:
+            TypeError: If data is not JSON-serializable.
+        """
+        return self._loop.run_until_complete(
+            self._core.push_group(name, data, ack, deadline, retry, members)
+        )
+
+    def send_file(self, device_id: str, path: str, name: Optional[str] = None) -> dict:
+        """Send a file to a device as raw bytes, resuming after interruptions.
+
+        Args:
+            device_id: Target device ID (must have files_dir set).
+            path: Path of the file to send.
+            name: File name on the device. Defaults to the local name.
+
+        Returns:
+            Dict with 'status', 'size', 'sha256' and 'resumed_from' if the
+            device has the complete file, or an error dict otherwise.
+        """
+        return self._loop.run_until_complete(self._core.send_file(device_id, path, name))
+
+    def share_content(self, path: str, name: Optional[str] = None) -> str:
+        """Make a file available for peer-assisted distribution.
+
+        Args:
+            path: Path of the file to share.
+            name: File name given to fetching devices.
+
+        Returns:
+            The content ID (SHA-256 of the file).
+
+        Raises:
+            RuntimeError: If swarm_dir is not set.
+        """
+        return self._loop.run_until_complete(self._core.share_content(path, name))
+
+    def fetch_content(
+        self,
+        content_id: str,
+        source_id: Optional[str] = None,
+        path: Optional[str] = None,
+        timeout: float = 300.0,
+    ) -> dict:
+        """Download shared content from all devices that hold it.
+
+        Args:
+            content_id: Content ID returned by share_content().
+            source_id: Device known to hold the content, e.g. the origin.
+            path: Where to write the file. Defaults to the shared name
+                inside swarm_dir.
+            timeout: Seconds to keep trying. Defaults to 300.0.
+
+        Returns:
+            Dict with 'status', 'path', 'size' and 'sources', or an error
+            dict with 'error' set to 'incomplete' or 'corrupt'.
+
+        Raises:
+            RuntimeError: If swarm_dir is not set.
+        """
+        return self._loop.run_until_complete(
+            self._core.fetch_content(content_id, source_id, path, timeout)
+        )
+
+    def get_peer_stats(self, device_id: str) -> Optional[dict]:
+        """Return RTT estimate, timeout and breaker state of a device.
+
+        Args:
+            device_id: ID of the device.
+
+        Returns:
+            Dict with 'srtt', 'rttvar', 'timeout', 'failures', 'circuit_open',
+            'samples', 'clock_offset' (device's clock minus ours),
+            'clock_delay', 'latency' (one-way, of messages from the
+            device) and 'load' (as last reported by the device), or None
+            if nothing was sent to the device yet.
+        """
+        return self._core.get_peer_stats(device_id)
+
+    def get_latency_stats(self) -> dict:
+        """Summarize clock offsets and delivery latency across devices.
+
+        Returns:
+            Dict with 'devices' (per device: 'clock_offset', 'clock_delay'
+            and 'latency', in seconds) and fleet-wide 'latency_avg',
+            'latency_max' and 'offset_max' (largest absolute clock
+            offset), which are None until something was measured.
+        """
+        return self._core.get_latency_stats()
+
+    def profile_snapshot(self, duration: float = 1.0) -> dict:
+        """Take a sampling profile of the event loop.
+
+        Args:
+            duration: How long to sample, in seconds.
+
+        Returns:
+            Dict with sample count, hottest stacks and hottest functions.
+        """
+        return self._loop.run_until_complete(self._core.profile_snapshot(duration))
+
     # Context manager support
     def __enter__(self):
         """Enter the sync context manager."""
@@ -157,3 +758,98 @@ class EasyHTTP:
     def devices(self) -> dict:
         """Get devices cache."""
         return self._core.devices
+
+    @property
+    def profiler(self):
+        """Get hot-path profiler."""
+        return self._core.profiler
+
+    @property
+    def admission(self):
+        """Get server admission control."""
+        return self._core.admission
+
+    @property
+    def outbox(self):
+        """Get durable outbound queue, or None if disabled."""
+        return self._core.outbox
+
+    @property
+    def timeseries(self):
+        """Get time-series store, or None if disabled."""
+        return self._core.timeseries
+
+    @property
+    def relay(self):
+        """Get relay, or None if this instance is not a relay."""
+        return self._core.relay
+
+    @property
+    def files(self):
+        """Get file transfer handler."""
+        return self._core.files
+
+    @property
+    def swarm(self):
+        """Get content distribution handler, or None if disabled."""
+        return self._core.swarm
+
+    @property
+    def dedupe(self):
+        """Get duplicate suppression cache, or None if disabled."""
+        return self._core.dedupe
+
+    @property
+    def datagram(self):
+        """Get UDP datagram channel, or None if disabled."""
+        return self._core.datagram
+
+    @property
+    def tls(self):
+        """Get TLS settings and connection counters."""
+        return self._core.tls
+
+    @property
+    def groups(self):
+        """Get joined multicast groups and their counters."""
+        return self._core.groups
+
+    @property
+    def faults(self):
+        """Get the fault injector, or None if disabled."""
+        return self._core.faults
+
+    @property
+    def ordering(self):
+        """Get per-sender ordering counters, or None if disabled."""
+        return self._core.ordering
+
+    @property
+    def lanes(self):
+        """Get traffic class limits and counters."""
+        return self._core.lanes
+
+    @property
+    def poller(self):
+        """Get the poll scheduler and its counters."""
+        return self._core.poller
+
+    @property
+    def replicas(self):
+        """Get replica selection settings and counters."""
+        return self._core.replicas
+
+    @property
+    def serializer(self):
+        """Get the message serializer in use."""
+        return self._core.serializer
+
+    @property
+    def unix(self):
+        """Get Unix domain socket settings and counters."""
+        return self._core.unix
+
+    @property
+    def routes(self) -> dict:
+        """Get devices reachable through relays, mapped to the relay ID."""
+        return self._core.routes